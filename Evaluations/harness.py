@@ -0,0 +1,452 @@
+import os
+import re
+import sys
+import copy
+import json
+import time
+import base64
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+# Shared helpers (pixel cache) live with the collection scripts
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Scripts")
+sys.path.insert(0, SCRIPTS_DIR)
+
+# --- CONFIGURATION ---
+IMAGE_FOLDER = "images"
+TEST_CSV = "test.csv"
+MAX_NEW_TOKENS = 20
+HF_BATCH = 8               # images per generate() call for transformers backends
+OLLAMA_HOST = "http://127.0.0.1:11434"
+OLLAMA_CONCURRENCY = 4     # requests in flight; the server needs OLLAMA_NUM_PARALLEL >= this to run them together
+OLLAMA_OPTIONS = {"temperature": 0, "top_k": 1}
+OLLAMA_KEEP_ALIVE = "30m"  # keep the model (and its prompt cache) loaded between rows
+# Reuse the shared prompt prefix (few-shot turns, system prompt) across rows. None: only with
+# few-shot examples, since the Qwen prefix path runs one row at a time and gives up batching.
+PREFIX_CACHE = None
+PIXEL_CACHE = os.path.join(SCRIPTS_DIR, "pixel_cache")  # decoded + resized images, shared by every eval script ("" to disable)
+
+# -----------------------------
+# 1. Prompts
+# -----------------------------
+PROMPTS = {
+    # No context: the image alone
+    "nc": "Identify the species in this image. Respond with ONLY the scientific name.",
+    # With context: GMGBD environmental columns
+    "wc": (
+        "Identify the species in this image.\n"
+        "CONTEXT:\n"
+        "- Location: {city}, {country}\n"
+        "- Elevation: {elevation_m}m, Temp: {avg_temp_C}C\n"
+        "- Vegetation: {NDVI_Category}\n"
+        "Provide ONLY the scientific name."
+    ),
+    # Few-shot: the target prompt that follows the worked examples
+    "fs": "Identify this species. Context: Location: {country}. Description: {description}. Temperature: {avg_temp_C}C.. OUTPUT ONLY THE SCIENTIFIC NAME.",
+}
+
+class Sample:
+    """One row to evaluate: image path, ground truth and the rendered prompt."""
+    def __init__(self, key, image, truth, prompt):
+        self.key = key
+        self.image = image
+        self.truth = truth
+        self.prompt = prompt
+
+def load_samples(csv_path=TEST_CSV, image_folder=IMAGE_FOLDER, prompt=PROMPTS["nc"], header=0, columns=None):
+    """
+    Reads the test CSV into Samples, skipping rows whose image is missing.
+    columns renames positional columns for header-less files, e.g. {0: 'filename', 1: 'scientific_name'}.
+    """
+    df = pd.read_csv(csv_path, header=header)
+    if columns:
+        df = df.rename(columns=columns)
+    samples, missing = [], 0
+    for row in df.to_dict("records"):
+        path = os.path.join(image_folder, str(row['filename']))
+        if not os.path.isfile(path):
+            missing += 1
+            continue
+        samples.append(Sample(str(row['filename']), path, row['scientific_name'], prompt.format(**row)))
+    if missing:
+        print(f"⚠️ {missing}/{len(df)} images not found in {image_folder}")
+    return samples
+
+def few_shot(examples, image_folder=IMAGE_FOLDER):
+    """[(image filename, prompt, answer), ...] -> [(image path, prompt, answer), ...]"""
+    return [(os.path.join(image_folder, img), prompt, answer) for img, prompt, answer in examples]
+
+# -----------------------------
+# 2. Scoring
+# -----------------------------
+def evaluate_name(ground_truth, prediction):
+    """2 = genus and species match, 1 = genus only, 0 = no match."""
+    gt = re.sub(r'[^a-zA-Z ]', '', str(ground_truth).lower()).split()
+    pred = re.sub(r'[^a-zA-Z ]', '', str(prediction).lower()).split()
+    if not pred or not gt: return 0
+    genus_match = gt[0] == pred[0]
+    full_match = (len(pred) >= 2 and len(gt) >= 2 and gt[0] == pred[0] and gt[1] == pred[1])
+    if full_match: return 2
+    if genus_match: return 1
+    return 0
+
+def clean_prediction(text):
+    """First line, without markdown emphasis or a 'Scientific name:' style lead-in."""
+    text = str(text).strip().replace('*', '').replace('_', '').split('\n')[0]
+    return re.sub(r'^(Scientific name|The species is|Species):\s*', '', text, flags=re.IGNORECASE).strip()
+
+# -----------------------------
+# 3. Backends
+# -----------------------------
+# A backend has batch_size and predict(samples) -> [(raw prediction, error), ...] in sample order.
+# Backends that can measure it also fill usage[key] = {"latency": s, "prompt_tokens": n} per row,
+# where prompt_tokens counts only the tokens the model actually had to process.
+
+def _image_patches(grid_thw, pixel_values, index):
+    """Patch rows of image `index` inside the concatenated pixel_values of a Qwen2.5-VL batch."""
+    sizes = [int(g.prod()) for g in grid_thw]
+    start = sum(sizes[:index])
+    return pixel_values[start:start + sizes[index]]
+
+class QwenBackend:
+    """Qwen2.5-VL through transformers; batch_size images per generate() call (left padded)."""
+    def __init__(self, model_id="Qwen/Qwen2.5-VL-3B-Instruct", device=None, batch_size=HF_BATCH,
+                 max_new_tokens=MAX_NEW_TOKENS, examples=(), prefix_cache=PREFIX_CACHE, pixel_cache=PIXEL_CACHE,
+                 model=None, processor=None):
+        import torch
+        from transformers import Qwen2_5_VLForConditionalGeneration, AutoProcessor
+        self.torch = torch
+        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        if model is None:
+            print(f"📦 Loading {model_id} on {self.device}...")
+            model = Qwen2_5_VLForConditionalGeneration.from_pretrained(model_id, torch_dtype="auto", device_map="auto")
+            processor = AutoProcessor.from_pretrained(model_id)
+        self.model = model
+        self.processor = processor
+        self.processor.tokenizer.padding_side = "left"  # generated tokens must start at the same column
+        self.name = model_id
+        self.batch_size = batch_size
+        self.max_new_tokens = max_new_tokens
+        self.examples = examples
+        self.prefix_cache = bool(examples) if prefix_cache is None else prefix_cache
+        self.prefix = None  # (prefix input_ids, past_key_values) once computed
+        self.usage = {}
+        self.pixel_cache, self.spec = None, None
+        if pixel_cache:
+            from pixel_cache import PixelCache, dynamic_size_spec
+            self.pixel_cache = PixelCache(pixel_cache)
+            self.spec = dynamic_size_spec(self.processor.image_processor)
+
+    def _open(self, path):
+        """RGB image; from the pixel cache (already at the processor's target size) when enabled."""
+        from PIL import Image
+        if self.pixel_cache is not None:
+            return Image.fromarray(np.asarray(self.pixel_cache.get(path, self.spec)))
+        with Image.open(path) as img:
+            return img.convert("RGB")
+
+    def _conversation(self, image, prompt):
+        messages, images = [], []
+        for ex_path, ex_prompt, answer in self.examples:
+            ex_image = self._open(ex_path)
+            images.append(ex_image)
+            messages.append({"role": "user", "content": [{"type": "image", "image": ex_image}, {"type": "text", "text": ex_prompt}]})
+            messages.append({"role": "assistant", "content": [{"type": "text", "text": answer}]})
+        images.append(image)
+        messages.append({"role": "user", "content": [{"type": "image", "image": image}, {"type": "text", "text": prompt}]})
+        text = self.processor.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+        return text, images
+
+    # --- Shared-prefix path: one row at a time, prefix KV cache computed once ---
+    def _rope_index(self, inputs):
+        owner = self.model if hasattr(self.model, "get_rope_index") else self.model.model
+        kwargs = {"image_grid_thw": inputs.image_grid_thw, "attention_mask": inputs.attention_mask}
+        if "mm_token_type_ids" in inputs:  # transformers >= 5 marks the image tokens explicitly
+            kwargs["mm_token_type_ids"] = inputs["mm_token_type_ids"]
+        return owner.get_rope_index(inputs.input_ids, **kwargs)
+
+    def _build_prefix(self, text, images):
+        """Everything before the last user turn (system prompt + few-shot turns) is the same for every row."""
+        prefix_text = text[:text.rindex("<|im_start|>user")]
+        n_examples = len(self.examples)
+        inputs = self.processor(text=[prefix_text], images=images[:n_examples] or None, return_tensors="pt").to(self.model.device)
+        with self.torch.no_grad():
+            out = self.model(**inputs, use_cache=True)
+        self.prefix = (inputs.input_ids[0], out.past_key_values)
+        print(f"🧠 Prefix cache: {len(inputs.input_ids[0])} tokens computed once")
+
+    def _generate_cached(self, text, images):
+        torch = self.torch
+        inputs = self.processor(text=[text], images=images, return_tensors="pt").to(self.model.device)
+        if self.prefix is None:
+            self._build_prefix(text, images)
+        prefix_ids, prefix_kv = self.prefix
+        n, total = len(prefix_ids), inputs.input_ids.shape[1]
+        if total <= n or not torch.equal(inputs.input_ids[0, :n], prefix_ids):
+            return None, total  # prompt does not start with the cached prefix: caller falls back
+
+        # M-RoPE positions come from the whole prompt; only the suffix and the target image are fed
+        position_ids, rope_deltas = self._rope_index(inputs)
+        target = len(images) - 1
+        kv = copy.deepcopy(prefix_kv)
+        ids = inputs.input_ids[:, n:]
+        kwargs = {"pixel_values": _image_patches(inputs.image_grid_thw, inputs.pixel_values, target),
+                  "image_grid_thw": inputs.image_grid_thw[target:]}
+        mask = inputs.attention_mask
+        pos = position_ids[..., n:]
+        tokens = []
+        eos = self.model.generation_config.eos_token_id
+        eos = set(eos if isinstance(eos, list) else [eos])
+        with torch.no_grad():
+            for step in range(self.max_new_tokens):
+                cache_position = torch.arange(mask.shape[1] - ids.shape[1], mask.shape[1], device=mask.device)
+                out = self.model(input_ids=ids, attention_mask=mask, position_ids=pos, past_key_values=kv,
+                                 cache_position=cache_position, use_cache=True, **kwargs)
+                kv, kwargs = out.past_key_values, {}
+                token = int(out.logits[0, -1].argmax())
+                if token in eos:
+                    break
+                tokens.append(token)
+                ids = torch.tensor([[token]], device=mask.device)
+                mask = torch.cat([mask, mask.new_ones((1, 1))], dim=1)
+                # Generated text continues the 1-D position track after the last prompt position
+                pos = (cache_position[-1:] + 1 + rope_deltas).view(1, 1, 1).expand(3, 1, 1)
+        return self.processor.tokenizer.decode(tokens, skip_special_tokens=True).strip(), total - n
+
+    def _predict_cached(self, samples):
+        results = []
+        for s in samples:
+            t0 = time.perf_counter()
+            try:
+                text, images = self._conversation(self._open(s.image), s.prompt)
+                prediction, tokens = self._generate_cached(text, images)
+                if prediction is None:
+                    prediction = self._predict_batch([s])[0][0]
+                results.append((prediction, None))
+                self.usage[s.key] = {"latency": time.perf_counter() - t0, "prompt_tokens": tokens}
+            except Exception as e:
+                results.append((None, str(e)))
+        return results
+
+    def predict(self, samples):
+        return self._predict_cached(samples) if self.prefix_cache else self._predict_batch(samples)
+
+    # --- Batched path: batch_size rows per generate(), full prompt every time ---
+    def _predict_batch(self, samples):
+        t0 = time.perf_counter()
+        results = [None] * len(samples)
+        texts, images, slots = [], [], []
+        for i, s in enumerate(samples):
+            try:
+                text, imgs = self._conversation(self._open(s.image), s.prompt)
+            except Exception as e:
+                results[i] = (None, str(e))
+                continue
+            texts.append(text)
+            images.extend(imgs)
+            slots.append(i)
+        if not texts:
+            return results
+        try:
+            inputs = self.processor(text=texts, images=images, padding=True, return_tensors="pt").to(self.model.device)
+            with self.torch.no_grad():
+                generated_ids = self.model.generate(**inputs, max_new_tokens=self.max_new_tokens, do_sample=False)
+            trimmed = generated_ids[:, inputs.input_ids.shape[1]:]
+            latency = (time.perf_counter() - t0) / len(slots)
+            for k, (i, text) in enumerate(zip(slots, self.processor.batch_decode(trimmed, skip_special_tokens=True))):
+                results[i] = (text.strip(), None)
+                self.usage[samples[i].key] = {"latency": latency, "prompt_tokens": int(inputs.attention_mask[k].sum())}
+        except Exception as e:
+            for i in slots:
+                results[i] = (None, str(e))
+        return results
+
+def _b64(path):
+    with open(path, 'rb') as f:
+        return base64.b64encode(f.read()).decode()
+
+class OllamaBackend:
+    """
+    Gemma (or any vision model) served by Ollama; up to concurrency chat requests in flight.
+    Ollama's runner reuses the KV cache of a prompt prefix it has just evaluated, so the few-shot
+    turns only cost tokens once as long as they are byte-identical and the model stays loaded.
+    With prefix_cache the support images are read and base64-encoded once and keep_alive holds
+    the model (and its cache) in memory between rows; usage records prompt_eval_count.
+    """
+    def __init__(self, model="gemma3:4b", host=OLLAMA_HOST, concurrency=OLLAMA_CONCURRENCY, options=None, examples=(),
+                 prefix_cache=True, keep_alive=OLLAMA_KEEP_ALIVE):
+        from ollama import Client
+        self.client = Client(host=host)
+        self.name = model
+        self.options = dict(OLLAMA_OPTIONS if options is None else options)
+        self.batch_size = concurrency * 2  # keep the pool busy between batches
+        self.pool = ThreadPoolExecutor(max_workers=concurrency)
+        self.prefix_cache = prefix_cache
+        self.keep_alive = keep_alive if prefix_cache else None
+        self.usage = {}
+        self.prefix = []
+        for ex_path, ex_prompt, answer in examples:
+            self.prefix.append({"role": "user", "content": ex_prompt, "images": [_b64(ex_path) if prefix_cache else ex_path]})
+            self.prefix.append({"role": "assistant", "content": answer})
+
+    def _chat(self, sample):
+        t0 = time.perf_counter()
+        try:
+            messages = self.prefix + [{"role": "user", "content": sample.prompt, "images": [sample.image]}]
+            response = self.client.chat(model=self.name, messages=messages, options=self.options, keep_alive=self.keep_alive)
+            self.usage[sample.key] = {"latency": time.perf_counter() - t0, "prompt_tokens": response.get('prompt_eval_count')}
+            return response['message']['content'], None
+        except Exception as e:
+            return None, str(e)
+
+    def predict(self, samples):
+        return list(self.pool.map(self._chat, samples))
+
+class FakeBackend:
+    """No model: answers with answer(sample) (the ground truth by default). For dry runs of the harness."""
+    def __init__(self, answer=None, batch_size=HF_BATCH, delay=0.0):
+        self.name = "fake"
+        self.answer = answer or (lambda sample: sample.truth)
+        self.batch_size = batch_size
+        self.delay = delay
+
+    def predict(self, samples):
+        time.sleep(self.delay)
+        return [(self.answer(s), None) for s in samples]
+
+# -----------------------------
+# 4. Stand-in Ollama server
+# -----------------------------
+class _OllamaHandler(BaseHTTPRequestHandler):
+    """
+    Answers POST /api/chat like Ollama (stream off) with server.answer(messages). prompt_eval_count
+    mimics the runner's prompt cache: ~4 characters per token, and the part of the prompt shared
+    with the previous request is not counted again.
+    """
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        self.server.requests += 1
+        time.sleep(self.server.delay)
+        if not self.path.startswith("/api/chat"):
+            self.send_error(404)
+            return
+        prompt = json.dumps(body.get("messages", []))
+        with self.server.lock:
+            shared = os.path.commonprefix([prompt, self.server.last_prompt])
+            self.server.last_prompt = prompt
+        reply = {"model": body.get("model"), "done": True, "prompt_eval_count": (len(prompt) - len(shared)) // 4 + 1,
+                 "message": {"role": "assistant", "content": self.server.answer(body.get("messages", []))}}
+        data = json.dumps(reply).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+def fake_ollama_server(answer=None, delay=0.0):
+    """Starts the stand-in on a free local port; returns (server, host) for OllamaBackend(host=...)."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _OllamaHandler)
+    server.answer = answer or (lambda messages: "Falco tinnunculus")
+    server.delay = delay
+    server.requests = 0
+    server.last_prompt = ""
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+# -----------------------------
+# 5. Runner
+# -----------------------------
+def load_cache(path):
+    """Finished rows from a previous run (rows that errored are retried)."""
+    done = {}
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue  # torn last line after a crash
+                if rec.get("error") is None:
+                    done[rec["filename"]] = rec
+    return done
+
+def report(res_df, total, title, elapsed=None):
+    scored = res_df[res_df['error'].isna()]
+    print("\n" + "=" * 45)
+    print(f"📊 {title}: {len(scored)}/{total} images scored ({len(res_df) - len(scored)} errors)")
+    if len(scored):
+        print(f"✅ Full Species Accuracy: {(scored['score'] == 2).mean() * 100:.2f}%")
+        print(f"🔍 Genus-Level Accuracy:  {(scored['score'] >= 1).mean() * 100:.2f}%")
+    if 'latency' in scored and scored['latency'].notna().any():
+        print(f"⏱️ {scored['latency'].mean():.2f}s per row | {scored['prompt_tokens'].mean():.0f} prompt tokens per row")
+    if elapsed:
+        print(f"⏱️ {elapsed:.1f}s for this run")
+    print("=" * 45)
+
+def run(backend, samples, output_csv, title=None, cache_path=None):
+    """
+    Evaluates samples in backend.batch_size chunks. Every result is appended to a jsonl cache
+    (output_csv + '.jsonl' by default) so an interrupted run resumes where it stopped.
+    """
+    title = title or backend.name
+    cache_path = cache_path or output_csv + ".jsonl"
+    done = load_cache(cache_path)
+    todo = [s for s in samples if s.key not in done]
+    if done:
+        print(f"🔁 {len(samples) - len(todo)} rows already in {cache_path}")
+    print(f"🚀 Evaluating {len(todo)} images with {title}...")
+
+    t0 = time.perf_counter()
+    with open(cache_path, 'a', encoding='utf-8') as f, tqdm(total=len(todo)) as bar:
+        for start in range(0, len(todo), backend.batch_size):
+            chunk = todo[start:start + backend.batch_size]
+            for s, (raw, err) in zip(chunk, backend.predict(chunk)):
+                prediction = clean_prediction(raw) if err is None else None
+                rec = {"filename": s.key, "ground_truth": s.truth, "prediction": prediction,
+                       "score": evaluate_name(s.truth, prediction) if err is None else None, "error": err,
+                       **getattr(backend, "usage", {}).get(s.key, {})}
+                done[s.key] = rec
+                f.write(json.dumps(rec, default=str) + "\n")
+                if err is not None:
+                    print(f"\n⚠️ Error on {s.key}: {err}")
+            f.flush()
+            bar.update(len(chunk))
+    elapsed = time.perf_counter() - t0
+
+    if not samples:
+        print("\n🛑 No images to evaluate. Check IMAGE_FOLDER and the filename column.")
+        return None
+    res_df = pd.DataFrame([done[s.key] for s in samples if s.key in done])
+    res_df.to_csv(output_csv, index=False)
+    report(res_df, len(samples), title, elapsed)
+    return res_df
+
+def compare_prefix(make_backend, samples, n=20):
+    """
+    Latency and prompt tokens per row on the first n samples, without and with the prefix cache.
+    make_backend(prefix_cache=...) builds the backend, e.g. lambda **kw: OllamaBackend(examples=ex, **kw).
+    """
+    samples = samples[:n]
+    rows = {}
+    for enabled in (False, True):
+        backend = make_backend(prefix_cache=enabled)
+        predictions = [p for start in range(0, len(samples), backend.batch_size)
+                       for p, _ in backend.predict(samples[start:start + backend.batch_size])]
+        usage = [backend.usage[s.key] for s in samples if s.key in backend.usage]
+        latency = sum(u["latency"] for u in usage) / max(len(usage), 1)
+        tokens = [u["prompt_tokens"] for u in usage if u["prompt_tokens"] is not None]
+        rows[enabled] = (latency, sum(tokens) / max(len(tokens), 1), predictions)
+    same = sum(a == b for a, b in zip(rows[False][2], rows[True][2]))
+    print(f"🧪 Prefix cache on {len(samples)} rows:")
+    for enabled, label in ((False, "full prompt"), (True, "prefix cache")):
+        print(f"   {label:<13} {rows[enabled][0]:.3f}s/row  {rows[enabled][1]:.0f} prompt tokens/row")
+    print(f"   identical predictions: {same}/{len(samples)}")
+    return rows
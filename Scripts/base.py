@@ -1,122 +1,210 @@
-import os, hashlib, requests, time, random
-import pandas as pd
+import hashlib, time, threading
 import torch
-from tqdm import tqdm
-from PIL import Image
 from datetime import datetime, timedelta
-from transformers import BlipProcessor, BlipForConditionalGeneration
+from http_client import client
+from image_store import ImageStore
+from writer import RowWriter
+from captioner import Captioner, CAPTION_BATCH, load_pixels
+from pixel_cache import PixelCache
+from pipeline import Stage, Pipeline
+from inat_harvester import Harvester, CURSOR_FILE
+from dedup_index import DedupIndex, DEDUP_PATH, key64
+import metrics
 
 # --- CONFIGURATION ---
 IMAGE_DIR = "images"
 METADATA_CSV = "final.csv"
+FAILED_CSV = "failed_captions.csv"  # images that could not be captioned, with the reason
 TOTAL_TARGET = 25000
 BATCH_SIZE = 40 
 DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
 CACHE_PATH = r"C:\huggingface_cache"
 MODEL_NAME = "Salesforce/blip-image-captioning-large"
+INAT_URL = "https://api.inaturalist.org/v1/observations"
+INAT_RANGES = 8  # id ranges paged concurrently (all share the api.inaturalist.org rate limit)
+
+# Pipeline sizing: page fetch -> download -> decode -> caption -> write
+DOWNLOAD_WORKERS = 8
+DECODE_WORKERS = 4
+QUEUE_SIZE = 64  # max items waiting in front of each stage (backpressure)
+# Decoded + resized BLIP inputs. Off by default: each image is captioned once here and the
+# evaluators read Qwen-sized entries, so BLIP-sized ones would only cost a write each.
+# Set to pixel_cache.PIXEL_CACHE_DIR when re-captioning the same images.
+PIXEL_CACHE = ""
+
+# Metrics: Prometheus text on METRICS_PORT (None to disable) and/or a JSON snapshot file ("" to disable).
+# Profiling is switched on per run with GMGBD_PROFILE=cprofile|sample (see metrics.py).
+METRICS_PORT = None
+METRICS_JSON = "base.metrics.json"
 
 # EXACT columns requested
 COLS = ["filename", "scientific_name", "common_name", "latitude", "longitude", "sighting_date", "blip_caption"]
 
-os.makedirs(IMAGE_DIR, exist_ok=True)
-processor, model = None, None
+store = ImageStore(IMAGE_DIR)  # content-addressed, sharded, atomic writes
+captioner = None
+writer, failed_writer = None, None  # RowWriters for METADATA_CSV / FAILED_CSV, opened in main()
+pipe = None
+harvester = None  # Harvester of this run, created by iter_inat_items()
+current_count = 0
+seen = None  # DedupIndex of saved observations / photos / URL hashes / image names, opened in main()
+inflight, inflight_lock = set(), threading.Lock()  # keys downloaded but not yet in a flushed CSV block
+pending = {}  # filename -> dedup keys of rows waiting for the writer to flush (guarded by inflight_lock)
 
 # -----------------------------
-# 1. Processing logic (AI Vision)
+# 1. Fetching Logic (iNaturalist)
 # -----------------------------
-def process_batch(records_list):
-    global processor, model
-    if model is None:
-        print(f"📥 Loading BLIP model on {DEVICE}...")
-        processor = BlipProcessor.from_pretrained(MODEL_NAME, cache_dir=CACHE_PATH)
-        model = BlipForConditionalGeneration.from_pretrained(MODEL_NAME, torch_dtype=torch.float16, cache_dir=CACHE_PATH).to(DEVICE)
-
-    enriched_data = []
-    for row in tqdm(records_list, desc="Captioning Batch"):
-        fname, sc_name, cm_name, lat, lon, s_date = row
-        
-        # 🤖 AI Vision Captioning
-        try:
-            img_path = os.path.join(IMAGE_DIR, fname)
-            img = Image.open(img_path).convert('RGB')
-            inputs = processor(images=img, return_tensors="pt").to(DEVICE, torch.float16)
-            out = model.generate(**inputs, max_length=50)
-            blip_cap = processor.decode(out[0], skip_special_tokens=True).strip()
-        except Exception as e:
-            blip_cap = "wildlife observation"
-
-        enriched_data.append([fname, sc_name, cm_name, lat, lon, s_date, blip_cap])
-
-    # Append to CSV immediately
-    pd.DataFrame(enriched_data, columns=COLS).to_csv(METADATA_CSV, mode='a', index=False, header=not os.path.exists(METADATA_CSV))
+def iter_inat_items():
+    global harvester
+    # Safe date set to 2 days ago to ensure image URLs are fully propagated
+    safe_date = (datetime.now() - timedelta(days=2)).strftime('%Y-%m-%d')
+    params = {"has[]": "photos", "quality_grade": "research", "d2": safe_date}
+    # id-cursor ranges with per-range checkpoints (inat_harvester.py) instead of page numbers
+    harvester = Harvester(INAT_URL, params, ranges=INAT_RANGES, checkpoint=CURSOR_FILE)
+    for item in harvester:
+        item.setdefault("observed_on", safe_date)
+        yield item
+
+def download(item):
+    photo = item['photos'][0]
+    photo_url = photo['url'].replace("square", "large")
+    # Observation id, photo id and URL hash are all checked before downloading
+    u_hash = hashlib.sha256(photo_url.encode()).hexdigest()[:16]
+    keys = [("obs", item.get("id")), ("photo", photo.get("id")), ("url", u_hash)]
+    claimed = {key64(k, v) for k, v in keys if v is not None}
+    with inflight_lock:
+        if claimed & inflight or seen.seen_any(keys):
+            return []
+        inflight.update(claimed)
+
+    # Download Image (stored under the hash of its bytes)
+    try:
+        resp = client.get(photo_url, timeout=10)
+        resp.raise_for_status()
+        fname, _ = store.put(resp.content)
+
+        # Collect basic metadata
+        lat = item['geojson']['coordinates'][1]
+        lon = item['geojson']['coordinates'][0]
+        sc_name = item.get("taxon", {}).get("name", "Unknown")
+        cm_name = item.get("taxon", {}).get("preferred_common_name", sc_name)
+        obs_date = item.get("observed_on")
+    except Exception:
+        release(claimed)
+        harvester.retry_later(item.get("id"))  # the cursor is already past it
+        raise
+
+    content = key64("content", fname)
+    with inflight_lock:
+        if content in inflight or seen.contains("content", fname):
+            inflight.difference_update(claimed)
+            return []  # same photo, different URL
+        inflight.add(content)
+        pending[fname] = (keys + [("content", fname)], claimed | {content})
+    return [[fname, sc_name, cm_name, lat, lon, obs_date]]
+
+def release(claimed):
+    with inflight_lock:
+        inflight.difference_update(claimed)
+
+def committed(rows):
+    """RowWriter on_flush: rows are durable in the CSV, so their keys go into the dedup index."""
+    with inflight_lock:
+        done = [pending.pop(str(r["filename"]), None) for r in rows]
+    done = [d for d in done if d is not None]
+    seen.add([pair for keys, _ in done for pair in keys])
+    for _, claimed in done:
+        release(claimed)
 
 # -----------------------------
-# 2. Fetching Logic (iNaturalist)
+# 2. Processing logic (AI Vision)
 # -----------------------------
-def fetch_inat_records(count, existing_hashes, page):
-    new_records = []
-    # Safe date set to 2 days ago to ensure image URLs are fully propagated
-    safe_date = (datetime.now() - timedelta(days=2)).strftime('%Y-%m-%d')
-    url = f"https://api.inaturalist.org/v1/observations?per_page={count}&page={page}&has[]=photos&quality_grade=research&order_by=id&d2={safe_date}"
-    
+def decode(record):
+    pixels, err = load_pixels(captioner.processor, store.path(record[0]), captioner.pixel_cache)
+    return [(record, pixels, err)]
+
+def caption(batch):
+    # 🤖 AI Vision Captioning (one generate() per batch)
+    ok = [i for i, (_, _, err) in enumerate(batch) if err is None]
     try:
-        res = requests.get(url, timeout=15).json().get("results", [])
-        for item in res:
-            photo_url = item['photos'][0]['url'].replace("square", "large")
-            # Generate unique hash for duplicate prevention
-            u_hash = hashlib.sha256(photo_url.encode()).hexdigest()[:16]
-            
-            if u_hash in existing_hashes:
-                continue
-            
-            # Download Image
-            try:
-                img_data = requests.get(photo_url, timeout=10).content
-                fname = f"img_{u_hash}.jpg"
-                with open(os.path.join(IMAGE_DIR, fname), 'wb') as f:
-                    f.write(img_data)
-                
-                # Collect basic metadata
-                lat = item['geojson']['coordinates'][1]
-                lon = item['geojson']['coordinates'][0]
-                sc_name = item.get("taxon", {}).get("name", "Unknown")
-                cm_name = item.get("taxon", {}).get("preferred_common_name", sc_name)
-                obs_date = item.get("observed_on", safe_date)
-                
-                new_records.append([fname, sc_name, cm_name, lat, lon, obs_date])
-                existing_hashes.add(u_hash)
-            except:
-                continue
+        captions = dict(zip(ok, captioner.generate([batch[i][1] for i in ok]))) if ok else {}
+        gen_err = None
     except Exception as e:
-        print(f"Connection issue: {e}")
-        time.sleep(5)
-        
-    return new_records
+        captions, gen_err = {}, f"generate failed: {type(e).__name__}: {e}"
+    out = []
+    for i, (record, _, err) in enumerate(batch):
+        if i in captions:
+            out.append((record, captions[i], None))
+        else:
+            out.append((record, None, err or gen_err))
+    return out
+
+def give_back(fname):
+    """The row for fname is not saved in this run: free its dedup keys and have the harvester fetch it again."""
+    with inflight_lock:
+        keys = pending.pop(fname, None)
+    if keys is not None:
+        # The harvester cursor is already past this observation: it is fetched again by id
+        # on the next run, so its dedup keys must not block it
+        release(keys[1])
+        harvester.retry_later(dict(keys[0]).get("obs"))
+
+def write(result):
+    global current_count
+    record, blip_cap, err = result
+    if err is not None:
+        failed_writer.write({"filename": record[0], "error": err})
+        give_back(record[0])
+        return []
+    if current_count >= TOTAL_TARGET:
+        give_back(record[0])  # still in flight when the target was reached
+        return []
+    writer.write(dict(zip(COLS, [*record, blip_cap])))
+    current_count += 1
+    if current_count >= TOTAL_TARGET:
+        pipe.stop()
+    return []
 
 def main():
-    hashes = set()
-    if os.path.exists(METADATA_CSV):
-        try:
-            df = pd.read_csv(METADATA_CSV)
-            # Extract hash from existing filenames
-            hashes.update(df['filename'].str.replace('img_','').str.replace('.jpg','').tolist())
-        except:
-            pass
-    
-    current_count = len(hashes)
-    page = (current_count // BATCH_SIZE) + 1
+    global writer, failed_writer, captioner, pipe, current_count, seen
+    stop_metrics = metrics.start("base", METRICS_PORT, METRICS_JSON)
+    writer = RowWriter(METADATA_CSV, COLS, flush_rows=BATCH_SIZE, on_flush=committed)
+    failed_writer = RowWriter(FAILED_CSV, ["filename", "error"], flush_rows=1)
+    t0 = time.perf_counter()
+    seen = DedupIndex(DEDUP_PATH)
+    if seen.count() == 0 and writer.done:
+        # First run with the index: seed it from the journal. Older rows were named after
+        # the URL hash, so their names also seed the pre-download URL check.
+        seen.add([("content", f) for f in writer.done] +
+                 [("url", f.replace('img_', '').replace('.jpg', '')) for f in writer.done])
+    print(f"🧮 Dedup index: {seen.stats()} loaded in {(time.perf_counter() - t0) * 1000:.0f} ms")
+
+    current_count = len(writer.done)
     print(f"🚀 Started! Target: {TOTAL_TARGET} | Current: {current_count} | GPU: {DEVICE}")
 
-    while current_count < TOTAL_TARGET:
-        batch = fetch_inat_records(BATCH_SIZE, hashes, page)
-        if batch:
-            process_batch(batch)
-            current_count += len(batch)
-        
-        page += 1
-        # Small sleep to prevent iNat API rate limiting
-        time.sleep(0.5)
-        
+    if current_count < TOTAL_TARGET:
+        print(f"📥 Loading BLIP model on {DEVICE}...")
+        captioner = Captioner.from_pretrained(MODEL_NAME, DEVICE, cache_dir=CACHE_PATH, batch_size=CAPTION_BATCH,
+                                              pixel_cache=PixelCache(PIXEL_CACHE) if PIXEL_CACHE else None)
+
+        source = iter_inat_items()
+        pipe = Pipeline(source, [
+            Stage("download", download, workers=DOWNLOAD_WORKERS, queue_size=QUEUE_SIZE),
+            Stage("decode", decode, workers=DECODE_WORKERS, queue_size=QUEUE_SIZE),
+            Stage("caption", caption, queue_size=QUEUE_SIZE, batch_size=CAPTION_BATCH),
+            Stage("write", write, queue_size=QUEUE_SIZE),
+        ])
+        pipe.run()
+        source.close()  # stopped at TOTAL_TARGET: the feeder left the generator suspended
+        if harvester is not None:
+            harvester.flush()  # the pipeline has drained: every page handed out is fully processed
+            harvester.close()  # and the range walkers must not outlive it
+        print(client.report())
+        print(f"🖼️ Captioned {captioner.images} images at {captioner.images_per_sec():.1f} images/s")
+
+    writer.close()
+    failed_writer.close()
+    seen.close()
+    stop_metrics()
     print(f"🏁 Mission Complete. {current_count} records saved to {METADATA_CSV}")
 
 if __name__ == "__main__":
@@ -0,0 +1,275 @@
+import os
+import sys
+import json
+import time
+import random
+import tempfile
+import threading
+import subprocess
+import numpy as np
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from inat_harvester import fake_jpeg, fake_observation
+from weather_planner import stub_body
+from fakes import Faults, fake_ee
+
+try:
+    import resource  # not available on Windows: peak RSS is then reported as None
+except ImportError:
+    resource = None
+
+# --- CONFIGURATION ---
+SIZES = [1_000, 10_000, 100_000]     # synthetic rows per run
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")  # written with --save
+TOLERANCE = 0.20                     # flag changes of more than 20% against the baseline
+
+# Fault injection, applied to every fake request (HTTP and ee getInfo)
+LATENCY_S = 0.005                    # mean added latency (uniform 0.5x .. 1.5x)
+ERROR_RATE = 0.01                    # share of requests answered with 503 / an EEException
+STALL_RATE = 0.0                     # share of requests that hang for STALL_SECONDS
+STALL_SECONDS = 30                   # longer than the client timeouts, so a stall ends as a timeout
+
+# -----------------------------
+# 1. Fake HTTP services (iNat, Nominatim, Open-Meteo)
+# -----------------------------
+COUNTRIES = ["Kenya", "Brazil", "India", "Australia", "Canada", "Spain", "Japan", "Peru"]
+
+def nominatim_body(lat, lon):
+    """Deterministic jsonv2 reverse-geocoding answer; a few cells come back without a city."""
+    i = int((lat + 90) * 7 + (lon + 180) * 3)
+    address = {"country": COUNTRIES[i % len(COUNTRIES)], "state": f"State {i % 40}"}
+    if i % 5:
+        address["city"] = f"City {i % 300}"
+    return {"lat": str(lat), "lon": str(lon), "address": address}
+
+class _FakeHandler(BaseHTTPRequestHandler):
+    """All fake upstreams on one port; every request goes through the server's Faults first."""
+    def _send(self, status, body, ctype="application/json"):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode()
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client gave up (stall) before the answer
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        q = {k: v[0] for k, v in parse_qs(url.query).items()}
+        srv = self.server
+        route = ("photo" if url.path.startswith("/photos/") else "inat" if url.path.endswith("/observations")
+                 else "nominatim" if url.path == "/reverse" else "open_meteo" if url.path.startswith("/v1/") else None)
+        if route is None:
+            return self._send(404, {})
+        if srv.faults.inject(route) == "error":
+            return self._send(503, {"error": "injected"})
+
+        if route == "photo":
+            return self._send(200, fake_jpeg(int(url.path.split("/")[2])), "image/jpeg")
+        if route == "nominatim":
+            return self._send(200, nominatim_body(float(q["lat"]), float(q["lon"])))
+        if route == "open_meteo":
+            return self._send(200, stub_body(url.path, q))
+        lo, hi = int(q.get("id_above", -1)), int(q.get("id_below", 1 << 62))
+        per_page = min(int(q.get("per_page", 30)), 200)
+        ids = [i for i in srv.ids if lo < i < hi]
+        if q.get("order") == "desc":
+            ids = ids[::-1]
+        base = f"http://127.0.0.1:{srv.server_address[1]}"
+        self._send(200, {"total_results": len(ids), "per_page": per_page,
+                         "results": [fake_observation(i, base) for i in ids[:per_page]]})
+
+    def log_message(self, *args):
+        pass
+
+def fake_services(n, faults, seed=0):
+    """Starts the fakes with n iNat observations; returns (server, base url)."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _FakeHandler)
+    server.daemon_threads = True
+    server.ids = sorted(random.Random(seed).sample(range(1, n * 5), n))
+    server.faults = faults
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+# -----------------------------
+# 2. One run (child process, inside a scratch directory)
+# -----------------------------
+def timed(samples, name, fn):
+    """Wraps fn so every call's duration lands in samples[name]."""
+    durations = samples.setdefault(name, [])
+
+    def wrapper(*args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            durations.append(time.perf_counter() - t0)
+    return wrapper
+
+def latency_summary(samples):
+    out = {}
+    for name, d in samples.items():
+        if d:
+            p50, p99 = np.percentile(d, [50, 99])
+            out[name] = {"calls": len(d), "p50_ms": round(p50 * 1000, 2), "p99_ms": round(p99 * 1000, 2)}
+    return out
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / 1024 ** 2 if sys.platform == "darwin" else rss / 1024, 1)  # bytes on macOS, KiB elsewhere
+
+def run_once(n, faults):
+    """base.py then environment.py against the fakes in the current directory; returns the metrics."""
+    server, base_url = fake_services(int(n * 1.1) + 10, faults)
+    sys.modules["ee"] = fake_ee(faults)
+
+    import base
+    import environment
+    from captioner import Captioner
+
+    class TinyCaptioner(Captioner):
+        @classmethod
+        def from_pretrained(cls, name, device, cache_dir=None, **kwargs):
+            return cls.tiny(**kwargs)
+
+    result = {"rows": n}
+
+    # base.py: iNat pages -> photo download -> decode -> caption -> final.csv
+    base.INAT_URL = base_url + "/v1/observations"
+    base.TOTAL_TARGET = n
+    base.Captioner = TinyCaptioner
+    samples = {}
+    for stage in ["download", "decode", "caption", "write"]:
+        setattr(base, stage, timed(samples, stage, getattr(base, stage)))
+    t0 = time.perf_counter()
+    base.main()
+    elapsed = time.perf_counter() - t0
+    result["base"] = {"rows": base.current_count, "seconds": round(elapsed, 2),
+                      "rows_per_s": round(base.current_count / elapsed, 2),
+                      "stage_errors": {s.name: s.stats.errors for s in base.pipe.stages},
+                      "stages": latency_summary(samples)}
+
+    # environment.py: final.csv -> geocode / weather / NDVI / water -> gmgbd.csv
+    environment.INPUT_CSV = base.METADATA_CSV
+    environment.NOMINATIM_URL = base_url + "/reverse"
+    environment.ARCHIVE_URL = base_url + "/v1/archive"
+    environment.ELEVATION_URL = base_url + "/v1/elevation"
+    samples = {}
+    for name in ["prefetch_geocode", "prefetch_batch", "prefetch_weather"]:
+        setattr(environment, name, timed(samples, name, getattr(environment, name)))
+    environment.LOOKUPS = [(p, timed(samples, fn.__name__, fn)) for p, fn in environment.LOOKUPS]
+    t0 = time.perf_counter()
+    environment.main()
+    elapsed = time.perf_counter() - t0
+    with open(environment.OUTPUT_CSV, 'rb') as f:
+        rows = max(0, sum(1 for _ in f) - 1)
+    result["environment"] = {"rows": rows, "seconds": round(elapsed, 2), "rows_per_s": round(rows / elapsed, 2),
+                             "stages": latency_summary(samples)}
+
+    server.shutdown()
+    result["requests"] = faults.counts
+    result["requests_per_row"] = round(sum(c["requests"] for c in faults.counts.values()) / max(rows, 1), 3)
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+# -----------------------------
+# 3. Driver: one child process per size, report, baseline
+# -----------------------------
+# (metric path, higher is better)
+COMPARED = [
+    (("base", "rows_per_s"), True),
+    (("environment", "rows_per_s"), True),
+    (("requests_per_row",), False),
+    (("peak_rss_mb",), False),
+]
+
+def _get(d, path):
+    for k in path:
+        d = d.get(k) if isinstance(d, dict) else None
+    return d
+
+def run_size(n, faults):
+    """Runs one size in a fresh interpreter (clean module state, own peak RSS) and scratch directory."""
+    with tempfile.TemporaryDirectory() as tmp:
+        out, log = os.path.join(tmp, "result.json"), os.path.join(tmp, "run.log")
+        with open(log, 'w') as f:
+            proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", str(n), out,
+                                   json.dumps(faults.config())], cwd=tmp, stdout=f, stderr=subprocess.STDOUT)
+        if proc.returncode != 0 or not os.path.exists(out):
+            with open(log, 'r', errors='replace') as f:
+                print("".join(f.readlines()[-30:]))
+            raise RuntimeError(f"benchmark run with {n} rows failed (exit {proc.returncode})")
+        with open(out, 'r') as f:
+            return json.load(f)
+
+def report(r):
+    lines = [f"📊 {r['rows']} rows  (peak RSS {r['peak_rss_mb']} MB, {r['requests_per_row']} requests/row)"]
+    for phase in ["base", "environment"]:
+        p = r[phase]
+        lines.append(f"   {phase:<12} {p['rows']} rows in {p['seconds']}s = {p['rows_per_s']} rows/s")
+        for name, s in p["stages"].items():
+            lines.append(f"      {name:<18} calls={s['calls']:<7} p50={s['p50_ms']:>8.2f} ms  p99={s['p99_ms']:>8.2f} ms")
+    for route, c in sorted(r["requests"].items()):
+        lines.append(f"   {route:<12} requests={c['requests']:<7} errors={c['errors']:<5} stalls={c['stalls']}")
+    return "\n".join(lines)
+
+def compare(results, baseline):
+    """Prints each compared metric against the baseline run of the same size."""
+    for key, r in results.items():
+        old = baseline.get("runs", {}).get(key)
+        if old is None:
+            print(f"   {key} rows: no baseline")
+            continue
+        for path, higher_better in COMPARED:
+            a, b = _get(old, path), _get(r, path)
+            if not a or b is None:
+                continue
+            change = (b - a) / a
+            worse = change < -TOLERANCE if higher_better else change > TOLERANCE
+            mark = "⚠️" if worse else "✅"
+            print(f"   {mark} {key} rows {'.'.join(path):<24} {a} -> {b} ({change:+.0%})")
+
+def main():
+    """python benchmark.py [sizes...] [latency=S] [errors=RATE] [stalls=RATE] [--save]"""
+    args = sys.argv[1:]
+    if args[:1] == ["--child"]:
+        n, out, cfg = int(args[1]), args[2], json.loads(args[3])
+        result = run_once(n, Faults(cfg["latency"], cfg["error_rate"], cfg["stall_rate"], cfg["stall_seconds"]))
+        with open(out, 'w') as f:
+            json.dump(result, f)
+        return
+
+    opts = dict(a.split("=", 1) for a in args if "=" in a)
+    faults = Faults(float(opts.get("latency", LATENCY_S)), float(opts.get("errors", ERROR_RATE)),
+                    float(opts.get("stalls", STALL_RATE)))
+    sizes = [int(a) for a in args if a.isdigit()] or SIZES
+    print(f"🧪 Benchmark: sizes {sizes}, faults {faults.config()}")
+
+    results = {}
+    for n in sizes:
+        results[str(n)] = run_size(n, faults)
+        print(report(results[str(n)]))
+
+    if os.path.exists(BASELINE_FILE):
+        with open(BASELINE_FILE, 'r') as f:
+            baseline = json.load(f)
+        if baseline.get("faults") != faults.config():
+            print(f"⚠️ {BASELINE_FILE} was recorded with faults {baseline.get('faults')}")
+        print(f"🔍 Against {BASELINE_FILE}:")
+        compare(results, baseline)
+    else:
+        print(f"ℹ️ No baseline yet: run with --save to record one in {BASELINE_FILE}")
+    if "--save" in args:
+        runs = baseline.get("runs", {}) if os.path.exists(BASELINE_FILE) else {}
+        with open(BASELINE_FILE, 'w') as f:
+            json.dump({"faults": faults.config(), "runs": {**runs, **results}}, f, indent=2)
+        print(f"💾 Baseline saved to {BASELINE_FILE}")
+
+if __name__ == "__main__":
+
+    main()
@@ -0,0 +1,121 @@
+import os
+import time
+import tempfile
+import concurrent.futures
+import torch
+from PIL import Image
+from pixel_cache import fixed_size_spec, normalize
+from transformers import (BlipProcessor, BlipForConditionalGeneration, BlipConfig,
+                          BlipImageProcessor, BertTokenizer)
+
+# --- CONFIGURATION ---
+CAPTION_BATCH = 16     # images per generate() call
+DECODE_WORKERS = 4     # threads decoding + preprocessing images ahead of the model
+MAX_LENGTH = 50
+CPU_PRECISION = "bf16"  # "fp32", "bf16" or "int8" (dynamic quantization of Linear layers)
+
+# -----------------------------
+# 1. Decode / preprocess (runs on the worker pool)
+# -----------------------------
+def load_pixels(processor, path, cache=None):
+    """Returns (pixel_values, error) for one image; never raises. With a PixelCache, decode + resize is done once per image."""
+    try:
+        if cache is not None:
+            ip = processor.image_processor
+            return torch.from_numpy(normalize(ip, cache.get(path, fixed_size_spec(ip)))), None
+        with Image.open(path) as img:
+            img = img.convert('RGB')
+        return processor(images=img, return_tensors="pt")["pixel_values"][0], None
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+
+# -----------------------------
+# 2. Batched captioning
+# -----------------------------
+class Captioner:
+    def __init__(self, processor, model, device="cpu", dtype=torch.float32,
+                 batch_size=CAPTION_BATCH, workers=DECODE_WORKERS, max_length=MAX_LENGTH, pixel_cache=None):
+        self.processor = processor
+        self.pixel_cache = pixel_cache
+        self.model = model.eval()
+        self.device = device
+        self.dtype = dtype
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="decode")
+        self.images = 0
+        self.seconds = 0.0
+
+    @classmethod
+    def from_pretrained(cls, name, device, cache_dir=None, cpu_precision=CPU_PRECISION, **kwargs):
+        processor = BlipProcessor.from_pretrained(name, cache_dir=cache_dir)
+        if device == "cuda":
+            dtype = torch.float16
+        else:
+            dtype = torch.bfloat16 if cpu_precision == "bf16" else torch.float32
+        model = BlipForConditionalGeneration.from_pretrained(name, torch_dtype=dtype, cache_dir=cache_dir).to(device)
+        if device != "cuda" and cpu_precision == "int8":
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        return cls(processor, model, device, dtype, **kwargs)
+
+    @classmethod
+    def tiny(cls, image_size=32, **kwargs):
+        """Randomly initialized few-layer BLIP: no download, runs on CPU. For tests and benchmarks."""
+        vocab = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]", "[DEC]", "a", "bird", "on", "the", "tree", "water"]
+        with tempfile.TemporaryDirectory() as tmp:
+            vocab_file = os.path.join(tmp, "vocab.txt")
+            with open(vocab_file, 'w') as f:
+                f.write("\n".join(vocab))
+            tokenizer = BertTokenizer(vocab_file)
+        image_processor = BlipImageProcessor(size={"height": image_size, "width": image_size})
+        processor = BlipProcessor(image_processor=image_processor, tokenizer=tokenizer)
+        config = BlipConfig(
+            text_config=dict(vocab_size=len(vocab), hidden_size=32, num_hidden_layers=1, num_attention_heads=2,
+                             intermediate_size=37, pad_token_id=0, sep_token_id=3, bos_token_id=5),
+            vision_config=dict(hidden_size=32, num_hidden_layers=1, num_attention_heads=2, intermediate_size=37,
+                               image_size=image_size, patch_size=8),
+        )
+        torch.manual_seed(0)
+        return cls(processor, BlipForConditionalGeneration(config), "cpu", torch.float32, **kwargs)
+
+    def generate(self, pixels):
+        """Captions for a batch of preprocessed images; every call counts towards images_per_sec()."""
+        start = time.perf_counter()
+        batch = torch.stack(pixels).to(self.device, self.dtype)
+        with torch.inference_mode():
+            out = self.model.generate(pixel_values=batch, max_length=self.max_length)
+        captions = [c.strip() for c in self.processor.batch_decode(out, skip_special_tokens=True)]
+        self.images += len(pixels)
+        self.seconds += time.perf_counter() - start
+        return captions
+
+    def caption(self, paths):
+        """
+        Returns one (caption, error) per path, in order. Images are decoded ahead of the
+        model on the worker pool; failures come back as (None, error), never as a caption.
+        """
+        decoded = self.pool.map(lambda p: load_pixels(self.processor, p, self.pixel_cache), paths)
+        results, pixels, slots = [], [], []
+        for pix, err in decoded:
+            results.append((None, err))
+            if pix is not None:
+                pixels.append(pix)
+                slots.append(len(results) - 1)
+            if len(pixels) == self.batch_size:
+                self._fill(results, slots, pixels)
+                pixels, slots = [], []
+        if pixels:
+            self._fill(results, slots, pixels)
+        return results
+
+    def _fill(self, results, slots, pixels):
+        try:
+            for i, cap in zip(slots, self.generate(pixels)):
+                results[i] = (cap, None)
+        except Exception as e:
+            for i in slots:
+                results[i] = (None, f"generate failed: {type(e).__name__}: {e}")
+
+    def images_per_sec(self):
+        """Captioned images per second of model time (decoding runs ahead on the pool)."""
+        return self.images / self.seconds if self.seconds else 0.0
@@ -0,0 +1,141 @@
+import os
+import hashlib
+import threading
+import numpy as np
+
+# --- CONFIGURATION ---
+DEDUP_PATH = "dedup_index"   # writes dedup_index.keys / .bloom / .log
+CAPACITY = 2_000_000         # keys the Bloom filter is sized for (rebuilt larger when exceeded)
+BITS_PER_KEY = 10            # ~1% false positives with 7 hashes
+N_HASHES = 7
+COMPACT_LOG_KEYS = 100_000   # merge the append log into the sorted key file past this many keys
+
+def key64(kind, value):
+    """Stable 64-bit key for ('obs', 123), ('photo', 456), ('url', 'https://...'), ('content', 'img_...jpg')."""
+    return int.from_bytes(hashlib.sha256(f"{kind}:{value}".encode()).digest()[:8], "little")
+
+class DedupIndex:
+    """
+    Persistent set of 64-bit keys for observations, photos, URLs and stored images.
+      - .keys  : sorted uint64 array, memory-mapped (binary search, no Python objects)
+      - .log   : uint64 keys added since the last compaction (appended and fsynced per add)
+      - .bloom : Bloom filter bit array over all keys, so most unseen keys never touch .keys
+    Memory stays at a few bytes per key instead of a Python set of strings, and loading is a
+    couple of mmaps plus reading the log.
+    """
+    def __init__(self, path=DEDUP_PATH, capacity=CAPACITY):
+        self.path = path
+        self.lock = threading.Lock()
+        self.keys = self._map_keys()
+        log = np.fromfile(path + ".log", dtype=np.uint64) if os.path.exists(path + ".log") else np.empty(0, np.uint64)
+        self.recent = set(log.tolist())
+        self.log = open(path + ".log", 'ab')
+        bloom = path + ".bloom"
+        if os.path.exists(bloom) and os.path.getsize(bloom) > 1:
+            capacity = (os.path.getsize(bloom) - 1) * 8 // BITS_PER_KEY  # size the saved filter was built for
+        self.capacity = max(capacity, 2 * self.count())
+        self.bits = self._load_bloom()
+
+    # --- storage ---
+    def _map_keys(self):
+        p = self.path + ".keys"
+        if os.path.exists(p) and os.path.getsize(p):
+            return np.memmap(p, dtype=np.uint64, mode='r')
+        return np.empty(0, np.uint64)
+
+    def _positions(self, keys):
+        """N_HASHES bit positions per key by double hashing the two 32-bit halves."""
+        keys = np.asarray(keys, dtype=np.uint64)
+        h1 = keys & np.uint64(0xFFFFFFFF)
+        h2 = (keys >> np.uint64(32)) | np.uint64(1)
+        i = np.arange(N_HASHES, dtype=np.uint64)
+        return ((h1[:, None] + i * h2[:, None]) % np.uint64(self.capacity * BITS_PER_KEY)).astype(np.int64)
+
+    def _set_bits(self, bits, keys):
+        pos = self._positions(keys).reshape(-1)
+        np.bitwise_or.at(bits, pos >> 3, (1 << (pos & 7)).astype(np.uint8))
+
+    def _load_bloom(self):
+        p = self.path + ".bloom"
+        n_bytes = self.capacity * BITS_PER_KEY // 8 + 1
+        if os.path.exists(p) and os.path.getsize(p) == n_bytes:
+            bits = np.fromfile(p, dtype=np.uint8)
+        else:
+            bits = np.zeros(n_bytes, np.uint8)
+            for start in range(0, len(self.keys), 1_000_000):
+                self._set_bits(bits, self.keys[start:start + 1_000_000])
+        if self.recent:
+            self._set_bits(bits, list(self.recent))
+        return bits
+
+    def count(self):
+        return len(self.keys) + len(self.recent)
+
+    # --- queries ---
+    def _maybe(self, key):
+        pos = self._positions([key])[0]
+        return bool(np.all(self.bits[pos >> 3] & (1 << (pos & 7)).astype(np.uint8)))
+
+    def _has(self, key):
+        if not self._maybe(key):
+            return False
+        if key in self.recent:
+            return True
+        i = np.searchsorted(self.keys, np.uint64(key))
+        return bool(i < len(self.keys) and self.keys[i] == key)
+
+    def contains(self, kind, value):
+        with self.lock:
+            return self._has(key64(kind, value))
+
+    def seen_any(self, pairs):
+        """True if any (kind, value) pair is already known; None values are skipped."""
+        with self.lock:
+            return any(self._has(key64(k, v)) for k, v in pairs if v is not None)
+
+    # --- updates ---
+    def add(self, pairs):
+        """Records (kind, value) pairs; durable once this returns (fsynced to the log)."""
+        keys = [key64(k, v) for k, v in pairs if v is not None]
+        with self.lock:
+            new = [k for k in keys if not self._has(k)]
+            if not new:
+                return
+            self.recent.update(new)
+            self.log.write(np.asarray(new, dtype=np.uint64).tobytes())
+            self.log.flush()
+            os.fsync(self.log.fileno())
+            self._set_bits(self.bits, new)
+            grow = self.count() > self.capacity
+            compact = len(self.recent) >= COMPACT_LOG_KEYS
+        if grow or compact:
+            self.compact(grow=grow)
+
+    def compact(self, grow=False):
+        """
+        Merges the log into the sorted key file. The Bloom filter is saved first, so the one on
+        disk always covers every key in .keys; the log is only emptied once .keys is replaced.
+        """
+        with self.lock:
+            merged = np.union1d(np.asarray(self.keys), np.fromiter(self.recent, np.uint64, len(self.recent))).astype(np.uint64)
+            if grow:
+                self.capacity = max(CAPACITY, 2 * len(merged))
+                self.bits = np.zeros(self.capacity * BITS_PER_KEY // 8 + 1, np.uint8)
+                for start in range(0, len(merged), 1_000_000):
+                    self._set_bits(self.bits, merged[start:start + 1_000_000])
+            self.bits.tofile(self.path + ".bloom.tmp")
+            os.replace(self.path + ".bloom.tmp", self.path + ".bloom")
+            merged.tofile(self.path + ".keys.tmp")
+            del self.keys  # unmaps the old file (Windows cannot replace a mapped file)
+            os.replace(self.path + ".keys.tmp", self.path + ".keys")
+            self.keys = self._map_keys()
+            self.recent = set()
+            self.log.close()
+            self.log = open(self.path + ".log", 'wb')
+
+    def close(self):
+        self.compact()
+        self.log.close()
+
+    def stats(self):
+        return {"keys": self.count(), "bloom_mb": round(len(self.bits) / 1024 ** 2, 1)}
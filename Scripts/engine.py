@@ -0,0 +1,200 @@
+import time
+import random
+import functools
+import threading
+import concurrent.futures
+import requests
+from http_client import TokenBucket, CallCancelled, RETRY_STATUS, call_deadline
+import metrics
+from metrics import registry
+
+# --- CONFIGURATION ---
+ROWS_IN_FLIGHT = 16
+
+# Per-provider limits: (max concurrent calls, max calls per second).
+# None = no engine-side rate limit: HTTP providers are throttled per host by http_client.
+PROVIDER_LIMITS = {
+    "nominatim": (1, None),   # OSM usage policy: no parallel requests (1 req/s in HOST_RATES)
+    "open_meteo": (8, None),
+    "gee": (8, 20.0),
+}
+
+CALL_DEADLINE = 45  # seconds before a single provider call counts as stalled
+MAX_RETRIES = 3
+# Earth Engine errors worth another attempt (matched in the message); other ee errors are final
+EE_TRANSIENT = ("too many concurrent", "timed out", "internal error", "service unavailable", "quota exceeded")
+
+# -----------------------------
+# 1. Providers
+# -----------------------------
+class Provider:
+    """One upstream service: its own worker threads (= concurrency cap) and its own rate limit."""
+    def __init__(self, name, max_concurrency, rate, bucket_factory=TokenBucket):
+        self.name = name
+        self.bucket = bucket_factory(rate, name=name) if rate else None
+        self.pool = concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix=name)
+        self.queued = registry.gauge("provider_queued", provider=name)    # submitted, not started
+        self.running = registry.gauge("provider_running", provider=name)
+        self.latency = registry.histogram("provider_lookup_seconds", provider=name)
+        self.calls = registry.counter("provider_calls_total", provider=name)  # network calls (cache misses)
+        self.failed = registry.counter("provider_lookup_errors_total", provider=name)
+
+    def _call(self, fn, row):
+        self.queued.dec()
+        self.running.inc()
+        t0 = time.perf_counter()
+        try:
+            return fn(row)
+        except Exception:
+            self.failed.inc()
+            raise
+        finally:
+            self.latency.observe(time.perf_counter() - t0)
+            self.running.dec()
+
+    def submit(self, fn, row):
+        self.queued.inc()
+        return self.pool.submit(self._call, fn, row)
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+# -----------------------------
+# 2. Enrichment engine
+# -----------------------------
+class Engine:
+    """
+    Runs the lookups of a row concurrently and keeps many rows in flight.
+    A lookup is a (provider_name, fn) pair where fn(row) returns a dict of new columns.
+    fn runs on the provider's pool and calls throttle(provider_name) right before each
+    network request, so answers served from a local cache are never rate limited.
+    """
+    def __init__(self, limits=PROVIDER_LIMITS, rows_in_flight=ROWS_IN_FLIGHT, bucket_factory=TokenBucket):
+        self.providers = {name: Provider(name, c, r, bucket_factory) for name, (c, r) in limits.items()}
+        self.rows_in_flight = rows_in_flight
+
+    def throttle(self, name):
+        provider = self.providers[name]
+        provider.calls.inc()
+        if provider.bucket is not None:
+            provider.bucket.acquire()
+
+    def enrich(self, row, lookups):
+        futures = [self.providers[p].submit(fn, row) for p, fn in lookups]
+        fields = {}
+        for f in futures:
+            fields.update(f.result())
+        return fields
+
+    def run(self, rows, lookups):
+        """Yields (row, fields, error) in completion order."""
+        rows = iter(rows)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.rows_in_flight, thread_name_prefix="row") as pool:
+            pending = {}
+
+            def refill():
+                while len(pending) < self.rows_in_flight:
+                    row = next(rows, None)
+                    if row is None:
+                        return
+                    pending[pool.submit(self.enrich, row, lookups)] = row
+
+            in_flight = registry.gauge("rows_in_flight")
+            refill()
+            while pending:
+                in_flight.set(len(pending))
+                done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for f in done:
+                    row = pending.pop(f)
+                    try:
+                        fields = f.result()
+                    except Exception as e:
+                        registry.counter("rows_total", status="failed").inc()
+                        yield row, None, e
+                        continue
+                    registry.counter("rows_total", status="ok").inc()
+                    yield row, fields, None
+                refill()
+
+    def shutdown(self):
+        for p in self.providers.values():
+            p.shutdown()
+
+# -----------------------------
+# 3. Per-call deadlines
+# -----------------------------
+class StalledCall(Exception):
+    pass
+
+def transient(err):
+    """True for errors another attempt may not hit: stalls, timeouts, dropped connections, 429/5xx."""
+    if isinstance(err, (StalledCall, CallCancelled, requests.Timeout, requests.ConnectionError, TimeoutError, ConnectionError)):
+        return True
+    if isinstance(err, requests.HTTPError):
+        return err.response is not None and err.response.status_code in RETRY_STATUS
+    if type(err).__name__ == "EEException":
+        return any(m in str(err).lower() for m in EE_TRANSIENT)
+    return False
+
+# One shared, bounded pool for every deadline-guarded call. A call that overruns is
+# cancelled: its HTTP requests are capped at the remaining time and stop retrying
+# (http_client.call_deadline); ee calls end on ee's own deadline. Until a stalled call
+# has actually stopped it keeps its slot, and when every slot is taken new calls fail
+# at once instead of queueing behind it, so queue time never eats into a deadline.
+DEADLINE_WORKERS = 64
+_deadline_pool = concurrent.futures.ThreadPoolExecutor(max_workers=DEADLINE_WORKERS, thread_name_prefix="deadline")
+_deadline_slots = threading.BoundedSemaphore(DEADLINE_WORKERS)
+_slots_busy = registry.gauge("deadline_slots_busy")
+
+def _release_slot(future):
+    _slots_busy.dec()
+    _deadline_slots.release()
+
+def _guarded(seconds, cancelled, func, args, kwargs):
+    with call_deadline(seconds, cancelled):
+        return func(*args, **kwargs)
+
+def with_deadline(deadline=CALL_DEADLINE, retries=MAX_RETRIES):
+    """Gives up on a call after `deadline` seconds; retries transient errors with jittered backoff, then raises."""
+    def decorator(func):
+        name = func.__name__
+        latency = registry.histogram("call_seconds", call=name)
+        stalls = registry.counter("call_stalls_total", call=name)
+        errors = registry.counter("call_errors_total", call=name)
+        retried = registry.counter("call_retries_total", call=name)
+        failures = registry.counter("call_failures_total", call=name)
+        busy = registry.counter("call_rejected_total", call=name)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            for attempt in range(retries + 1):
+                t0 = time.perf_counter()
+                if not _deadline_slots.acquire(blocking=False):
+                    busy.inc()
+                    err = StalledCall(f"{name}: all {DEADLINE_WORKERS} deadline slots held by stalled calls")
+                else:
+                    _slots_busy.inc()
+                    cancelled = threading.Event()
+                    future = _deadline_pool.submit(_guarded, deadline, cancelled, func, args, kwargs)
+                    future.add_done_callback(_release_slot)
+                    try:
+                        result = future.result(timeout=deadline)
+                        latency.observe(time.perf_counter() - t0)
+                        return result
+                    except concurrent.futures.TimeoutError:
+                        cancelled.set()
+                        stalls.inc()
+                        err = StalledCall(f"{name} exceeded {deadline}s")
+                    except Exception as e:
+                        errors.inc()
+                        err = e
+                    latency.observe(time.perf_counter() - t0)
+                if attempt == retries or not transient(err):
+                    failures.inc()
+                    raise err
+                retried.inc()
+                delay = min(2 ** (attempt + 1), 30) * random.uniform(0.5, 1.5)
+                print(f"\n⏳ {name} failed ({err}). Retry {attempt + 1}/{retries} in {delay:.0f}s...")
+                metrics.sleep(delay, "deadline_retry")
+        return wrapper
+    return decorator
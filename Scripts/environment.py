@@ -1,36 +1,76 @@
 import pandas as pd
-import requests
 import os
+import sys
 import time
 import ee
 from tqdm import tqdm
 from datetime import datetime, timedelta
-import concurrent.futures
+from http_client import client
+from engine import Engine, PROVIDER_LIMITS, ROWS_IN_FLIGHT, CALL_DEADLINE, with_deadline
+from writer import RowWriter, rewrite_csv
+from lookup_cache import LookupCache, CACHE_DB, GRID_DEG
+from gee_batch import (GeeBatch, composite_window, target_date, MODIS_COLLECTION, NDVI_BUFFER_M, NDVI_SCALE,
+                       WINDOW_DAYS, FALLBACK_YEARS, HYDRO_ACC, STREAM_THRESHOLD, WATER_SCALE)
+from postprocess import ndvi_category, NDVI_BINS, NDVI_LABELS
+from weather_planner import WeatherPlanner, CELL_DEG
+from provenance import Provenance, fingerprint
+from ledger import open_ledger, shared_buckets, shard_path, worker_id, LeaseKeeper, LEASE_TTL
+from journal import Journal, beat
+import metrics
+from metrics import registry
 
 # --- CONFIGURATION ---
 INPUT_CSV = "final.csv"
 OUTPUT_CSV = "gmgbd.csv"
 GEE_PROJECT = 'get your project id'
+JOURNAL_PATH = "gmgbd.journal"          # completed filenames + committed CSV size
+PARQUET_DIR = ""                        # e.g. "gmgbd_parquet" to also write partitioned Parquet
+PARQUET_PARTITIONS = ["country"]
+HEARTBEAT_FILE = "environment.heartbeat"  # touched after every finished row; watched by supervisor.py
+BATCH_SIZE = 200                        # rows per GEE batch / progress report
 
-import concurrent.futures
+# Endpoints (overridable so the pipeline can run against local stub servers)
+NOMINATIM_URL = "https://nominatim.openstreetmap.org/reverse"
+ELEVATION_URL = "https://api.open-meteo.com/v1/elevation"
+ARCHIVE_URL = "https://archive-api.open-meteo.com/v1/archive"
 
-def safe_request(func):
-    """Heavy-duty Watchdog with 'Cool-off' period."""
-    def wrapper(*args, **kwargs):
-        retry_delay = 5
-        while True:
-            with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
-                future = executor.submit(func, *args, **kwargs)
-                try:
-                    return future.result(timeout=45) # Shorter timeout to catch hangs faster
-                except (concurrent.futures.TimeoutError, Exception) as e:
-                    print(f"\n⏳ {func.__name__} stalled. Waiting 20s to reset connection...")
-                    # This 20s sleep is critical to clear the 'dead' connection
-                    time.sleep(20) 
-                    retry_delay = min(retry_delay + 5, 60)
-    return wrapper
-
-@safe_request
+# Existing enriched CSV used to pre-fill the lookup cache ("" to disable)
+SEED_CACHE_FROM = OUTPUT_CSV
+
+# Resolve NDVI and water distance for a whole batch in a few GEE round trips
+GEE_BATCH = True
+
+# Batch source for NDVI / water distance / elevation: "gee" (GeeBatch; elevation stays on
+# Open-Meteo) or "local" GeoTIFF rasters (raster.py). Per-row GEE/Open-Meteo calls remain
+# the fallback for anything the batch source cannot answer.
+RASTER_BACKEND = "gee"
+
+# Reverse geocode locally from admin boundaries (geocoder.py); Nominatim only for misses
+OFFLINE_GEOCODER = True
+NOMINATIM_FALLBACK = True
+
+# Fetch temperature per (grid cell, date range) with multi-coordinate archive requests and
+# elevation 100 points at a time (weather_planner.py); per-row requests only for leftovers
+WEATHER_PLANNER = True
+
+# Several workers (processes or hosts): "" runs alone and diffs INPUT_CSV against the journal.
+# A ledger file (e.g. "work_ledger.sqlite", shared by the workers of one host) or the URL of
+# `python ledger.py serve` hands out disjoint leased batches and shares the rate limits.
+# Each worker writes gmgbd.shard-<host>-<pid>.csv; `python ledger.py merge` builds OUTPUT_CSV.
+LEDGER = ""
+
+# Re-enrich only the columns whose provenance version changed (see VERSIONS below) and patch
+# OUTPUT_CSV in place, instead of processing new rows. Also: python environment.py incremental
+INCREMENTAL = False
+
+# Metrics: Prometheus text on METRICS_PORT (None to disable) and/or a JSON snapshot file ("" to disable).
+# Profiling is switched on per run with GMGBD_PROFILE=cprofile|sample (see metrics.py).
+METRICS_PORT = None
+METRICS_JSON = "environment.metrics.json"
+
+OUT_COLS = ["country", "state", "city", "avg_temp_C", "elevation_m", "NDVI_value", "NDVI_Category", "dist_to_water_m"]
+
+@with_deadline()
 def get_ndvi_pro(point, date_str):
     date_obj = datetime.strptime(date_str, '%Y-%m-%d')
 
@@ -65,23 +105,22 @@ def get_ndvi_pro(point, date_str):
                 val = stats.get('NDVI')
                 if val is not None:
                     ndvi = round(val / 10000.0, 4)
-                    cat = "Dense" if ndvi > 0.6 else "Moderate" if ndvi > 0.3 else "Sparse" if ndvi > 0.1 else "Non-Veg"
-                    return ndvi, cat
+                    return ndvi, ndvi_category(ndvi)
         except:
             continue # Try the next year if GEE errors out
             
     return None, "No Data"
-@safe_request
+@with_deadline()
 def get_location_pro(lat, lon):
-    url = "https://nominatim.openstreetmap.org/reverse"
+    url = NOMINATIM_URL
     params = {"lat": lat, "lon": lon, "format": "jsonv2", "accept-language": "en", "addressdetails": 1}
     headers = {'User-Agent': 'WildlifeMeta_AutoRecovery_v9'}
-    res = requests.get(url, params=params, headers=headers, timeout=20).json()
+    res = client.get_json(url, params=params, headers=headers, timeout=20)
     addr = res.get('address', {})
     city = (addr.get('city') or addr.get('town') or addr.get('village') or addr.get('county') or "Rural")
     return addr.get('country', 'Unknown'), addr.get('state', city), city
 
-@safe_request
+@with_deadline()
 def get_water_dist_pro(point):
     acc = ee.Image("WWF/HydroSHEDS/15ACC")
     streams = acc.gt(100) 
@@ -90,72 +129,397 @@ def get_water_dist_pro(point):
     val = stats.get('distance')
     return round(float(val), 2) if val is not None else None
 
-@safe_request
-def get_climate_pro(lat, lon, date):
-    e_url = f"https://api.open-meteo.com/v1/elevation?latitude={lat}&longitude={lon}"
-    elev = requests.get(e_url, timeout=15).json().get('elevation', [0])[0]
-    w_url = "https://archive-api.open-meteo.com/v1/archive"
+@with_deadline()
+def get_elevation_pro(lat, lon):
+    elev = client.get_json(ELEVATION_URL, params={"latitude": lat, "longitude": lon}).get('elevation', [0])[0]
+    return float(elev)
+
+@with_deadline()
+def get_temperature_pro(lat, lon, date):
     w_params = {"latitude": lat, "longitude": lon, "start_date": date, "end_date": date, "daily": "temperature_2m_mean", "timezone": "auto"}
-    w_res = requests.get(w_url, params=w_params, timeout=15).json()
+    w_res = client.get_json(ARCHIVE_URL, params=w_params)
     temp = w_res['daily']['temperature_2m_mean'][0]
-    return float(temp), float(elev)
+    return float(temp)
 
-def main():
-    # --- BATCH SETTINGS ---
-    BATCH_SIZE = 20  # Restart every 20 rows
-    
-    print("🚀 Script starting with Auto-Reset every 20 rows...")
+# -----------------------------
+# Lookups (one per provider call, run concurrently by the engine)
+# -----------------------------
+engine = None  # Engine, created in main()
+cache = None  # LookupCache, opened in main()
+batch_backend = None  # GeeBatch or LocalRasterBackend, created in main()
+offline_geocoder = None  # OfflineGeocoder, loaded in main() when boundary files are present
+weather_planner = None  # WeatherPlanner, created in main()
+
+def limited(provider, fn, *args):
+    """Waits for the provider's rate limit, then makes the call."""
+    engine.throttle(provider)
+    return fn(*args)
+
+def lookup_location(row):
+    lat, lon = row['latitude'], row['longitude']
+    country, state, city = cache.fetch("geocode", lat, lon, lambda: limited("nominatim", get_location_pro, lat, lon))
+    return {"country": country, "state": state, "city": city}
+
+def lookup_temperature(row):
+    lat, lon, date = row['latitude'], row['longitude'], row['sighting_date']
+    temp = cache.fetch("temperature", lat, lon, lambda: limited("open_meteo", get_temperature_pro, lat, lon, date), day=date)
+    return {"avg_temp_C": temp}
+
+def lookup_elevation(row):
+    lat, lon = row['latitude'], row['longitude']
+    elev = cache.fetch("elevation", lat, lon, lambda: limited("open_meteo", get_elevation_pro, lat, lon))
+    return {"elevation_m": elev}
+
+def lookup_ndvi(row):
+    lat, lon, date = row['latitude'], row['longitude'], row['sighting_date']
+    point = ee.Geometry.Point(lon, lat)
+    ndvi_val, ndvi_cat = cache.fetch("ndvi", lat, lon, lambda: limited("gee", get_ndvi_pro, point, date), day=date)
+    return {"NDVI_value": ndvi_val, "NDVI_Category": ndvi_cat}
+
+def lookup_water(row):
+    lat, lon = row['latitude'], row['longitude']
+    point = ee.Geometry.Point(lon, lat)
+    return {"dist_to_water_m": cache.fetch("water", lat, lon, lambda: limited("gee", get_water_dist_pro, point))}
+
+def prefetch_batch(rows, kinds=None):
+    """Batch mode: puts NDVI, water distance (and elevation, with local rasters) of every uncached row into the cache."""
+    jobs = [("ndvi", True, batch_backend.ndvi), ("water", False, batch_backend.water_dist)]
+    if RASTER_BACKEND == "local":
+        jobs.append(("elevation", False, batch_backend.elevation))
+    for kind, dated, fetch in jobs:
+        if kinds is not None and kind not in kinds:
+            continue
+        todo = [r for r in rows if not cache.has(kind, r['latitude'], r['longitude'], r['sighting_date'] if dated else "")]
+        if not todo:
+            continue
+        try:
+            values = fetch(todo)
+        except Exception as e:
+            # Rows left uncached are picked up by the per-row lookups
+            print(f"⚠️ Batch {kind} failed ({e}). Falling back to per-row requests...")
+            continue
+        for r in todo:
+            value = values[str(r['filename'])]
+            cache.put(kind, r['latitude'], r['longitude'], list(value) if isinstance(value, tuple) else value,
+                      day=r['sighting_date'] if dated else "")
+        print(f"🛰️ Batch {kind}: {len(todo)} rows")
+
+def prefetch_geocode(rows):
+    """Offline mode: geocodes every uncached row locally; misses are left to Nominatim."""
+    todo = [r for r in rows if not cache.has("geocode", r['latitude'], r['longitude'])]
+    if not todo:
+        return
+    found = offline_geocoder.reverse_many([r['latitude'] for r in todo], [r['longitude'] for r in todo])
+    misses = 0
+    for r, loc in zip(todo, found):
+        if loc is None:
+            misses += 1
+            if NOMINATIM_FALLBACK:
+                continue
+            loc = ("Unknown", "Rural", "Rural")
+        cache.put("geocode", r['latitude'], r['longitude'], list(loc))
+    print(f"🗺️ Offline geocoder: {len(todo) - misses}/{len(todo)} rows resolved locally")
 
+def prefetch_weather(rows, kinds=None):
+    """Planner mode: temperature and elevation of every uncached row in a few grouped Open-Meteo requests."""
+    jobs = [("temperature", True, weather_planner.temperatures), ("elevation", False, weather_planner.elevations)]
+    for kind, dated, fetch in jobs:
+        if kinds is not None and kind not in kinds:
+            continue
+        todo = [r for r in rows if not cache.has(kind, r['latitude'], r['longitude'], r['sighting_date'] if dated else "")]
+        if not todo:
+            continue
+        engine.throttle("open_meteo")
+        values = fetch(todo)
+        for r in todo:
+            if str(r['filename']) in values:
+                cache.put(kind, r['latitude'], r['longitude'], values[str(r['filename'])],
+                          day=r['sighting_date'] if dated else "")
+        print(f"🌡️ Planned {kind}: {len(values)}/{len(todo)} rows")
+
+LOOKUPS = [
+    ("nominatim", lookup_location),
+    ("open_meteo", lookup_temperature),
+    ("open_meteo", lookup_elevation),
+    ("gee", lookup_ndvi),
+    ("gee", lookup_water),
+]
+LOOKUP_KINDS = ["geocode", "temperature", "elevation", "ndvi", "water"]  # kind answered by each entry of LOOKUPS
+
+# -----------------------------
+# Provenance: which code + parameters produced each group of output columns
+# -----------------------------
+KIND_COLUMNS = {
+    "geocode": ["country", "state", "city"],
+    "temperature": ["avg_temp_C"],
+    "elevation": ["elevation_m"],
+    "ndvi": ["NDVI_value", "NDVI_Category"],
+    "water": ["dist_to_water_m"],
+}
+# Editing any function listed here (e.g. the buffer/scale in get_ndvi_pro or the stream threshold
+# in get_water_dist_pro) or a parameter changes the version, and that kind's cached lookups and
+# the rows written with the old version become stale. Only the functions that compute a kind's
+# values are listed (methods, not whole classes), so unrelated edits leave the rows current.
+# raster.py needs rasterio, so it is only imported (and versioned) when RASTER_BACKEND = "local".
+LOCAL_RASTER = {}
+if RASTER_BACKEND == "local":
+    from raster import LocalRasterBackend
+    LOCAL_RASTER = {"elevation": [LocalRasterBackend.elevation], "ndvi": [LocalRasterBackend.ndvi],
+                    "water": [LocalRasterBackend.water_dist]}
+# Likewise geocoder.py (shapely, scipy) only with OFFLINE_GEOCODER on.
+OFFLINE_GEO, OFFLINE_GEO_PARAMS = [], {}
+if OFFLINE_GEOCODER:
+    import geocoder
+    OFFLINE_GEO = [geocoder.OfflineGeocoder.reverse_many, geocoder.OfflineGeocoder._locate]
+    OFFLINE_GEO_PARAMS = {"countries": geocoder.COUNTRIES_FILE, "admin1": geocoder.ADMIN1_FILE,
+                          "cities": geocoder.CITIES_FILE, "city_km": geocoder.CITY_RADIUS_KM}
+VERSIONS = {
+    "geocode": fingerprint(get_location_pro, lookup_location, *OFFLINE_GEO, grid=GRID_DEG, offline=OFFLINE_GEOCODER,
+                           **OFFLINE_GEO_PARAMS),
+    "temperature": fingerprint(get_temperature_pro, lookup_temperature, WeatherPlanner.temperatures,
+                               WeatherPlanner._fetch_range, grid=GRID_DEG, planner=WEATHER_PLANNER and CELL_DEG),
+    "elevation": fingerprint(get_elevation_pro, lookup_elevation, WeatherPlanner.elevations, *LOCAL_RASTER.get("elevation", []),
+                             grid=GRID_DEG, backend=RASTER_BACKEND),
+    "ndvi": fingerprint(get_ndvi_pro, lookup_ndvi, ndvi_category, GeeBatch._ndvi_pass, GeeBatch.ndvi, composite_window,
+                        target_date, *LOCAL_RASTER.get("ndvi", []), grid=GRID_DEG, backend=RASTER_BACKEND, bins=NDVI_BINS,
+                        labels=NDVI_LABELS, collection=MODIS_COLLECTION, buffer=NDVI_BUFFER_M, scale=NDVI_SCALE,
+                        window=WINDOW_DAYS, years=FALLBACK_YEARS),
+    "water": fingerprint(get_water_dist_pro, lookup_water, GeeBatch.water_dist, GeeBatch.distance_image,
+                         *LOCAL_RASTER.get("water", []), grid=GRID_DEG, backend=RASTER_BACKEND, acc=HYDRO_ACC,
+                         threshold=STREAM_THRESHOLD, scale=WATER_SCALE),
+}
+
+def init_gee():
     while True:
-        # 1. Initialize/Re-initialize GEE
         try:
             ee.Initialize(project=GEE_PROJECT)
+            # Server-side deadline so a stalled getInfo() errors out instead of hanging its thread
+            ee.data.setDeadline(CALL_DEADLINE * 1000)
+            return
         except Exception as e:
             print(f"Auth issue: {e}. Retrying...")
             time.sleep(5)
+
+def cache_metrics():
+    """Lookup cache hits / misses per kind, for the metrics registry."""
+    out = []
+    for kind, s in cache.stats().items():
+        out += [("lookup_cache_hits", {"kind": kind}, s["hits"]), ("lookup_cache_misses", {"kind": kind}, s["misses"])]
+    return out
+
+def process_batch(rows, writer, kinds=None):
+    """
+    Prefetches and enriches one batch, writing finished rows; returns the rows that failed.
+    With `kinds`, only those lookups run and the row's other columns are written back unchanged.
+    """
+    lookups = LOOKUPS if kinds is None else [l for l, k in zip(LOOKUPS, LOOKUP_KINDS) if k in kinds]
+    if offline_geocoder is not None and (kinds is None or "geocode" in kinds):
+        with metrics.timer(registry.histogram("prefetch_seconds", step="geocode")):
+            prefetch_geocode(rows)
+    if batch_backend is not None:
+        with metrics.timer(registry.histogram("prefetch_seconds", step="batch")):
+            prefetch_batch(rows, kinds)
+    if weather_planner is not None:
+        with metrics.timer(registry.histogram("prefetch_seconds", step="weather")):
+            prefetch_weather(rows, kinds)
+
+    failed = []
+    for row, fields, err in tqdm(engine.run(rows, lookups), total=len(rows)):
+        beat(HEARTBEAT_FILE)
+        if err is not None:
+            failed.append(row)
+            print(f"\n❌ {row['filename']} failed: {err}")
             continue
 
-        # 2. Check what is finished
-        if os.path.exists(OUTPUT_CSV):
-            done = set(pd.read_csv(OUTPUT_CSV)['filename'].astype(str).tolist())
+        writer.write({**row, **fields})
+
+    writer.flush()
+    print(f"\n🧼 Batch of {len(rows)} complete. Cache: {cache.stats()}")
+    return failed
+
+def run_worker(ledger, df_raw, columns):
+    """Ledger mode: leases batches until none are left; a row is done once its shard block is flushed."""
+    worker = worker_id()
+    keys = df_raw['filename'].astype(str).tolist()
+    added = ledger.load(keys)
+    if os.path.exists(JOURNAL_PATH):
+        ledger.mark_done(list(Journal(JOURNAL_PATH).load()))  # rows already merged into OUTPUT_CSV
+    print(f"📒 Worker {worker}: {added} new rows registered, ledger {ledger.stats()}")
+
+    shard = shard_path(OUTPUT_CSV, worker)
+    prov = Provenance(shard, VERSIONS)  # merged along with the shard
+
+    def committed(rows):
+        prov.record([r['filename'] for r in rows])
+        ledger.complete(worker, [r['filename'] for r in rows])
+    writer = RowWriter(shard, columns, on_flush=committed)
+    position = {k: i for i, k in enumerate(keys)}
+    keeper = LeaseKeeper(ledger, worker)  # renews the batch below while it runs
+    failed = 0
+    try:
+        while True:
+            leased = ledger.lease(worker, BATCH_SIZE, LEASE_TTL)
+            if not leased:
+                break
+            keeper.hold(leased)
+            fresh = [k for k in leased if k not in writer.done]
+            if len(fresh) < len(leased):
+                ledger.complete(worker, [k for k in leased if k in writer.done])  # flushed before a crash
+            rows = [df_raw.iloc[position[k]].to_dict() for k in fresh if k in position]
+            lost = process_batch(rows, writer)
+            keeper.hold([])
+            if lost:
+                ledger.release(worker, [r['filename'] for r in lost])
+                failed += len(lost)
+    finally:
+        keeper.close()
+    writer.close()
+    prov.close()
+    print(f"📒 Worker {worker} finished, ledger {ledger.stats()}. Output in {shard}; "
+          f"run `python ledger.py merge {INPUT_CSV} {OUTPUT_CSV}` once every worker is done.")
+    return failed
+
+def run_incremental(prov, columns):
+    """
+    Recomputes only the (row, kind) pairs whose provenance is stale, into a resumable patch CSV,
+    then rewrites OUTPUT_CSV with the patched columns. Every other value is left untouched.
+    """
+    df_out = pd.read_csv(OUTPUT_CSV, dtype={'filename': str})
+    stale = {k: set(v) for k, v in prov.stale(df_out['filename']).items() if v}
+    if not stale:
+        print("✅ Every column is up to date.")
+        return 0
+    for kind, names in stale.items():
+        print(f"♻️ {kind}: {len(names)}/{len(df_out)} rows stale (now version {VERSIONS[kind]})")
+
+    # One patch file per target version set, so an interrupted run resumes where it stopped
+    tag = fingerprint(**{k: VERSIONS[k] for k in stale})
+    patch_csv = f"{os.path.splitext(OUTPUT_CSV)[0]}.patch-{tag}.csv"
+    patch = RowWriter(patch_csv, columns)
+    row_kinds = {}
+    for kind, names in stale.items():
+        for name in names:
+            row_kinds.setdefault(name, set()).add(kind)
+    groups = {}
+    for name, kinds in row_kinds.items():
+        if name not in patch.done:
+            groups.setdefault(frozenset(kinds), []).append(name)
+    records = df_out.astype(object).where(df_out.notna(), None).set_index('filename', drop=False)
+
+    failed = 0
+    for kinds, names in groups.items():
+        print(f"\n🔁 Re-enriching {sorted(kinds)} for {len(names)} rows...")
+        for start in range(0, len(names), BATCH_SIZE):
+            rows = [records.loc[n].to_dict() for n in names[start:start + BATCH_SIZE]]
+            failed += len(process_batch(rows, patch, kinds))
+    patch.close()
+    if failed:
+        print(f"⚠️ {failed} rows failed; {OUTPUT_CSV} is not patched yet. Re-run to retry them.")
+        return failed
+
+    fixed = pd.read_csv(patch_csv, dtype={'filename': str}).drop_duplicates('filename', keep='last').set_index('filename')
+    out = df_out.set_index('filename', drop=False)
+    out.loc[fixed.index, OUT_COLS] = fixed[OUT_COLS]
+    rewrite_csv(out, OUTPUT_CSV, index_path=JOURNAL_PATH)
+    prov.record(fixed.index.tolist())
+    prov.compact()
+    for p in (patch_csv, patch_csv + ".journal"):
+        os.remove(p)
+    print(f"🩹 Patched {len(fixed)} rows of {OUTPUT_CSV}" +
+          (f" ({PARQUET_DIR} is not updated; regenerate it with python -m gmgbd convert)" if PARQUET_DIR else ""))
+    return 0
+
+def main():
+    print(f"🚀 Script starting: {ROWS_IN_FLIGHT} rows in flight, limits {PROVIDER_LIMITS}")
+    stop_metrics = metrics.start("environment", METRICS_PORT, METRICS_JSON)
+    beat(HEARTBEAT_FILE)
+
+    # 1. Initialize GEE once for the whole run
+    init_gee()
+
+    global engine, cache, batch_backend, offline_geocoder, weather_planner
+    ledger = open_ledger(LEDGER) if LEDGER else None
+    if ledger is not None:
+        # Rate limits are global: every worker draws from the same buckets in the ledger
+        client.bucket_factory = shared_buckets(ledger)
+        engine = Engine(PROVIDER_LIMITS, rows_in_flight=ROWS_IN_FLIGHT, bucket_factory=shared_buckets(ledger))
+    else:
+        engine = Engine(PROVIDER_LIMITS, rows_in_flight=ROWS_IN_FLIGHT)
+    cache = LookupCache(CACHE_DB, grid=GRID_DEG)
+    cache.evict()
+    dropped = cache.check_versions(VERSIONS)
+    if dropped:
+        print(f"♻️ Enrichment code changed for {dropped}: their cached lookups were dropped")
+    registry.add_collector(cache_metrics)
+    if RASTER_BACKEND == "local":
+        from raster import LocalRasterBackend
+        batch_backend = LocalRasterBackend()
+    elif GEE_BATCH:
+        batch_backend = GeeBatch(ee)
+    if OFFLINE_GEOCODER:
+        from geocoder import OfflineGeocoder, COUNTRIES_FILE
+        if not os.path.exists(COUNTRIES_FILE):
+            print(f"⚠️ {COUNTRIES_FILE} not found. Using Nominatim for every row.")
         else:
-            done = set()
+            try:
+                offline_geocoder = OfflineGeocoder()
+            except ImportError as e:
+                print(f"⚠️ {e}. Using Nominatim for every row.")
+    if WEATHER_PLANNER:
+        weather_planner = WeatherPlanner(ARCHIVE_URL, ELEVATION_URL)
+    # Provenance of the rows already in OUTPUT_CSV. Rows without any (written before provenance
+    # existed, or cut off by a crash right after their block) are recorded at the current versions.
+    prov = Provenance(OUTPUT_CSV, VERSIONS)
+    journal = Journal(JOURNAL_PATH)
+    journal.bootstrap(OUTPUT_CSV)
+    finished = journal.load()
+    if ledger is None:  # ledger workers only write their shard's sidecar
+        adopted = prov.adopt(sorted(finished))
+        if adopted:
+            print(f"🏷️ Provenance: {adopted} rows recorded at the current versions")
+    stale = {k: set(v) for k, v in prov.stale(finished).items()}
+    if SEED_CACHE_FROM:
+        # Stale values must not come back through the cache
+        print(f"🗃️ Seeded {cache.seed_from_csv(SEED_CACHE_FROM, stale=stale)} cache entries from {SEED_CACHE_FROM}")
 
-        df_raw = pd.read_csv(INPUT_CSV)
+    # 2. Check what is finished (from the journal, not the output CSV)
+    df_raw = pd.read_csv(INPUT_CSV)
+    columns = list(df_raw.columns) + OUT_COLS
+    if INCREMENTAL or sys.argv[1:2] == ["incremental"]:
+        failed = run_incremental(prov, columns)
+    elif ledger is not None:
+        failed = run_worker(ledger, df_raw, columns)
+    else:
+        writer = RowWriter(OUTPUT_CSV, columns, index_path=JOURNAL_PATH,
+                           parquet_dir=PARQUET_DIR or None, partition_cols=PARQUET_PARTITIONS, on_flush=prov.on_flush)
+        done = writer.done
+        if any(stale.values()):
+            print(f"♻️ Stale rows per kind: { {k: len(v) for k, v in stale.items() if v} }. "
+                  f"Run `python environment.py incremental` to update them.")
         to_process = df_raw[~df_raw['filename'].astype(str).isin(done)]
-        
-        # If no more rows are left, break the while loop
-        if len(to_process) == 0:
-            print("✅ All rows processed successfully!")
-            break
-
-        # 3. Take only the next batch (20 rows)
-        batch = to_process.head(BATCH_SIZE)
-        print(f"\n🔄 New Session: Processing next {len(batch)} rows... ({len(done)} total done)")
-
-        for _, row in tqdm(batch.iterrows(), total=len(batch)):
-            lat, lon, date = row['latitude'], row['longitude'], row['sighting_date']
-            point = ee.Geometry.Point(lon, lat)
-
-            # Standard Execution
-            country, state, city = get_location_pro(lat, lon)
-            temp, elev = get_climate_pro(lat, lon, date)
-            ndvi_val, ndvi_cat = get_ndvi_pro(point, date)
-            water_dist = get_water_dist_pro(point)
-
-            final_row = {**row.to_dict(), "country": country, "state": state, "city": city,
-                         "avg_temp_C": temp, "elevation_m": elev, "NDVI_value": ndvi_val, 
-                         "NDVI_Category": ndvi_cat, "dist_to_water_m": water_dist}
-
-            pd.DataFrame([final_row]).to_csv(OUTPUT_CSV, mode='a', index=False, header=not os.path.exists(OUTPUT_CSV))
-            
-            # Short sleep between rows
-            time.sleep(1.2)
+        if len(to_process):
+            print(f"\n🔄 Processing {len(to_process)} rows... ({len(done)} already done)")
+
+        # 3. Work through everything in one long-lived session
+        failed = 0
+        for start in range(0, len(to_process), BATCH_SIZE):
+            batch = to_process.iloc[start:start + BATCH_SIZE]
+            failed += len(process_batch([row.to_dict() for _, row in batch.iterrows()], writer))
+        writer.close()
+    prov.close()
 
-        print(f"\n🧼 Batch of {BATCH_SIZE} complete. Resetting GEE & Connections...")
-        # Brief pause to let the OS clear the sockets before the next 'ee.Initialize'
-        time.sleep(5)
+    engine.shutdown()
+    print(client.report())
+    if weather_planner is not None:
+        print(weather_planner.report())
+    stop_metrics()
+    if failed:
+        # Non-zero exit: supervisor.py restarts the worker, which retries them
+        print(f"⚠️ {failed} rows failed after retries. Re-run to retry them.")
+        return 1
+    print("✅ All rows processed successfully!")
+    return 0
 
 if __name__ == "__main__":
 
-    main()
+    sys.exit(main())
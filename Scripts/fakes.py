@@ -0,0 +1,111 @@
+# Offline stand-ins shared by benchmark.py and the tests: fault injection (latency, errors,
+# stalls) and a fake `ee` module whose lazy objects answer getInfo() from the node type.
+import time
+import types
+import random
+import hashlib
+import threading
+
+# -----------------------------
+# 1. Fault injection
+# -----------------------------
+class Faults:
+    """Latency, errors and stalls for the fake services, with counts per route."""
+    def __init__(self, latency=0.0, error_rate=0.0, stall_rate=0.0, stall_seconds=30, seed=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.stall_rate = stall_rate
+        self.stall_seconds = stall_seconds
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counts = {}
+
+    def config(self):
+        return {"latency": self.latency, "error_rate": self.error_rate,
+                "stall_rate": self.stall_rate, "stall_seconds": self.stall_seconds}
+
+    def inject(self, route):
+        """Sleeps the injected latency; returns "stall", "error" or None for this request."""
+        with self.lock:
+            c = self.counts.setdefault(route, {"requests": 0, "errors": 0, "stalls": 0})
+            c["requests"] += 1
+            jitter, draw = self.rng.uniform(0.5, 1.5), self.rng.random()
+            fault = "stall" if draw < self.stall_rate else "error" if draw < self.stall_rate + self.error_rate else None
+            if fault:
+                c[fault + "s"] += 1
+        time.sleep(self.latency * jitter + (self.stall_seconds if fault == "stall" else 0))
+        return fault
+
+# -----------------------------
+# 2. Fake ee module
+# -----------------------------
+class EEException(Exception):
+    pass
+
+def _fake_value(filename, lo, hi):
+    h = int(hashlib.sha1(str(filename).encode()).hexdigest()[:8], 16)
+    return lo + h % (hi - lo)
+
+class _EEObject:
+    """A lazy ee object: every method call builds a new node; getInfo() answers from the node type."""
+    def __init__(self, kind, faults, parent=None, args=(), kwargs=None):
+        self.kind, self.faults, self.parent = kind, faults, parent
+        self.args, self.kwargs = args, kwargs or {}
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return lambda *a, **k: _EEObject(name, self.faults, self, a, k)
+
+    def _features(self, collection, prop, value):
+        return [{"properties": {"filename": f.args[1]["filename"], prop: value(f.args[1]["filename"])}}
+                for f in collection.args[0]]
+
+    def _info(self):
+        if self.kind == "List":
+            return [1 for _ in self.args[0]]  # ImageCollection sizes: every window has data
+        if self.kind == "size":
+            return 1
+        if self.kind == "reduceRegion":
+            return {"NDVI": 5000, "distance": 450.0}
+        if self.kind == "reduceRegions":
+            reducer = self.kwargs["reducer"].kind
+            if reducer == "mean":
+                return {"features": self._features(self.kwargs["collection"], "mean", lambda f: _fake_value(f, -1000, 9000))}
+            return {"features": self._features(self.kwargs["collection"], "first", lambda f: _fake_value(f, 0, 20000) / 10)}
+        if self.kind == "flatten":
+            return {"features": [feat for fc in self.parent.args[0] for feat in fc._info()["features"]]}
+        raise EEException(f"fake ee cannot evaluate {self.kind}")
+
+    def getInfo(self):
+        fault = self.faults.inject("ee")
+        if fault is not None:
+            raise EEException(f"Too many concurrent aggregations (injected {fault})")  # transient, so retried
+        return self._info()
+
+def fake_ee(faults=None):
+    """Module object standing in for `ee` (install as sys.modules['ee'] before importing environment)."""
+    faults = faults or Faults()
+    mod = types.ModuleType("ee")
+    mod.EEException = EEException
+    mod.Initialize = lambda *a, **k: None
+    mod.data = types.SimpleNamespace(setDeadline=lambda ms: None)
+
+    class _Namespace:
+        def __init__(self, name):
+            self.name = name
+
+        def __getattr__(self, name):
+            if name.startswith("__"):
+                raise AttributeError(name)
+            return _Namespace(name)
+
+        def __call__(self, *args, **kwargs):
+            return _EEObject(self.name, faults, None, args, kwargs)
+
+    def attr(name):  # ee.Image(...), ee.Geometry.Point(...), ee.Reducer.mean() ...
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return _Namespace(name)
+    mod.__getattr__ = attr
+    return mod
@@ -0,0 +1,160 @@
+from datetime import datetime, timedelta
+from postprocess import ndvi_category
+
+# --- CONFIGURATION ---
+MODIS_COLLECTION = "MODIS/061/MOD13A1"
+HYDRO_ACC = "WWF/HydroSHEDS/15ACC"
+STREAM_THRESHOLD = 100   # flow accumulation cells that count as a stream
+NDVI_BUFFER_M = 500      # buffer around the point to avoid single-pixel 'no crs' errors
+NDVI_SCALE = 1000
+WATER_SCALE = 450
+WINDOW_DAYS = 16         # +/- days around the sighting date
+FALLBACK_YEARS = 5       # try the same date up to 4 years earlier if there is no data
+FIRST_MODIS_YEAR = 2000
+BATCH_SIZE = 500         # points per FeatureCollection (getInfo caps at 5000 features)
+
+# -----------------------------
+# 1. MODIS windows
+# -----------------------------
+def target_date(date_str, years_back):
+    """Sighting date moved to the fallback year, or None once we are before MODIS."""
+    date_obj = datetime.strptime(str(date_str)[:10], '%Y-%m-%d')
+    year = max(date_obj.year, FIRST_MODIS_YEAR) - years_back
+    if year < FIRST_MODIS_YEAR:
+        return None
+    if date_obj.month == 2 and date_obj.day == 29:
+        date_obj = date_obj.replace(day=28)
+    return date_obj.replace(year=year)
+
+def composite_window(day):
+    """
+    MOD13A1 composites start on day-of-year 1, 17, 33, ... every year. The per-row
+    filterDate(day - 16, day + 16) always selects the same two or three composites,
+    so rows are grouped by that exact set and each group is reduced once.
+    """
+    lo, hi = day - timedelta(days=WINDOW_DAYS), day + timedelta(days=WINDOW_DAYS)
+    starts = []
+    for year in (day.year - 1, day.year, day.year + 1):
+        first = datetime(year, 1, 1)
+        for k in range(23):
+            s = first + timedelta(days=16 * k)
+            if lo <= s < hi:
+                starts.append(s)
+    return starts[0].strftime('%Y-%m-%d'), (starts[-1] + timedelta(days=1)).strftime('%Y-%m-%d')
+
+# -----------------------------
+# 2. Batched extraction
+# -----------------------------
+class GeeBatch:
+    """
+    Server-side batch extraction of NDVI and distance to water.
+    Pass a fake module as `ee_module` (e.g. fakes.fake_ee()) to run it offline; earthengine-api
+    is only imported when none is given.
+    """
+    def __init__(self, ee_module=None):
+        if ee_module is None:
+            import ee as ee_module
+        self.ee = ee_module
+        self._dist_img = None
+        self.round_trips = 0
+
+    def distance_image(self):
+        # Built once and reused for every batch
+        if self._dist_img is None:
+            streams = self.ee.Image(HYDRO_ACC).gt(STREAM_THRESHOLD)
+            self._dist_img = streams.fastDistanceTransform(512).sqrt().multiply(WATER_SCALE)
+        return self._dist_img
+
+    def _features(self, rows, buffer_m=None):
+        feats = []
+        for r in rows:
+            geom = self.ee.Geometry.Point(float(r['longitude']), float(r['latitude']))
+            if buffer_m:
+                geom = geom.buffer(buffer_m).bounds()
+            feats.append(self.ee.Feature(geom, {"filename": str(r['filename'])}))
+        return self.ee.FeatureCollection(feats)
+
+    def _get_info(self, obj):
+        self.round_trips += 1
+        return obj.getInfo()
+
+    def _collect(self, fc_info, prop):
+        out = {}
+        for f in fc_info.get('features', []):
+            props = f.get('properties', {})
+            if props.get(prop) is not None:
+                out[props['filename']] = props[prop]
+        return out
+
+    def _ndvi_pass(self, rows, years_back):
+        """One fallback year: one size() round trip + one reduceRegions round trip."""
+        groups = {}
+        for r in rows:
+            day = target_date(r['sighting_date'], years_back)
+            if day is not None:
+                groups.setdefault(composite_window(day), []).append(r)
+        if not groups:
+            return {}
+
+        windows = list(groups)
+        colls = [self.ee.ImageCollection(MODIS_COLLECTION).filterDate(start, end).select('NDVI') for start, end in windows]
+        sizes = self._get_info(self.ee.List([c.size() for c in colls]))
+
+        reduced = []
+        for (window, coll, size) in zip(windows, colls, sizes):
+            if size > 0:
+                reduced.append(coll.median().reduceRegions(
+                    collection=self._features(groups[window], buffer_m=NDVI_BUFFER_M),
+                    reducer=self.ee.Reducer.mean(),
+                    scale=NDVI_SCALE,
+                    crs='EPSG:4326'))
+        if not reduced:
+            return {}
+        try:
+            info = self._get_info(self.ee.FeatureCollection(reduced).flatten())
+            return self._collect(info, 'mean')
+        except Exception:
+            # One bad window must not sink the batch: redo the windows one by one
+            out = {}
+            for fc in reduced:
+                try:
+                    out.update(self._collect(self._get_info(fc), 'mean'))
+                except Exception:
+                    continue  # these rows move on to the next fallback year
+            return out
+
+    def ndvi(self, rows):
+        """Returns {filename: (ndvi, category)} with the 5-year fallback of get_ndvi_pro."""
+        results = {}
+        for start in range(0, len(rows), BATCH_SIZE):
+            pending = rows[start:start + BATCH_SIZE]
+            for years_back in range(FALLBACK_YEARS):
+                if not pending:
+                    break
+                try:
+                    found = self._ndvi_pass(pending, years_back)
+                except Exception:
+                    found = {}
+                for fname, val in found.items():
+                    ndvi = round(val / 10000.0, 4)
+                    results[fname] = (ndvi, ndvi_category(ndvi))
+                pending = [r for r in pending if str(r['filename']) not in results]
+            for r in pending:
+                results[str(r['filename'])] = (None, "No Data")
+        return results
+
+    def water_dist(self, rows):
+        """Returns {filename: distance_m or None}; one round trip per BATCH_SIZE points."""
+        results = {}
+        for start in range(0, len(rows), BATCH_SIZE):
+            chunk = rows[start:start + BATCH_SIZE]
+            info = self._get_info(self.distance_image().reduceRegions(
+                collection=self._features(chunk),
+                reducer=self.ee.Reducer.first(),
+                scale=WATER_SCALE,
+                crs='EPSG:4326'))
+            found = self._collect(info, 'first')
+            for r in chunk:
+                val = found.get(str(r['filename']))
+                results[str(r['filename'])] = round(float(val), 2) if val is not None else None
+        return results
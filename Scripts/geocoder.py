@@ -0,0 +1,91 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+try:
+    import shapely
+    from shapely.geometry import shape
+    from scipy.spatial import cKDTree
+except ImportError:
+    shapely = shape = cKDTree = None
+
+# --- CONFIGURATION ---
+COUNTRIES_FILE = "geo/countries.geojson"  # admin-0 polygons, e.g. Natural Earth ne_10m_admin_0_countries
+ADMIN1_FILE = "geo/admin1.geojson"        # admin-1 polygons, e.g. Natural Earth ne_10m_admin_1_states_provinces
+CITIES_FILE = "geo/cities.csv"            # optional populated places with name, latitude, longitude (e.g. GeoNames cities1000)
+CITY_RADIUS_KM = 10                       # nearest place within this distance counts as the city, else "Rural"
+
+# Property names tried in order for the display name of a polygon
+COUNTRY_FIELDS = ("NAME_EN", "ADMIN", "NAME", "name")
+ADMIN1_FIELDS = ("name_en", "name", "NAME_1")
+
+EARTH_RADIUS_KM = 6371.0
+
+def load_polygons(path, fields):
+    with open(path, 'r', encoding='utf-8') as f:
+        features = json.load(f)["features"]
+    geoms, names = [], []
+    for feat in features:
+        if not feat.get("geometry"):
+            continue
+        props = feat.get("properties") or {}
+        name = next((props[k] for k in fields if props.get(k)), None)
+        geoms.append(shape(feat["geometry"]))
+        names.append(name)
+    return shapely.STRtree(geoms), np.array(names, dtype=object)
+
+def unit_vectors(lats, lons):
+    lat, lon = np.radians(lats), np.radians(lons)
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+class OfflineGeocoder:
+    """
+    Local reverse geocoding: country and state by point-in-polygon against STRtree-indexed
+    admin boundaries, city as the nearest populated place within CITY_RADIUS_KM.
+    Returns the same (country, state, city) tuples as get_location_pro; points outside
+    every country polygon (sea, missing data) are misses (None).
+    """
+    def __init__(self, countries_file=COUNTRIES_FILE, admin1_file=ADMIN1_FILE, cities_file=CITIES_FILE,
+                 city_radius_km=CITY_RADIUS_KM):
+        if shapely is None:
+            raise ImportError("shapely and scipy are required for the offline geocoder (pip install shapely scipy)")
+        self.countries = load_polygons(countries_file, COUNTRY_FIELDS)
+        self.admin1 = load_polygons(admin1_file, ADMIN1_FIELDS) if admin1_file and os.path.exists(admin1_file) else None
+        self.cities, self.city_names = None, None
+        if cities_file and os.path.exists(cities_file):
+            df = pd.read_csv(cities_file, usecols=["name", "latitude", "longitude"])
+            self.cities = cKDTree(unit_vectors(df["latitude"].to_numpy(), df["longitude"].to_numpy()))
+            self.city_names = df["name"].to_numpy(dtype=object)
+        # Straight-line (chord) distance on the unit sphere equivalent to the radius
+        self.city_chord = 2 * np.sin(city_radius_km / EARTH_RADIUS_KM / 2)
+
+    @staticmethod
+    def _locate(index, points):
+        tree, names = index
+        src, hit = tree.query(points, predicate="intersects")
+        out = np.full(len(points), None, dtype=object)
+        # Several hits on a shared border: keep the first one
+        first = np.unique(src, return_index=True)[1]
+        out[src[first]] = names[hit[first]]
+        return out
+
+    def reverse_many(self, lats, lons):
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        points = shapely.points(lons, lats)
+        countries = self._locate(self.countries, points)
+        states = self._locate(self.admin1, points) if self.admin1 is not None else np.full(len(points), None, dtype=object)
+
+        cities = np.full(len(points), "Rural", dtype=object)
+        if self.cities is not None:
+            dist, idx = self.cities.query(unit_vectors(lats, lons), distance_upper_bound=self.city_chord)
+            near = np.isfinite(dist)
+            cities[near] = self.city_names[idx[near]]
+
+        results = []
+        for country, state, city in zip(countries, states, cities):
+            results.append(None if country is None else (country, state or city, city))
+        return results
+
+    def reverse(self, lat, lon):
+        return self.reverse_many([lat], [lon])[0]
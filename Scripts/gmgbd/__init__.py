@@ -0,0 +1,4 @@
+"""Columnar access to the GMGBD table: CSV -> partitioned Parquet, a lazy query API, and row indexes / samplers."""
+from .convert import to_parquet, DATASET_DIR, SCHEMA, PARTITIONS
+from .query import Dataset, Query, open_dataset
+from .index import Index, stratified_split, stratified_sample
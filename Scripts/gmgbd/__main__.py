@@ -0,0 +1,13 @@
+import sys
+from . import convert, bench, index
+
+# python -m gmgbd convert | bench | index | split (see each main() for arguments)
+COMMANDS = {"convert": convert.main, "bench": bench.main, "index": index.main_index, "split": index.main_split}
+
+if __name__ == "__main__":
+
+    cmd = sys.argv.pop(1) if len(sys.argv) > 1 else ""
+    if cmd not in COMMANDS:
+        print("usage: python -m gmgbd convert [csv] [out_dir] | bench [csv] [sizes...] | index [csv] [npz] | split [csv] [test_frac] [seed]")
+    else:
+        COMMANDS[cmd]()
@@ -0,0 +1,74 @@
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+import pandas as pd
+from .convert import to_parquet, INPUT_CSV
+from .query import open_dataset
+
+# --- CONFIGURATION ---
+SIZES = [10_000, 100_000, 1_000_000]
+COLUMNS = ["filename", "scientific_name", "latitude", "longitude"]
+YEARS = (2016, 2025)
+
+def synthetic(source, n, seed=0):
+    """n rows resampled from the real table, with jittered coordinates and spread-out dates."""
+    rng = np.random.default_rng(seed)
+    df = source.iloc[rng.integers(0, len(source), n)].reset_index(drop=True)
+    df["filename"] = [f"img_{i:016x}.jpg" for i in range(n)]
+    df["latitude"] = (df["latitude"] + rng.normal(0, 0.05, n)).clip(-90, 90)
+    df["longitude"] = (df["longitude"] + rng.normal(0, 0.05, n)).clip(-180, 180)
+    start = np.datetime64(f"{YEARS[0]}-01-01")
+    days = (np.datetime64(f"{YEARS[1]}-12-31") - start).astype(int)
+    df["sighting_date"] = (start + rng.integers(0, days, n).astype("timedelta64[D]")).astype(str)
+    return df
+
+def timed(fn):
+    t0 = time.perf_counter()
+    out = fn()
+    return time.perf_counter() - t0, out
+
+def run(source, n, tmp):
+    csv_path = os.path.join(tmp, f"rows_{n}.csv")
+    out_dir = os.path.join(tmp, f"rows_{n}_parquet")
+    df = synthetic(source, n)
+    df.to_csv(csv_path, index=False)
+    species = df["scientific_name"].value_counts().index[len(df["scientific_name"].unique()) // 2]
+    convert_s, _ = timed(lambda: to_parquet(csv_path, out_dir))
+    ds = open_dataset(out_dir)
+
+    def csv_species():
+        d = pd.read_csv(csv_path)
+        return d.loc[d["scientific_name"] == species, COLUMNS]
+
+    def csv_box():
+        d = pd.read_csv(csv_path)
+        m = d["latitude"].between(35, 60) & d["longitude"].between(-10, 30) & (d["sighting_date"] >= "2024-01-01")
+        return d.loc[m, COLUMNS]
+
+    rows = [
+        ("read_csv (all columns)", timed(lambda: pd.read_csv(csv_path))),
+        ("read_csv + species filter", timed(csv_species)),
+        ("gmgbd species filter", timed(lambda: ds.where(species=species).select(*COLUMNS).to_pandas())),
+        ("read_csv + bbox/date filter", timed(csv_box)),
+        ("gmgbd bbox/date filter", timed(lambda: ds.where(bbox=(-10, 35, 30, 60), dates=("2024-01-01", None)).select(*COLUMNS).to_pandas())),
+    ]
+    size_csv = os.path.getsize(csv_path) / 1024 ** 2
+    size_pq = sum(os.path.getsize(os.path.join(d, f)) for d, _, fs in os.walk(out_dir) for f in fs) / 1024 ** 2
+    print(f"\n📊 {n:,} rows | CSV {size_csv:.1f} MB | Parquet {size_pq:.1f} MB | convert {convert_s:.2f}s")
+    for label, (secs, out) in rows:
+        print(f"   {label:<30} {secs * 1000:9.1f} ms  ({len(out):,} rows)")
+
+def main():
+    """python -m gmgbd bench [csv] [sizes...]"""
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else INPUT_CSV
+    sizes = [int(s) for s in sys.argv[2:]] or SIZES
+    source = pd.read_csv(csv_path)
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sizes:
+            run(source, n, tmp)
+
+if __name__ == "__main__":
+
+    main()
@@ -0,0 +1,177 @@
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+# --- CONFIGURATION ---
+INDEX_PATH = "gmgbd_index.npz"
+EARTH_RADIUS_KM = 6371.0
+INDEX_COLUMNS = ["filename", "scientific_name", "latitude", "longitude", "sighting_date", "country"]
+
+def _unit_vectors(lats, lons):
+    lat, lon = np.radians(lats), np.radians(lons)
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+def _chord(km):
+    return 2 * np.sin(km / EARTH_RADIUS_KM / 2)
+
+def seasons(months, lats):
+    """Meteorological season per row (0 DJF winter .. 3 SON autumn), flipped south of the equator."""
+    months = np.asarray(months)
+    season = (months % 12) // 3
+    south = np.asarray(lats) < 0
+    season[south] = (season[south] + 2) % 4
+    return season
+
+SEASON_NAMES = np.array(["winter", "spring", "summer", "autumn"])
+
+class Index:
+    """
+    Precomputed lookup structures over the dataset rows (positions are row numbers of the
+    frame it was built from):
+      - spatial: KD-tree over 3-D unit vectors, so radius queries are true great-circle radii
+      - taxonomic: inverted index from lower-cased scientific_name tokens (genus, epithet) to rows
+    plus integer codes for species, country and season used by the stratified sampler.
+    """
+    def __init__(self, filenames, species, species_codes, countries, country_codes, lats, lons, months):
+        self.filenames = np.asarray(filenames, dtype=str)
+        self.species, self.species_codes = np.asarray(species, dtype=str), np.asarray(species_codes)
+        self.countries, self.country_codes = np.asarray(countries, dtype=str), np.asarray(country_codes)
+        self.lats, self.lons = np.asarray(lats, dtype=float), np.asarray(lons, dtype=float)
+        self.months = np.asarray(months, dtype=np.int8)
+        self.season_codes = seasons(self.months, self.lats)
+        self.tree = cKDTree(_unit_vectors(self.lats, self.lons))
+        self.tokens = self._invert()
+
+    def __len__(self):
+        return len(self.filenames)
+
+    @classmethod
+    def build(cls, df):
+        """From a DataFrame with INDEX_COLUMNS (gmgbd.csv or a Dataset query)."""
+        species_codes, species = pd.factorize(df["scientific_name"].astype(str).str.strip())
+        country_codes, countries = pd.factorize(df["country"].fillna("Unknown").astype(str))
+        months = pd.to_datetime(df["sighting_date"], errors='coerce').dt.month.fillna(1).astype(int)
+        return cls(df["filename"].astype(str).to_numpy(), species, species_codes, countries, country_codes,
+                   df["latitude"].to_numpy(), df["longitude"].to_numpy(), months.to_numpy())
+
+    def _invert(self):
+        """token -> sorted row positions; built per distinct species, then expanded by code."""
+        order = np.argsort(self.species_codes, kind="stable")
+        bounds = np.searchsorted(self.species_codes[order], np.arange(len(self.species) + 1))
+        by_token = {}
+        for code, name in enumerate(self.species):
+            rows = order[bounds[code]:bounds[code + 1]]
+            for token in set(name.lower().split()):
+                by_token.setdefault(token, []).append(rows)
+        return {t: np.sort(np.concatenate(parts)) for t, parts in by_token.items()}
+
+    # --- persistence ---
+    def save(self, path=INDEX_PATH):
+        np.savez_compressed(path, filenames=self.filenames, species=self.species, species_codes=self.species_codes,
+                            countries=self.countries, country_codes=self.country_codes,
+                            lats=self.lats, lons=self.lons, months=self.months)
+
+    @classmethod
+    def load(cls, path=INDEX_PATH):
+        with np.load(path) as z:
+            return cls(z["filenames"], z["species"], z["species_codes"], z["countries"], z["country_codes"],
+                       z["lats"], z["lons"], z["months"])
+
+    # --- lookups (all return sorted row positions) ---
+    def taxon(self, name):
+        """Rows whose scientific_name contains every token of name ('Falco', 'Falco tinnunculus')."""
+        rows = None
+        for token in name.lower().split():
+            hit = self.tokens.get(token, np.empty(0, dtype=np.int64))
+            rows = hit if rows is None else np.intersect1d(rows, hit, assume_unique=True)
+        return rows if rows is not None else np.arange(len(self))
+
+    def near(self, lat, lon, km):
+        """Rows within km (great-circle) of the point."""
+        hits = self.tree.query_ball_point(_unit_vectors([lat], [lon])[0], _chord(km))
+        return np.sort(np.asarray(hits, dtype=np.int64))
+
+    def bbox(self, min_lon, min_lat, max_lon, max_lat):
+        m = (self.lats >= min_lat) & (self.lats <= max_lat) & (self.lons >= min_lon) & (self.lons <= max_lon)
+        return np.nonzero(m)[0]
+
+    def select(self, taxon=None, near=None, bbox=None, country=None):
+        """Intersection of the given filters; near=(lat, lon, km), bbox=(min_lon, min_lat, max_lon, max_lat)."""
+        rows = np.arange(len(self))
+        if taxon is not None:
+            rows = np.intersect1d(rows, self.taxon(taxon), assume_unique=True)
+        if near is not None:
+            rows = np.intersect1d(rows, self.near(*near), assume_unique=True)
+        if bbox is not None:
+            rows = np.intersect1d(rows, self.bbox(*bbox), assume_unique=True)
+        if country is not None:
+            code = np.nonzero(self.countries == country)[0]
+            rows = rows[np.isin(self.country_codes[rows], code)]
+        return rows
+
+# -----------------------------
+# Stratified sampling
+# -----------------------------
+STRATA = {"species": "species_codes", "region": "country_codes", "season": "season_codes"}
+
+def strata(index, by=("species", "region", "season")):
+    """One integer stratum id per row for the given combination of keys."""
+    keys = [getattr(index, STRATA[k]).astype(np.int64) for k in by]
+    return np.unique(np.column_stack(keys), axis=0, return_inverse=True)[1].reshape(-1) if keys else np.zeros(len(index), np.int64)
+
+def stratified_split(index, test_frac=0.2, by=("species", "region", "season"), seed=0, rows=None, min_test=1):
+    """
+    (train, test) row positions with about test_frac of every stratum in test. Strata with a
+    single row stay in train; every other stratum gets at least min_test test rows.
+    Vectorized: shuffle, stable-sort by stratum, then rank within the stratum.
+    """
+    rng = np.random.default_rng(seed)
+    rows = np.arange(len(index)) if rows is None else np.asarray(rows)
+    stratum = strata(index, by)[rows]
+    order = rng.permutation(len(rows))
+    order = order[np.argsort(stratum[order], kind="stable")]
+    s = stratum[order]
+    starts = np.r_[0, np.nonzero(s[1:] != s[:-1])[0] + 1]
+    sizes = np.diff(np.r_[starts, len(s)])
+    rank = np.arange(len(s)) - np.repeat(starts, sizes)
+    n_test = np.where(sizes > 1, np.maximum(np.round(sizes * test_frac), min_test), 0).astype(np.int64)
+    n_test = np.minimum(n_test, sizes - 1)
+    is_test = rank < np.repeat(n_test, sizes)
+    return np.sort(rows[order[~is_test]]), np.sort(rows[order[is_test]])
+
+def stratified_sample(index, per_stratum=1, by=("species",), seed=0, rows=None):
+    """Up to per_stratum rows from every stratum, e.g. one image per species for a quick eval set."""
+    rng = np.random.default_rng(seed)
+    rows = np.arange(len(index)) if rows is None else np.asarray(rows)
+    stratum = strata(index, by)[rows]
+    order = rng.permutation(len(rows))
+    order = order[np.argsort(stratum[order], kind="stable")]
+    s = stratum[order]
+    starts = np.r_[0, np.nonzero(s[1:] != s[:-1])[0] + 1]
+    rank = np.arange(len(s)) - np.repeat(starts, np.diff(np.r_[starts, len(s)]))
+    return np.sort(rows[order[rank < per_stratum]])
+
+def main_index():
+    """python -m gmgbd index [csv] [index.npz]"""
+    import sys
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else "gmgbd.csv"
+    out = sys.argv[2] if len(sys.argv) > 2 else INDEX_PATH
+    index = Index.build(pd.read_csv(csv_path, usecols=INDEX_COLUMNS))
+    index.save(out)
+    print(f"✅ Indexed {len(index)} rows ({len(index.species)} species, {len(index.tokens)} name tokens) -> {out}")
+
+def main_split():
+    """python -m gmgbd split [csv] [test_frac] [seed]: writes train.csv / test.csv stratified by species, region, season"""
+    import sys
+    import time
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else "gmgbd.csv"
+    test_frac = float(sys.argv[2]) if len(sys.argv) > 2 else 0.2
+    seed = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+    df = pd.read_csv(csv_path)
+    index = Index.build(df)
+    t0 = time.perf_counter()
+    train, test = stratified_split(index, test_frac, seed=seed)
+    ms = (time.perf_counter() - t0) * 1000
+    df.iloc[train].to_csv("train.csv", index=False)
+    df.iloc[test].to_csv("test.csv", index=False)
+    print(f"✅ train.csv {len(train)} rows | test.csv {len(test)} rows (split in {ms:.1f} ms)")
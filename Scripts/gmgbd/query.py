@@ -0,0 +1,92 @@
+import datetime
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+from .convert import DATASET_DIR, PARTITION_SCHEMA
+
+def _date(value):
+    return value if isinstance(value, datetime.date) else datetime.date.fromisoformat(str(value)[:10])
+
+def _one_or_many(field, value):
+    if isinstance(value, (list, tuple, set)):
+        return field.isin(list(value))
+    return field == value
+
+class Query:
+    """
+    Lazy, immutable query over the Parquet dataset. where()/select() only build an Arrow
+    expression and a column list; nothing is read until to_table()/to_pandas()/count(). The
+    filter is pushed down: year= partitions are pruned by path, row groups by their min/max
+    statistics (files are sorted by country, species, date), and only the selected columns are decoded.
+    """
+    def __init__(self, dataset, expr=None, columns=None):
+        self.dataset = dataset
+        self.expr = expr
+        self.columns = columns
+
+    def _and(self, expr):
+        return Query(self.dataset, expr if self.expr is None else self.expr & expr, self.columns)
+
+    def where(self, species=None, genus=None, bbox=None, dates=None, ndvi=None, country=None, expr=None):
+        """
+        species: scientific name(s); genus: first word of scientific_name;
+        bbox: (min_lon, min_lat, max_lon, max_lat); dates: (start, end) inclusive, either may be None;
+        ndvi: NDVI_Category value(s); country: name(s); expr: any extra pyarrow expression.
+        """
+        q = self
+        if species is not None:
+            q = q._and(_one_or_many(pc.field("scientific_name"), species))
+        if genus is not None:
+            q = q._and(pc.starts_with(pc.field("scientific_name").cast(pa.string()), genus.strip() + " "))
+        if bbox is not None:
+            min_lon, min_lat, max_lon, max_lat = bbox
+            lat, lon = pc.field("latitude"), pc.field("longitude")
+            q = q._and((lat >= min_lat) & (lat <= max_lat) & (lon >= min_lon) & (lon <= max_lon))
+        if dates is not None:
+            start, end = dates
+            day, year = pc.field("sighting_date"), pc.field("year")
+            if start is not None:
+                start = _date(start)
+                # The year bound is redundant for the rows but lets Arrow drop whole year= directories
+                q = q._and((year >= start.year) & (day >= pa.scalar(start, pa.date32())))
+            if end is not None:
+                end = _date(end)
+                q = q._and((year <= end.year) & (day <= pa.scalar(end, pa.date32())))
+        if ndvi is not None:
+            q = q._and(_one_or_many(pc.field("NDVI_Category"), ndvi))
+        if country is not None:
+            q = q._and(_one_or_many(pc.field("country"), country))
+        if expr is not None:
+            q = q._and(expr)
+        return q
+
+    def select(self, *columns):
+        return Query(self.dataset, self.expr, list(columns))
+
+    def scanner(self, **kwargs):
+        return self.dataset.scanner(columns=self.columns, filter=self.expr, **kwargs)
+
+    def to_table(self):
+        return self.scanner().to_table()
+
+    def to_pandas(self):
+        return self.to_table().to_pandas()
+
+    def to_batches(self):
+        return self.scanner().to_batches()
+
+    def count(self):
+        return self.scanner().count_rows()
+
+class Dataset(Query):
+    """The whole partitioned dataset; start queries from here."""
+    def __init__(self, path=DATASET_DIR):
+        super().__init__(ds.dataset(path, format="parquet", partitioning=ds.partitioning(PARTITION_SCHEMA, flavor="hive")))
+        self.path = path
+
+    @property
+    def schema(self):
+        return self.dataset.schema
+
+def open_dataset(path=DATASET_DIR):
+    return Dataset(path)
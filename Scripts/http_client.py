@@ -0,0 +1,205 @@
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+import metrics
+from metrics import registry
+
+# --- CONFIGURATION ---
+POOL_SIZE = 32        # keep-alive connections per host
+TIMEOUT = 15          # default seconds per request
+MAX_RETRIES = 4
+BACKOFF_BASE = 1.0    # first retry waits ~1s, then ~2s, ~4s ... (full jitter)
+BACKOFF_CAP = 60
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# Per-host rate limits in requests per second (hosts not listed are not throttled)
+HOST_RATES = {
+    "nominatim.openstreetmap.org": 1.0,   # OSM usage policy
+    "api.inaturalist.org": 1.0,           # iNat asks for ~60 requests/minute
+    "api.open-meteo.com": 10.0,
+    "archive-api.open-meteo.com": 10.0,
+}
+
+# -----------------------------
+# 1. Building blocks
+# -----------------------------
+class TokenBucket:
+    """Blocking token bucket: `rate` tokens per second, up to `burst` saved up."""
+    def __init__(self, rate, burst=1, name="bucket"):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+        self.waited = registry.counter("rate_limit_wait_seconds_total", bucket=name)
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            self.waited.inc(wait)
+            metrics.sleep(wait, "rate_limit")
+
+def retry_after(resp):
+    """Seconds requested by a Retry-After header (delta-seconds or HTTP-date), else None."""
+    value = resp.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def backoff(attempt):
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+class CallCancelled(Exception):
+    """The deadline-guarded call this request belongs to has been given up on."""
+
+_call = threading.local()
+
+class call_deadline:
+    """
+    with call_deadline(seconds, cancelled): requests made by this thread inside the block use
+    at most the remaining time as their timeout, and stop with CallCancelled once the time is
+    up or `cancelled` is set, instead of carrying on with their own retries and backoff.
+    Set by engine.with_deadline around every guarded call.
+    """
+    def __init__(self, seconds, cancelled=None):
+        self.seconds = seconds
+        self.cancelled = cancelled
+
+    def __enter__(self):
+        _call.until = time.monotonic() + self.seconds
+        _call.cancelled = self.cancelled
+        return self
+
+    def __exit__(self, *exc):
+        _call.until = None
+        _call.cancelled = None
+
+def remaining():
+    """Seconds left for the current call_deadline block (None outside one); CallCancelled if none."""
+    until = getattr(_call, "until", None)
+    if until is None:
+        return None
+    left = until - time.monotonic()
+    if left <= 0 or (_call.cancelled is not None and _call.cancelled.is_set()):
+        raise CallCancelled("call deadline reached")
+    return left
+
+def pause(seconds, reason):
+    """metrics.sleep that refuses to sleep past the current call deadline."""
+    left = remaining()
+    if left is not None and seconds >= left:
+        raise CallCancelled(f"{reason} wait of {seconds:.1f}s exceeds the call deadline")
+    metrics.sleep(seconds, reason)
+
+# -----------------------------
+# 2. Shared client
+# -----------------------------
+class HttpClient:
+    """
+    One pooled keep-alive session for all calls in the process, with a token bucket per
+    host, retries (jittered exponential backoff, honoring Retry-After) and per-host
+    response-time histograms. Counters and histograms live in the metrics registry
+    (http_requests_total, http_retries_total, http_errors_total, http_request_seconds).
+    """
+    def __init__(self, host_rates=HOST_RATES, pool_size=POOL_SIZE, retries=MAX_RETRIES, timeout=TIMEOUT):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.host_rates = dict(host_rates)
+        self.retries = retries
+        self.timeout = timeout
+        self.buckets = {}
+        self.bucket_factory = TokenBucket  # replaced by ledger.shared_buckets() when several workers share the limits
+        self.latency = {}
+        self.requests = {}
+        self.retried = {}
+        self.lock = threading.Lock()
+
+    def _host_state(self, host):
+        with self.lock:
+            if host not in self.latency:
+                rate = self.host_rates.get(host)
+                self.buckets[host] = self.bucket_factory(rate, name=host) if rate else None
+                self.latency[host] = registry.histogram("http_request_seconds", host=host)
+                self.requests[host] = registry.counter("http_requests_total", host=host)
+                self.retried[host] = registry.counter("http_retries_total", host=host)
+            return self.buckets[host], self.latency[host]
+
+    def _count(self, table, host):
+        table[host].inc()
+
+    def _error(self, host, kind):
+        registry.counter("http_errors_total", host=host, kind=kind).inc()
+
+    def request(self, method, url, **kwargs):
+        host = urlsplit(url).hostname
+        bucket, hist = self._host_state(host)
+        timeout = kwargs.pop("timeout", self.timeout)
+        for attempt in range(self.retries + 1):
+            if bucket is not None:
+                bucket.acquire()
+            left = remaining()  # inside engine.with_deadline: never outlive the call
+            limit = timeout if left is None else min(max(timeout) if isinstance(timeout, tuple) else timeout, left)
+            self._count(self.requests, host)
+            t0 = time.perf_counter()
+            try:
+                resp = self.session.request(method, url, timeout=limit, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                hist.observe(time.perf_counter() - t0)
+                self._error(host, "timeout" if isinstance(e, requests.Timeout) else "connection")
+                if attempt == self.retries:
+                    raise
+                self._count(self.retried, host)
+                pause(backoff(attempt), "http_backoff")
+                continue
+            hist.observe(time.perf_counter() - t0)
+            if resp.status_code >= 400:
+                self._error(host, str(resp.status_code))
+            if resp.status_code in RETRY_STATUS and attempt < self.retries:
+                self._count(self.retried, host)
+                wait = retry_after(resp)
+                if wait is not None:
+                    pause(min(wait, BACKOFF_CAP), "retry_after")
+                else:
+                    pause(backoff(attempt), "http_backoff")
+                continue
+            return resp
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def get_json(self, url, **kwargs):
+        resp = self.get(url, **kwargs)
+        resp.raise_for_status()
+        return resp.json()
+
+    def report(self):
+        lines = ["🌐 HTTP per host:"]
+        for host in sorted(self.latency):
+            h = self.latency[host]
+            mean = h.total / h.count if h.count else 0.0
+            lines.append(f"   {host:<32} requests={self.requests[host].value:<7.0f} retries={self.retried[host].value:<5.0f} "
+                         f"mean={mean:.3f}s p50<={h.quantile(0.5)}s p99<={h.quantile(0.99)}s")
+        return "\n".join(lines)
+
+# Process-wide shared client
+client = HttpClient()
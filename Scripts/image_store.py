@@ -0,0 +1,191 @@
+import os
+import io
+import sys
+import json
+import mmap
+import tarfile
+import hashlib
+import tempfile
+from PIL import Image
+
+# --- CONFIGURATION ---
+IMAGE_DIR = "images"
+SHARD_CHARS = 2          # hex chars of the hash used as subdirectory (256 shards)
+TAR_SHARD_SIZE = 1000    # images per WebDataset-style tar shard
+TAR_PATTERN = "shards/gmgbd-%06d.tar"
+BLOB_PATH = "images.blob"  # packed blob; the offset index goes to BLOB_PATH + ".idx.json"
+
+def content_name(data):
+    """Dataset filename derived from the image bytes, so the same photo is stored once."""
+    return f"img_{hashlib.sha256(data).hexdigest()[:16]}.jpg"
+
+def check_image(data):
+    """Raises ValueError for truncated or non-image payloads (e.g. an HTML error page)."""
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            img.load()
+    except Exception as e:
+        raise ValueError(f"not a complete image: {e}") from e
+
+# -----------------------------
+# 1. Sharded, content-addressed directory store
+# -----------------------------
+class ImageStore:
+    """
+    images/<ab>/img_ab....jpg, where the name is the content hash. Writes go to a temp file
+    in the shard directory and are renamed into place, so a crash never leaves a partial JPEG
+    under a real name. Files from the old flat layout (images/img_*.jpg) are still found.
+    """
+    def __init__(self, root=IMAGE_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def shard_path(self, fname):
+        key = fname[len("img_"):] if fname.startswith("img_") else fname
+        return os.path.join(self.root, key[:SHARD_CHARS], fname)
+
+    def path(self, fname):
+        sharded = self.shard_path(fname)
+        if os.path.exists(sharded):
+            return sharded
+        flat = os.path.join(self.root, fname)
+        return flat if os.path.exists(flat) else sharded
+
+    def exists(self, fname):
+        return os.path.exists(self.path(fname))
+
+    def put(self, data, verify=True):
+        """Stores the bytes; returns (filename, is_new)."""
+        if verify:
+            check_image(data)
+        fname = content_name(data)
+        dest = self.shard_path(fname)
+        if os.path.exists(dest):
+            return fname, False
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(dest), suffix=".part")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, dest)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        return fname, True
+
+    def read(self, fname):
+        with open(self.path(fname), 'rb') as f:
+            return f.read()
+
+    def names(self):
+        for entry in os.scandir(self.root):
+            if entry.is_dir():
+                for sub in os.scandir(entry.path):
+                    if sub.name.endswith(".jpg"):
+                        yield sub.name
+            elif entry.name.endswith(".jpg"):
+                yield entry.name
+
+    def migrate_flat(self):
+        """Moves images/img_*.jpg from the flat layout into shard directories (names unchanged)."""
+        moved = 0
+        for entry in list(os.scandir(self.root)):
+            if entry.is_file() and entry.name.endswith(".jpg"):
+                dest = self.shard_path(entry.name)
+                os.makedirs(os.path.dirname(dest), exist_ok=True)
+                os.replace(entry.path, dest)
+                moved += 1
+        return moved
+
+# -----------------------------
+# 2. Packed formats for sequential reads
+# -----------------------------
+def pack_tar(store, names, pattern=TAR_PATTERN, shard_size=TAR_SHARD_SIZE, metadata=None):
+    """WebDataset-style shards: <key>.jpg (+ <key>.json when metadata[name] is given)."""
+    names = sorted(names)
+    os.makedirs(os.path.dirname(pattern) or ".", exist_ok=True)
+    paths = []
+    for n, start in enumerate(range(0, len(names), shard_size)):
+        out = pattern % n
+        with tarfile.open(out + ".part", 'w') as tar:
+            for fname in names[start:start + shard_size]:
+                key = fname.rsplit(".", 1)[0]
+                members = [(f"{key}.jpg", store.read(fname))]
+                if metadata and fname in metadata:
+                    members.append((f"{key}.json", json.dumps(metadata[fname], default=str).encode()))
+                for member, data in members:
+                    info = tarfile.TarInfo(member)
+                    info.size = len(data)
+                    tar.addfile(info, io.BytesIO(data))
+        os.replace(out + ".part", out)
+        paths.append(out)
+    return paths
+
+def iter_tar(path):
+    """Streams (filename, bytes) from a tar shard in file order."""
+    with tarfile.open(path, 'r|') as tar:
+        for member in tar:
+            if member.name.endswith(".jpg"):
+                yield os.path.basename(member.name), tar.extractfile(member).read()
+
+def pack_blob(store, names, blob_path=BLOB_PATH):
+    """Concatenates images into one file plus a {filename: [offset, length]} index."""
+    index, offset = {}, 0
+    with open(blob_path + ".part", 'wb') as f:
+        for fname in sorted(names):
+            data = store.read(fname)
+            f.write(data)
+            index[fname] = [offset, len(data)]
+            offset += len(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(blob_path + ".part", blob_path)
+    with open(blob_path + ".idx.json", 'w') as f:
+        json.dump(index, f)
+    return index
+
+class BlobReader:
+    """Memory-mapped reader over a packed blob; iterating goes in on-disk (sequential) order."""
+    def __init__(self, blob_path=BLOB_PATH):
+        with open(blob_path + ".idx.json") as f:
+            self.index = json.load(f)
+        self.file = open(blob_path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __contains__(self, fname):
+        return fname in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def get(self, fname):
+        offset, length = self.index[fname]
+        return self.map[offset:offset + length]
+
+    def __iter__(self):
+        for fname, (offset, length) in sorted(self.index.items(), key=lambda kv: kv[1][0]):
+            yield fname, self.map[offset:offset + length]
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+def main():
+    """python image_store.py migrate | tar | blob"""
+    store = ImageStore(IMAGE_DIR)
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "migrate"
+    if cmd == "migrate":
+        print(f"📦 Moved {store.migrate_flat()} images into shard directories under {IMAGE_DIR}/")
+    elif cmd == "tar":
+        print(f"📦 Wrote {len(pack_tar(store, store.names()))} tar shards ({TAR_PATTERN})")
+    elif cmd == "blob":
+        print(f"📦 Packed {len(pack_blob(store, store.names()))} images into {BLOB_PATH}")
+    else:
+        print(main.__doc__)
+
+if __name__ == "__main__":
+
+    main()
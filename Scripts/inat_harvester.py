@@ -0,0 +1,313 @@
+import io
+import os
+import json
+import queue
+import random
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+import requests
+from PIL import Image
+from http_client import client, RETRY_STATUS
+from metrics import registry
+
+# --- CONFIGURATION ---
+INAT_URL = "https://api.inaturalist.org/v1/observations"
+PER_PAGE = 200              # iNat maximum
+RANGES = 8                  # disjoint id ranges fetched concurrently
+CURSOR_FILE = "inat_cursors.json"
+CHECKPOINT_LAG = 3          # pages handed out but not yet checkpointed (may still be in the download/caption pipeline)
+PREFETCH_PAGES = 16         # fetched pages waiting for the consumer
+PAGE_RETRIES = 5            # consecutive transient failures of one range before the harvest gives up
+RETRY_WAIT = 5              # seconds before the first page retry (grows linearly)
+ITEM_RETRIES = 3            # runs in which an observation the consumer failed on is fetched again
+
+# The request rate is not limited here: every page goes through the shared http_client, whose
+# per-host token bucket (HOST_RATES["api.inaturalist.org"]) is the global budget for all ranges.
+
+def transient(e):
+    """Worth retrying a page: timeouts, dropped connections, 429 and 5xx (after http_client's own retries)."""
+    if isinstance(e, (requests.ConnectionError, requests.Timeout)):
+        return True
+    if isinstance(e, requests.HTTPError) and e.response is not None:
+        return e.response.status_code in RETRY_STATUS
+    return False
+
+def split_ranges(lo, hi, n):
+    """[lo, hi) id space -> n disjoint, contiguous [lo, hi) ranges."""
+    step = max(1, -(-(hi - lo) // n))
+    return [[a, min(a + step, hi)] for a in range(lo, hi, step)]
+
+class Harvester:
+    """
+    Iterates over iNat observations with id cursors instead of page numbers. The id space up to
+    the newest observation is split into disjoint ranges; each range pages forward with
+    id_above=<last id seen>&id_below=<range end>, and ranges are fetched concurrently. The
+    cursor of every range is checkpointed to a JSON file (CHECKPOINT_LAG pages behind what has
+    been handed out, so a crash re-fetches a few pages instead of losing them), and a restart
+    resumes each range where it stopped; observations above the previous run's newest id
+    become new ranges. Once the consumer has finished with every item it took, flush()
+    checkpoints the pages still inside the lag.
+
+    Observations the consumer could not process (retry_later) are kept in the checkpoint by id,
+    since the cursors have already moved past them, and fetched again first on the next run.
+    """
+    def __init__(self, url=INAT_URL, params=None, ranges=RANGES, per_page=PER_PAGE,
+                 checkpoint=CURSOR_FILE, http=client, workers=None):
+        self.url = url
+        self.params = dict(params or {})
+        self.n_ranges = ranges
+        self.per_page = per_page
+        self.checkpoint = checkpoint
+        self.http = http
+        self.workers = workers or ranges
+        self.pages = 0
+        self.items = 0
+        self.state = None
+        self.handed = []  # (range, cursor, done) of pages handed out, oldest first, not yet checkpointed
+        self.refetched = set()  # ids handed out again from the retry list in this run
+        self.failed = set()     # ids passed to retry_later in this run
+        self.error = None
+        self.pool = None  # range walkers of the current iteration
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def signature(self):
+        """Checkpoints are only reused for the same query (the d2 date cut-off may move)."""
+        fixed = {k: v for k, v in sorted(self.params.items()) if k != "d2"}
+        return hashlib.sha1(json.dumps([self.url, fixed], default=str).encode()).hexdigest()[:12]
+
+    def newest_id(self):
+        params = {**self.params, "per_page": 1, "order_by": "id", "order": "desc"}
+        res = self.http.get_json(self.url, params=params).get("results", [])
+        return int(res[0]["id"]) if res else 0
+
+    def _load(self):
+        top = self.newest_id() + 1
+        state = None
+        if self.checkpoint and os.path.exists(self.checkpoint):
+            with open(self.checkpoint, 'r') as f:
+                state = json.load(f)
+            if state.get("signature") != self.signature():
+                print(f"⚠️ {self.checkpoint} is for a different query. Starting over.")
+                state = None
+        if state is None:
+            state = {"signature": self.signature(), "top": 0, "ranges": []}
+        state.setdefault("retry", {})  # observation id -> runs it has failed in
+        if top > state["top"]:
+            new = split_ranges(state["top"], top, self.n_ranges)
+            state["ranges"] += [{"cursor": lo - 1, "end": hi, "done": False} for lo, hi in new]
+            state["top"] = top
+        self.state = state
+        self._save()
+        todo = [r for r in state["ranges"] if not r["done"]]
+        print(f"🧭 iNat harvest: {len(todo)}/{len(state['ranges'])} id ranges open (ids < {top})")
+        return todo
+
+    def _save(self):
+        if not self.checkpoint:
+            return
+        with self.lock:  # retry_later() saves from the pipeline's worker threads
+            tmp = self.checkpoint + ".tmp"
+            with open(tmp, 'w') as f:
+                json.dump(self.state, f)
+            os.replace(tmp, self.checkpoint)
+
+    def _fetch(self, rng, cursor):
+        params = {**self.params, "per_page": self.per_page, "order_by": "id", "order": "asc",
+                  "id_above": cursor, "id_below": rng["end"]}
+        return self.http.get_json(self.url, params=params).get("results", [])
+
+    def _refetch(self):
+        """Observations on the retry list, fetched by id (per_page at a time)."""
+        with self.lock:
+            ids = sorted(int(i) for i in self.state["retry"])
+        for start in range(0, len(ids), self.per_page):
+            chunk = ids[start:start + self.per_page]
+            params = {**self.params, "id": ",".join(map(str, chunk)), "per_page": len(chunk)}
+            yield from self.http.get_json(self.url, params=params).get("results", [])
+            with self.lock:
+                self.refetched.update(chunk)
+
+    def retry_later(self, obs_id):
+        """The consumer failed on this observation: fetch it again on the next run (up to ITEM_RETRIES runs)."""
+        if obs_id is None or self.state is None:
+            return
+        key = str(obs_id)
+        with self.lock:
+            self.failed.add(int(obs_id))
+            attempts = self.state["retry"].get(key, 0) + 1
+            if attempts > ITEM_RETRIES:
+                self.state["retry"].pop(key, None)
+                print(f"⚠️ iNat observation {obs_id} failed in {ITEM_RETRIES} runs. Not retrying it again.")
+            else:
+                self.state["retry"][key] = attempts
+        self._save()
+
+    def _put(self, pages, entry):
+        """Queues entry; False if the harvest was stopped first (nobody will read it)."""
+        while not self.stopped.is_set():
+            try:
+                pages.put(entry, timeout=0.5)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _walk(self, rng, pages):
+        """Pages one range forward, putting (range, cursor after the page, done, items) on the queue."""
+        cursor = rng["cursor"]
+        failures = 0
+        try:
+            while not self.stopped.is_set() and self.error is None:  # another range failed for good: stop too
+                try:
+                    res = self._fetch(rng, cursor)
+                except Exception as e:
+                    failures += 1
+                    if not transient(e) or failures > PAGE_RETRIES:
+                        print(f"❌ iNat range {cursor}..{rng['end']}: {type(e).__name__}: {e}. Giving up.")
+                        self.error = e
+                        raise
+                    registry.counter("inat_page_retries_total").inc()
+                    print(f"⚠️ iNat range {cursor}..{rng['end']}: {e}. Retry {failures}/{PAGE_RETRIES}...")
+                    self.stopped.wait(RETRY_WAIT * failures)
+                    continue
+                failures = 0
+                if res:
+                    cursor = max(int(item["id"]) for item in res)
+                done = len(res) < self.per_page
+                if not self._put(pages, (rng, cursor, done, res)) or done:
+                    return
+        finally:
+            self._put(pages, (rng, None, None, None))  # this range's worker has finished
+
+    def __iter__(self):
+        todo = self._load()
+        if self.state["retry"]:
+            print(f"🔁 Fetching {len(self.state['retry'])} observations that failed in earlier runs")
+            for item in self._refetch():
+                self.items += 1
+                yield item
+        pages = queue.Queue(maxsize=PREFETCH_PAGES)
+        self.pool = pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="inat")
+        for rng in todo:
+            pool.submit(self._walk, rng, pages)
+        open_ranges = len(todo)
+        try:
+            while open_ranges:
+                rng, cursor, done, items = pages.get()
+                if items is None:
+                    open_ranges -= 1
+                    if self.error is not None:
+                        raise self.error  # a range failed for good: stop instead of skipping it
+                    continue
+                self.pages += 1
+                registry.counter("inat_pages_total").inc()
+                for item in items:
+                    self.items += 1
+                    yield item
+                self.handed.append((rng, cursor, done))
+                # A page is checkpointed once CHECKPOINT_LAG later pages have been handed out,
+                # by which time its items have left the download/caption queues
+                if len(self.handed) > CHECKPOINT_LAG:
+                    self._commit(1)
+        finally:
+            self.stopped.set()
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _commit(self, n):
+        with self.lock:
+            for rng, cursor, done in self.handed[:n]:
+                rng["cursor"], rng["done"] = cursor, done
+            del self.handed[:n]
+        self._save()
+
+    def flush(self):
+        """Checkpoints every page handed out so far; call once the consumer is done with all of their items."""
+        with self.lock:
+            if self.state is not None:
+                for obs_id in self.refetched - self.failed:  # went through this time
+                    self.state["retry"].pop(str(obs_id), None)
+            self.refetched.clear()
+        self._commit(len(self.handed))
+
+    def close(self):
+        """
+        Stops the range walkers and waits for them (at most one page fetch). Needed when the
+        consumer stops early: a generator it merely stops pulling from never runs its finally.
+        """
+        self.stopped.set()
+        if self.pool is not None:
+            self.pool.shutdown(wait=True, cancel_futures=True)
+
+# -----------------------------
+# Local fake iNat API (tests and dry runs)
+# -----------------------------
+def fake_jpeg(seed):
+    """Small JPEG whose bytes differ per observation (content dedup must not merge them)."""
+    buf = io.BytesIO()
+    Image.frombytes("RGB", (64, 48), random.Random(seed).randbytes(64 * 48 * 3)).save(buf, "JPEG")
+    return buf.getvalue()
+
+class _FakeInatHandler(BaseHTTPRequestHandler):
+    """GET /v1/observations (id/id_above/id_below/order/per_page) and GET /photos/<id>/<size>.jpg."""
+    def _send(self, status, body, ctype):
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        srv = self.server
+        with srv.lock:
+            srv.requests += 1
+        if url.path.startswith("/photos/"):
+            oid = int(url.path.split("/")[2])
+            return self._send(200, fake_jpeg(oid), "image/jpeg")
+        if not url.path.endswith("/observations"):
+            return self._send(404, b"{}", "application/json")
+        q = {k: v[0] for k, v in parse_qs(url.query).items()}
+        lo, hi = int(q.get("id_above", -1)), int(q.get("id_below", 1 << 62))
+        per_page = min(int(q.get("per_page", 30)), 200)
+        ids = [i for i in srv.ids if lo < i < hi]
+        if "id" in q:
+            wanted = {int(i) for i in q["id"].split(",")}
+            ids = [i for i in ids if i in wanted]
+        if q.get("order") == "desc":
+            ids = ids[::-1]
+        if "page" in q:
+            start = (int(q["page"]) - 1) * per_page
+            ids = ids[start:]
+        base = f"http://127.0.0.1:{srv.server_address[1]}"
+        results = [srv.observation(i, base) for i in ids[:per_page]]
+        self._send(200, json.dumps({"total_results": len(ids), "per_page": per_page, "results": results}).encode(),
+                   "application/json")
+
+    def log_message(self, *args):
+        pass
+
+def fake_observation(oid, base):
+    rng = random.Random(oid)
+    genus = rng.choice(["Falco", "Parus", "Orthetrum", "Quercus", "Apis"])
+    return {
+        "id": oid,
+        "observed_on": f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        "geojson": {"type": "Point", "coordinates": [rng.uniform(-180, 180), rng.uniform(-60, 70)]},
+        "taxon": {"name": f"{genus} species{oid % 50}", "preferred_common_name": f"{genus} {oid % 50}"},
+        "photos": [{"id": oid * 10, "url": f"{base}/photos/{oid}/square.jpg"}],
+    }
+
+def fake_inat_server(n=2000, seed=0):
+    """Starts a fake iNat API with n observations at sparse ids; returns (server, observations url)."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _FakeInatHandler)
+    rng = random.Random(seed)
+    server.ids = sorted(rng.sample(range(1, n * 5), n))
+    server.observation = fake_observation
+    server.requests = 0
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1/observations"
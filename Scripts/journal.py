@@ -0,0 +1,64 @@
+import os
+import time
+import pandas as pd
+
+COMMIT_PREFIX = "@"  # "@<size>" lines mark the output file size the keys above it belong to
+
+class Journal:
+    """
+    Append-only log of completed keys (one per line), fsync'd on every append.
+    Resuming only reads this file, never the full output CSV.
+    """
+    def __init__(self, path):
+        self.path = path
+
+    def read(self):
+        """Returns (keys, last committed output size or None)."""
+        if not os.path.exists(self.path):
+            return set(), None
+        with open(self.path, 'r', encoding='utf-8') as f:
+            data = f.read()
+        # A line without its newline was cut off by a crash mid-append
+        if data and not data.endswith('\n'):
+            data = data[:data.rfind('\n') + 1]
+        lines = data.splitlines()
+        commits = [i for i, line in enumerate(lines) if line.startswith(COMMIT_PREFIX)]
+        if not commits:
+            return set(lines), None
+        last = commits[-1]
+        keys = {line for line in lines[:last] if not line.startswith(COMMIT_PREFIX)}
+        return keys, int(lines[last][len(COMMIT_PREFIX):])
+
+    def load(self):
+        return self.read()[0]
+
+    def append(self, keys, commit=None):
+        """Appends keys; with `commit`, also records the output size they were flushed at."""
+        lines = [f"{k}\n" for k in keys]
+        if commit is not None:
+            lines.append(f"{COMMIT_PREFIX}{commit}\n")
+        if not lines:
+            return
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(''.join(lines))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def bootstrap(self, csv_path, key='filename'):
+        """One-time migration: builds the journal from an existing output CSV."""
+        if os.path.exists(self.path) or not os.path.exists(csv_path):
+            return
+        keys = pd.read_csv(csv_path, usecols=[key])[key].astype(str).tolist()
+        tmp = self.path + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(''.join(f"{k}\n" for k in keys))
+            f.write(f"{COMMIT_PREFIX}{os.path.getsize(csv_path)}\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        print(f"📒 Journal created from {csv_path} ({len(keys)} keys)")
+
+def beat(path):
+    """Touches the heartbeat file the supervisor watches."""
+    with open(path, 'w') as f:
+        f.write(str(time.time()))
@@ -0,0 +1,320 @@
+import io
+import os
+import sys
+import glob
+import json
+import time
+import socket
+import sqlite3
+import threading
+import pandas as pd
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from http_client import HttpClient
+from journal import Journal
+from writer import rewrite_csv
+from provenance import is_sidecar, merge_sidecars
+
+# --- CONFIGURATION ---
+LEDGER_DB = "work_ledger.sqlite"
+LEASE_TTL = 1800          # seconds a leased row stays reserved unless renewed (a worker that dies loses it after this)
+LEASE_RENEW = 300         # seconds between renewals of the batch a worker is processing (LeaseKeeper)
+MAX_ATTEMPTS = 5          # leases per row before it is parked as failed
+SHARD_PATTERN = "{stem}.shard-{worker}.csv"   # per-worker output next to OUTPUT_CSV
+LEDGER_PORT = 8765
+
+def worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+# -----------------------------
+# 1. The ledger
+# -----------------------------
+class WorkLedger:
+    """
+    SQLite table of every input row (by key, in input order) with its state:
+    todo -> leased (worker, lease expiry) -> done, or back to todo when the lease expires or
+    the worker releases it. Leases are taken in one IMMEDIATE transaction, so concurrent
+    workers always get disjoint rows. Also holds the token buckets shared by all workers.
+
+    Several processes on one host can open the same file; workers on other hosts go through
+    `python ledger.py serve` and RemoteLedger (SQLite locking is not safe on network shares).
+    """
+    def __init__(self, path=LEDGER_DB):
+        self.path = path
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=60)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("""CREATE TABLE IF NOT EXISTS rows (
+            key TEXT PRIMARY KEY, seq INTEGER, state TEXT, worker TEXT, lease_until REAL,
+            attempts INTEGER DEFAULT 0)""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS rows_todo ON rows(state, seq)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, tokens REAL, updated REAL)")
+
+    def _tx(self, fn):
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                out = fn()
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+            self.db.execute("COMMIT")
+            return out
+
+    def load(self, keys):
+        """Registers input keys in order (idempotent: every worker may call it on start)."""
+        keys = [str(k) for k in keys]
+
+        def run():
+            base = self.db.execute("SELECT COALESCE(MAX(seq), -1) + 1 FROM rows").fetchone()[0]
+            cur = self.db.executemany("INSERT OR IGNORE INTO rows (key, seq, state) VALUES (?, ?, 'todo')",
+                                      ((k, base + i) for i, k in enumerate(keys)))
+            return cur.rowcount
+        return self._tx(run)
+
+    def mark_done(self, keys):
+        """Rows already in the output (journal) are not handed out again."""
+        keys = [(str(k),) for k in keys]
+        return self._tx(lambda: self.db.executemany("UPDATE rows SET state='done', worker=NULL WHERE key=?", keys).rowcount)
+
+    def lease(self, worker, n, ttl=LEASE_TTL):
+        """Up to n todo (or expired) rows in input order, reserved for `worker` for ttl seconds."""
+        def run():
+            now = time.time()
+            # Rows whose workers kept dying on them are parked instead of being handed out forever
+            self.db.execute("UPDATE rows SET state='failed' WHERE state='leased' AND attempts >= ? AND lease_until < ?",
+                            (MAX_ATTEMPTS, now))
+            keys = [r[0] for r in self.db.execute(
+                """SELECT key FROM rows WHERE state='todo' OR (state='leased' AND lease_until < ?)
+                   ORDER BY seq LIMIT ?""", (now, n))]
+            self.db.executemany("UPDATE rows SET state='leased', worker=?, lease_until=?, attempts=attempts+1 WHERE key=?",
+                                ((worker, now + ttl, k) for k in keys))
+            return keys
+        return self._tx(run)
+
+    def renew(self, worker, keys, ttl=LEASE_TTL):
+        until = time.time() + ttl
+        return self._tx(lambda: self.db.executemany(
+            "UPDATE rows SET lease_until=? WHERE key=? AND worker=? AND state='leased'",
+            ((until, str(k), worker) for k in keys)).rowcount)
+
+    def complete(self, worker, keys):
+        """Leased rows written durably by `worker` become done (rows whose lease was lost still count)."""
+        return self._tx(lambda: self.db.executemany(
+            "UPDATE rows SET state='done', worker=? WHERE key=? AND state != 'done'",
+            ((worker, str(k)) for k in keys)).rowcount)
+
+    def release(self, worker, keys):
+        """Hands rows back (failed lookups); they are leased again, up to MAX_ATTEMPTS times."""
+        def run():
+            cur = self.db.executemany(
+                "UPDATE rows SET state=CASE WHEN attempts >= ? THEN 'failed' ELSE 'todo' END, worker=NULL "
+                "WHERE key=? AND worker=? AND state='leased'",
+                ((MAX_ATTEMPTS, str(k), worker) for k in keys))
+            return cur.rowcount
+        return self._tx(run)
+
+    def take(self, name, rate, burst=1):
+        """Shared token bucket: 0 if a token was taken, else the seconds to wait before asking again."""
+        def run():
+            now = time.time()
+            row = self.db.execute("SELECT tokens, updated FROM buckets WHERE name=?", (name,)).fetchone()
+            tokens = burst if row is None else min(burst, row[0] + (now - row[1]) * rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate
+            self.db.execute("INSERT OR REPLACE INTO buckets VALUES (?, ?, ?)", (name, tokens, now))
+            return wait
+        return self._tx(run)
+
+    def stats(self):
+        with self.lock:
+            counts = dict(self.db.execute("SELECT state, COUNT(*) FROM rows GROUP BY state").fetchall())
+            workers = self.db.execute("SELECT COUNT(DISTINCT worker) FROM rows WHERE state='leased' AND lease_until >= ?",
+                                      (time.time(),)).fetchone()[0]
+        return {**counts, "active_workers": workers}
+
+    def close(self):
+        self.db.close()
+
+class LeaseKeeper:
+    """
+    Renews the rows a worker is holding every LEASE_RENEW seconds from a background thread,
+    so a batch slower than LEASE_TTL is not leased to another worker while it is still running.
+    """
+    def __init__(self, ledger, worker, every=LEASE_RENEW, ttl=LEASE_TTL):
+        self.ledger = ledger
+        self.worker = worker
+        self.every = every
+        self.ttl = ttl
+        self.keys = []
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="lease-renew", daemon=True)
+        self.thread.start()
+
+    def hold(self, keys):
+        """The rows of the batch now being processed (done rows are skipped by renew)."""
+        self.keys = list(keys)
+
+    def _run(self):
+        while not self.stopped.wait(self.every):
+            keys = self.keys
+            if not keys:
+                continue
+            try:
+                self.ledger.renew(self.worker, keys, self.ttl)
+            except Exception as e:
+                print(f"⚠️ Lease renewal failed: {e}")
+
+    def close(self):
+        self.stopped.set()
+        self.thread.join()
+
+# -----------------------------
+# 2. Remote access (workers on other hosts)
+# -----------------------------
+METHODS = {"load", "mark_done", "lease", "renew", "complete", "release", "take", "stats"}
+
+class _LedgerHandler(BaseHTTPRequestHandler):
+    """POST /<method> with a JSON list of arguments; answers {"result": ...}."""
+    def do_POST(self):
+        name = self.path.strip("/")
+        try:
+            if name not in METHODS:
+                raise ValueError(f"unknown method {name}")
+            args = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"[]")
+            status, body = 200, {"result": getattr(self.server.ledger, name)(*args)}
+        except Exception as e:
+            status, body = 500, {"error": f"{type(e).__name__}: {e}"}
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+def serve(path=LEDGER_DB, port=LEDGER_PORT, host="0.0.0.0"):
+    server = ThreadingHTTPServer((host, port), _LedgerHandler)
+    server.daemon_threads = True
+    server.ledger = WorkLedger(path)
+    return server
+
+class RemoteLedger:
+    """
+    Same methods as WorkLedger, called over HTTP on a `python ledger.py serve` host. Calls are
+    never retried: a lease, take or load whose answer was lost may already have been applied.
+    """
+    def __init__(self, url, http=None):
+        self.url = url.rstrip("/")
+        self.http = http or HttpClient(host_rates={}, retries=0)
+
+    def _call(self, name, *args):
+        resp = self.http.request("POST", f"{self.url}/{name}", json=list(args), timeout=60)
+        body = resp.json()
+        if resp.status_code != 200:
+            raise RuntimeError(f"ledger {name}: {body.get('error')}")
+        return body["result"]
+
+    def __getattr__(self, name):
+        if name not in METHODS:
+            raise AttributeError(name)
+        return lambda *args: self._call(name, *args)
+
+    def close(self):
+        pass
+
+def open_ledger(location):
+    """A ledger file path, or the http:// URL of a ledger server."""
+    if location.startswith(("http://", "https://")):
+        return RemoteLedger(location)
+    return WorkLedger(location)
+
+class SharedTokenBucket:
+    """TokenBucket drop-in whose tokens live in the ledger, so N workers share one rate limit."""
+    def __init__(self, ledger, rate, burst=1, name="bucket"):
+        self.ledger = ledger
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.name = name
+
+    def acquire(self):
+        while True:
+            wait = self.ledger.take(self.name, self.rate, self.burst)
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+def shared_buckets(ledger):
+    """bucket_factory for HttpClient / Engine: rate limits shared through the ledger."""
+    return lambda rate, name: SharedTokenBucket(ledger, rate, name=name)
+
+# -----------------------------
+# 3. Deterministic merge of worker shards
+# -----------------------------
+def journal_path(output_csv):
+    """gmgbd.csv -> gmgbd.journal (environment.py's JOURNAL_PATH convention)."""
+    return os.path.splitext(output_csv)[0] + ".journal"
+
+def shard_path(output_csv, worker):
+    return SHARD_PATTERN.format(stem=os.path.splitext(output_csv)[0], worker=worker)
+
+def shard_paths(output_csv):
+    paths = glob.glob(SHARD_PATTERN.format(stem=os.path.splitext(output_csv)[0], worker="*"))
+    return sorted(p for p in paths if not is_sidecar(p))
+
+def read_committed(path, journal, key='filename'):
+    """The part of a RowWriter CSV its journal vouches for (a worker may be mid-flush)."""
+    _, committed = Journal(journal).read()
+    with open(path, 'rb') as f:
+        data = f.read() if committed is None else f.read(committed)
+    return pd.read_csv(io.BytesIO(data), dtype={key: str}) if data else None
+
+def merge(input_csv, output_csv, key='filename'):
+    """
+    output_csv + every shard -> output_csv, one row per key, in input_csv order.
+    The first copy of a key wins (output_csv, then shards sorted by name), so the result
+    does not depend on which worker finished first. Idempotent: shards are left in place.
+    The provenance sidecars are merged the same way.
+    """
+    order = pd.read_csv(input_csv, usecols=[key], dtype={key: str})[key]
+    sources = [(p, p + ".journal") for p in shard_paths(output_csv)]
+    if os.path.exists(output_csv):
+        sources.insert(0, (output_csv, journal_path(output_csv)))
+    parts = [read_committed(p, j, key) for p, j in sources]
+    parts = [p for p in parts if p is not None]
+    if not parts:
+        return 0
+    df = pd.concat(parts, ignore_index=True).drop_duplicates(subset=[key], keep='first')
+    rank = pd.Series(range(len(order)), index=order.drop_duplicates().values)
+    df = df.assign(_seq=df[key].map(rank).fillna(len(order))).sort_values(['_seq', key], kind='stable').drop(columns='_seq')
+
+    rewrite_csv(df, output_csv, key=key, index_path=journal_path(output_csv))
+    merge_sidecars([p for p, _ in sources], output_csv)  # per-row provenance follows the rows
+    return len(df)
+
+def main():
+    """python ledger.py serve [db] [port] | stats [db or url] | merge [input_csv] [output_csv]"""
+    cmd = sys.argv[1] if len(sys.argv) > 1 else ""
+    if cmd == "serve":
+        path = sys.argv[2] if len(sys.argv) > 2 else LEDGER_DB
+        port = int(sys.argv[3]) if len(sys.argv) > 3 else LEDGER_PORT
+        server = serve(path, port)
+        print(f"📒 Ledger {path} on port {port}: {server.ledger.stats()}")
+        server.serve_forever()
+    elif cmd == "stats":
+        print(open_ledger(sys.argv[2] if len(sys.argv) > 2 else LEDGER_DB).stats())
+    elif cmd == "merge":
+        input_csv = sys.argv[2] if len(sys.argv) > 2 else "final.csv"
+        output_csv = sys.argv[3] if len(sys.argv) > 3 else "gmgbd.csv"
+        n = merge(input_csv, output_csv)
+        print(f"🧩 Merged {len(shard_paths(output_csv))} shards into {output_csv}: {n} rows")
+    else:
+        print(main.__doc__)
+
+if __name__ == "__main__":
+    main()
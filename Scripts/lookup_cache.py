@@ -0,0 +1,150 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+import pandas as pd
+
+# --- CONFIGURATION ---
+CACHE_DB = "lookup_cache.sqlite"
+GRID_DEG = 0.01  # ~1 km cells, matching the NDVI sampling scale
+MAX_ENTRIES = 2_000_000
+
+# Time-to-live per lookup kind in days (None = never expires)
+TTL_DAYS = {
+    "geocode": 365,       # OSM boundaries/names do change, slowly
+    "elevation": None,
+    "water": None,
+    "temperature": None,  # archive values for a past date are final
+    "ndvi": None,
+}
+
+# Which gmgbd.csv columns hold the value of each kind (used for seeding)
+SEED_COLUMNS = {
+    "geocode": ["country", "state", "city"],
+    "elevation": ["elevation_m"],
+    "water": ["dist_to_water_m"],
+    "temperature": ["avg_temp_C"],
+    "ndvi": ["NDVI_value", "NDVI_Category"],
+}
+DATED_KINDS = {"temperature", "ndvi"}
+
+class LookupCache:
+    """
+    On-disk cache of provider lookups, keyed by quantized (lat, lon) and,
+    for date-dependent kinds, the sighting date. Safe to share between threads.
+    """
+    def __init__(self, path=CACHE_DB, grid=GRID_DEG, ttl_days=TTL_DAYS, max_entries=MAX_ENTRIES):
+        self.grid = grid
+        self.ttl_days = ttl_days
+        self.max_entries = max_entries
+        self.hits = {}
+        self.misses = {}
+        self.lock = threading.Lock()
+        # Shared by every worker process on the host (ledger mode): wait for their writes
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=60)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("""CREATE TABLE IF NOT EXISTS lookups (
+            kind TEXT, cell TEXT, day TEXT, value TEXT, created REAL,
+            PRIMARY KEY (kind, cell, day)) WITHOUT ROWID""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS lookups_created ON lookups(created)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS versions (kind TEXT PRIMARY KEY, version TEXT)")
+
+    def cell(self, lat, lon):
+        return f"{round(float(lat) / self.grid)}:{round(float(lon) / self.grid)}"
+
+    def get(self, kind, lat, lon, day=""):
+        """Returns (found, value)."""
+        with self.lock:
+            row = self.db.execute("SELECT value, created FROM lookups WHERE kind=? AND cell=? AND day=?",
+                                  (kind, self.cell(lat, lon), str(day))).fetchone()
+            ttl = self.ttl_days.get(kind)
+            if row is not None and (ttl is None or time.time() - row[1] < ttl * 86400):
+                self.hits[kind] = self.hits.get(kind, 0) + 1
+                return True, json.loads(row[0])
+            self.misses[kind] = self.misses.get(kind, 0) + 1
+            return False, None
+
+    def has(self, kind, lat, lon, day=""):
+        """Like get(), but without touching the hit/miss counters."""
+        with self.lock:
+            row = self.db.execute("SELECT created FROM lookups WHERE kind=? AND cell=? AND day=?",
+                                  (kind, self.cell(lat, lon), str(day))).fetchone()
+        ttl = self.ttl_days.get(kind)
+        return row is not None and (ttl is None or time.time() - row[0] < ttl * 86400)
+
+    def put(self, kind, lat, lon, value, day=""):
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO lookups VALUES (?, ?, ?, ?, ?)",
+                            (kind, self.cell(lat, lon), str(day), json.dumps(value), time.time()))
+
+    def fetch(self, kind, lat, lon, fn, day=""):
+        """Cached value for the cell, calling fn() and storing its result on a miss."""
+        found, value = self.get(kind, lat, lon, day)
+        if found:
+            return value
+        value = fn()
+        self.put(kind, lat, lon, value, day)
+        return value
+
+    def evict(self):
+        """Drops expired entries, then the oldest ones beyond max_entries."""
+        with self.lock:
+            now = time.time()
+            for kind, ttl in self.ttl_days.items():
+                if ttl is not None:
+                    self.db.execute("DELETE FROM lookups WHERE kind=? AND created < ?", (kind, now - ttl * 86400))
+            excess = self.db.execute("SELECT COUNT(*) FROM lookups").fetchone()[0] - self.max_entries
+            if excess > 0:
+                self.db.execute("""DELETE FROM lookups WHERE (kind, cell, day) IN (
+                    SELECT kind, cell, day FROM lookups ORDER BY created LIMIT ?)""", (excess,))
+
+    def check_versions(self, versions):
+        """
+        Drops every entry of a kind whose enrichment version changed since it was cached
+        (provenance.fingerprint), so new code never reads values computed by the old one.
+        Kinds seen for the first time are just recorded. Returns the kinds that were dropped.
+        """
+        dropped = []
+        with self.lock:
+            known = dict(self.db.execute("SELECT kind, version FROM versions").fetchall())
+            for kind, version in versions.items():
+                if kind in known and known[kind] != version:
+                    self.db.execute("DELETE FROM lookups WHERE kind=?", (kind,))
+                    dropped.append(kind)
+                self.db.execute("INSERT OR REPLACE INTO versions VALUES (?, ?)", (kind, version))
+        return dropped
+
+    def seed_from_csv(self, path, stale=None):
+        """Pre-fills the cache from an already enriched CSV (e.g. gmgbd.csv), skipping stale[kind] filenames."""
+        if not os.path.exists(path):
+            return 0
+        df = pd.read_csv(path)
+        df = df.astype(object).where(df.notna(), None)
+        now = time.time()
+        cells = [self.cell(lat, lon) for lat, lon in zip(df['latitude'], df['longitude'])]
+        names = df['filename'].astype(str)
+        entries = []
+        for kind, cols in SEED_COLUMNS.items():
+            skip = (stale or {}).get(kind) or set()
+            days = df['sighting_date'].astype(str) if kind in DATED_KINDS else [""] * len(df)
+            values = zip(*(df[c] for c in cols))
+            for name, cell, day, value in zip(names, cells, days, values):
+                if name in skip:
+                    continue
+                value = list(value) if len(cols) > 1 else value[0]
+                entries.append((kind, cell, day, json.dumps(value), now))
+        with self.lock:
+            self.db.execute("BEGIN")
+            self.db.executemany("INSERT OR IGNORE INTO lookups VALUES (?, ?, ?, ?, ?)", entries)
+            self.db.execute("COMMIT")
+        return len(entries)
+
+    def stats(self):
+        kinds = sorted(set(self.hits) | set(self.misses))
+        return {k: {"hits": self.hits.get(k, 0), "misses": self.misses.get(k, 0)} for k in kinds}
+
+    def close(self):
+        with self.lock:
+            self.db.close()
@@ -0,0 +1,356 @@
+import os
+import sys
+import json
+import time
+import atexit
+import cProfile
+import threading
+from collections import Counter as _Tally
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# --- CONFIGURATION ---
+PREFIX = "gmgbd_"
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, float("inf"))
+FLUSH_INTERVAL = 15        # seconds between JSON snapshots
+SAMPLE_INTERVAL = 0.01     # seconds between stack samples in "sample" mode
+# Hot-path profiling for one run: "" (off), "cprofile" (<name>.prof, open with snakeviz/pstats)
+# or "sample" (<name>.stacks.txt in collapsed-stack format for flamegraph.pl / speedscope).
+# Set GMGBD_PROFILE to switch it on without editing the scripts.
+PROFILE = os.environ.get("GMGBD_PROFILE", "")
+
+# -----------------------------
+# 1. Metric types
+# -----------------------------
+class Counter:
+    def __init__(self):
+        self.value = 0.0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+class Gauge:
+    def __init__(self):
+        self.value = 0.0
+        self.lock = threading.Lock()
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+class Histogram:
+    """Fixed-bucket latency histogram (seconds)."""
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.total = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        with self.lock:
+            self.count += 1
+            self.total += value
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[i] += 1
+                    break
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th quantile."""
+        with self.lock:
+            target, seen = q * self.count, 0
+            for bound, n in zip(self.buckets, self.counts):
+                seen += n
+                if n and seen >= target:
+                    return bound
+        return 0.0
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.counts), self.count, self.total
+
+# -----------------------------
+# 2. Registry
+# -----------------------------
+def _labels(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _fmt_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+class Registry:
+    """
+    Process-wide metrics: counters, gauges and histograms keyed by (name, labels), plus
+    collectors, i.e. functions called at scrape time that return [(name, labels, value)]
+    for state that already lives elsewhere (pipeline queues, stage stats).
+    """
+    def __init__(self):
+        self.metrics = {}   # (name, labels) -> metric
+        self.kinds = {}     # name -> "counter" | "gauge" | "histogram"
+        self.collectors = []
+        self.lock = threading.Lock()
+        self.started = time.time()
+
+    def _get(self, kind, cls, name, labels):
+        key = (name, _labels(labels))
+        with self.lock:
+            m = self.metrics.get(key)
+            if m is None:
+                m = self.metrics[key] = cls()
+                self.kinds[name] = kind
+            return m
+
+    def counter(self, name, **labels):
+        return self._get("counter", Counter, name, labels)
+
+    def gauge(self, name, **labels):
+        return self._get("gauge", Gauge, name, labels)
+
+    def histogram(self, name, **labels):
+        return self._get("histogram", Histogram, name, labels)
+
+    def add_collector(self, fn):
+        with self.lock:
+            self.collectors.append(fn)
+
+    def remove_collector(self, fn):
+        with self.lock:
+            if fn in self.collectors:
+                self.collectors.remove(fn)
+
+    def _collected(self):
+        with self.lock:
+            collectors = list(self.collectors)
+        out = []
+        for fn in collectors:
+            try:
+                out.extend((name, _labels(labels), value) for name, labels, value in fn())
+            except Exception:
+                continue  # a broken collector must not take the endpoint down
+        return out
+
+    def _items(self):
+        with self.lock:
+            return sorted(self.metrics.items(), key=lambda kv: kv[0]), dict(self.kinds)
+
+    def prometheus(self):
+        """Text exposition format (version 0.0.4)."""
+        items, kinds = self._items()
+        lines, typed = [], set()
+        for (name, labels), m in items:
+            full = PREFIX + name
+            if name not in typed:
+                lines.append(f"# TYPE {full} {kinds[name]}")
+                typed.add(name)
+            if isinstance(m, Histogram):
+                counts, count, total = m.snapshot()
+                cumulative = 0
+                for bound, n in zip(m.buckets, counts):
+                    cumulative += n
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{full}_bucket{_fmt_labels(labels, [('le', le)])} {cumulative}")
+                lines.append(f"{full}_sum{_fmt_labels(labels)} {total}")
+                lines.append(f"{full}_count{_fmt_labels(labels)} {count}")
+            else:
+                lines.append(f"{full}{_fmt_labels(labels)} {m.value}")
+        for name, labels, value in self._collected():
+            full = PREFIX + name
+            if name not in typed:
+                lines.append(f"# TYPE {full} gauge")
+                typed.add(name)
+            lines.append(f"{full}{_fmt_labels(labels)} {value}")
+        lines.append(f"# TYPE {PREFIX}uptime_seconds gauge")
+        lines.append(f"{PREFIX}uptime_seconds {time.time() - self.started:.1f}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        """JSON-friendly view: {name: [{labels..., value | count/sum/p50/p99}]}."""
+        items, _ = self._items()
+        out = {"time": time.time(), "uptime_seconds": round(time.time() - self.started, 1)}
+        for (name, labels), m in items:
+            entry = dict(labels)
+            if isinstance(m, Histogram):
+                _, count, total = m.snapshot()
+                entry.update(count=count, sum=round(total, 3), p50=m.quantile(0.5), p99=m.quantile(0.99))
+            else:
+                entry["value"] = m.value
+            out.setdefault(name, []).append(entry)
+        for name, labels, value in self._collected():
+            out.setdefault(name, []).append({**dict(labels), "value": value})
+        return out
+
+# Process-wide registry
+registry = Registry()
+
+def sleep(seconds, reason):
+    """time.sleep that is accounted as sleep_seconds_total{reason} (vs. time spent working)."""
+    registry.counter("sleep_seconds_total", reason=reason).inc(seconds)
+    registry.counter("sleeps_total", reason=reason).inc()
+    time.sleep(seconds)
+
+class timer:
+    """with timer(histogram): ...  observes the elapsed seconds."""
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.t0)
+
+# -----------------------------
+# 3. Exposure: Prometheus endpoint / JSON file
+# -----------------------------
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] == "/metrics.json":
+            body, ctype = json.dumps(registry.snapshot()).encode(), "application/json"
+        else:
+            body, ctype = registry.prometheus().encode(), "text/plain; version=0.0.4"
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def serve(port, host="127.0.0.1"):
+    """GET /metrics (Prometheus text) and /metrics.json on a background thread; returns the server."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+def write_json(path):
+    tmp = path + ".tmp"
+    with open(tmp, 'w') as f:
+        json.dump(registry.snapshot(), f, indent=1)
+    os.replace(tmp, path)
+
+class JsonFlusher:
+    """Rewrites a JSON snapshot every `interval` seconds (and once more on stop)."""
+    def __init__(self, path, interval=FLUSH_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="metrics-json", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                write_json(self.path)
+            except OSError as e:
+                print(f"\n⚠️ metrics: cannot write {self.path}: {e}")
+
+    def stop(self):
+        self.stopped.set()
+        write_json(self.path)
+
+# -----------------------------
+# 4. Hot-path profiling
+# -----------------------------
+class StackSampler:
+    """
+    Samples every thread's stack each `interval` seconds and counts collapsed stacks
+    ("outer;...;inner count" lines), the input format of flamegraph.pl and speedscope.
+    Cheap enough to leave on for a whole run, unlike cProfile's per-call tracing.
+    """
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = _Tally()
+        self.samples = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def _run(self):
+        me = threading.get_ident()
+        names = {}
+        while not self.stopped.wait(self.interval):
+            for t in threading.enumerate():
+                names[t.ident] = t.name
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                thread = names.get(ident, "thread").rstrip("0123456789").rstrip("-_")
+                self.stacks[";".join([thread] + stack[::-1])] += 1
+            self.samples += 1
+
+    def stop(self, path):
+        self.stopped.set()
+        self.thread.join()
+        with open(path, 'w') as f:
+            for stack, n in self.stacks.most_common():
+                f.write(f"{stack} {n}\n")
+
+    def top(self, n=15):
+        """Leaf functions by share of samples (threads blocked in wait/sleep included)."""
+        leaves = _Tally()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        total = max(sum(leaves.values()), 1)
+        return [(fn, count / total) for fn, count in leaves.most_common(n)]
+
+def start(name, port=None, json_path=None, profile=PROFILE):
+    """
+    Turns on the metrics surface for a script run: Prometheus endpoint on `port`, JSON
+    snapshots in `json_path`, and the profiling mode. Returns a stop() to call at the end
+    (also registered with atexit, so a crash still leaves the last numbers behind).
+    """
+    server = serve(port) if port else None
+    flusher = JsonFlusher(json_path) if json_path else None
+    profiler, sampler = None, None
+    if profile == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()  # main thread only: worker threads are covered by "sample"
+    elif profile == "sample":
+        sampler = StackSampler().start()
+    elif profile:
+        print(f"⚠️ Unknown profile mode {profile!r} (use 'cprofile' or 'sample')")
+    if server:
+        print(f"📡 Metrics on http://127.0.0.1:{server.server_address[1]}/metrics")
+    done = []
+
+    def stop():
+        if done:
+            return
+        done.append(True)
+        if flusher:
+            flusher.stop()
+        if server:
+            server.shutdown()
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(name + ".prof")
+            print(f"🔬 cProfile written to {name}.prof")
+        if sampler:
+            sampler.stop(name + ".stacks.txt")
+            print(f"🔬 {sampler.samples} stack samples written to {name}.stacks.txt. Hottest:")
+            for fn, share in sampler.top():
+                print(f"   {share:6.1%}  {fn}")
+    atexit.register(stop)
+    return stop
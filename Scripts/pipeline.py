@@ -0,0 +1,162 @@
+import time
+import queue
+import threading
+from metrics import registry
+
+_STOP = object()  # end-of-stream marker passed from stage to stage
+
+# -----------------------------
+# 1. Stage metrics
+# -----------------------------
+class StageStats:
+    def __init__(self):
+        self.items_in = 0
+        self.items_out = 0
+        self.errors = 0
+        self.busy = 0.0     # seconds spent inside the stage function (summed over workers)
+        self.waiting = 0.0  # seconds spent blocked on the input queue
+        self.lock = threading.Lock()
+
+    def add(self, items_in, items_out, busy, waiting, error=False):
+        with self.lock:
+            self.items_in += items_in
+            self.items_out += items_out
+            self.busy += busy
+            self.waiting += waiting
+            self.errors += int(error)
+
+# -----------------------------
+# 2. Stages
+# -----------------------------
+class Stage:
+    """
+    One step of the pipeline, run by `workers` threads reading from a bounded queue.
+    fn(item) (or fn(list_of_items) when batch_size is set) returns an iterable of outputs
+    for the next stage. A full output queue blocks the workers: that is the backpressure.
+    """
+    def __init__(self, name, fn, workers=1, queue_size=64, batch_size=None, batch_timeout=1.0):
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_timeout = batch_timeout
+        self.inbox = queue.Queue(maxsize=queue_size)
+        self.outbox = None  # next stage's inbox, wired by Pipeline
+        self.stats = StageStats()
+        self._alive = workers
+        self._lock = threading.Lock()
+
+    def _take(self):
+        """Next item, or a batch of up to batch_size items; _STOP at end of stream."""
+        t0 = time.perf_counter()
+        item = self.inbox.get()
+        if self.batch_size is None or item is _STOP:
+            return item, time.perf_counter() - t0
+        batch = [item]
+        deadline = time.monotonic() + self.batch_timeout
+        while len(batch) < self.batch_size:
+            try:
+                item = self.inbox.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self.inbox.put(_STOP)  # leave it for the next take
+                break
+            batch.append(item)
+        return batch, time.perf_counter() - t0
+
+    def _work(self):
+        while True:
+            item, waited = self._take()
+            if item is _STOP:
+                self.inbox.put(_STOP)  # let sibling workers see it too
+                break
+            t0 = time.perf_counter()
+            n_in = len(item) if self.batch_size is not None else 1
+            try:
+                outputs = list(self.fn(item) or [])
+                error = False
+            except Exception as e:
+                print(f"\n⚠️ [{self.name}] {type(e).__name__}: {e}")
+                outputs, error = [], True
+            self.stats.add(n_in, len(outputs), time.perf_counter() - t0, waited, error)
+            if self.outbox is not None:
+                for out in outputs:
+                    self.outbox.put(out)
+        with self._lock:
+            self._alive -= 1
+            last = self._alive == 0
+        if last and self.outbox is not None:
+            self.outbox.put(_STOP)
+
+    def start(self):
+        self.threads = [threading.Thread(target=self._work, name=f"{self.name}-{i}", daemon=True)
+                        for i in range(self.workers)]
+        for t in self.threads:
+            t.start()
+
+# -----------------------------
+# 3. Pipeline
+# -----------------------------
+class Pipeline:
+    """source (an iterable, run on its own thread) -> stage -> stage -> ... -> last stage (sink)."""
+    def __init__(self, source, stages, report_every=60):
+        self.source = source
+        self.stages = stages
+        self.report_every = report_every
+        self.stop_event = threading.Event()
+        for a, b in zip(stages, stages[1:]):
+            a.outbox = b.inbox
+        registry.add_collector(self.collect)
+
+    def stop(self):
+        """Stops pulling from the source; items already in flight are finished."""
+        self.stop_event.set()
+
+    def _feed(self):
+        first = self.stages[0].inbox
+        try:
+            for item in self.source:
+                if self.stop_event.is_set():
+                    break
+                first.put(item)
+        except Exception as e:
+            print(f"\n⚠️ [source] {type(e).__name__}: {e}")
+        first.put(_STOP)
+
+    def run(self):
+        self.started = time.perf_counter()
+        for s in self.stages:
+            s.start()
+        feeder = threading.Thread(target=self._feed, name="source", daemon=True)
+        feeder.start()
+        last_report = time.monotonic()
+        for s in self.stages:
+            for t in s.threads:
+                while t.is_alive():
+                    t.join(timeout=1.0)
+                    if time.monotonic() - last_report >= self.report_every:
+                        print(self.report())
+                        last_report = time.monotonic()
+        print(self.report())
+
+    def collect(self):
+        """Stage stats and queue depths for the metrics registry (read at scrape/flush time)."""
+        out = []
+        for s in self.stages:
+            st, labels = s.stats, {"stage": s.name}
+            out += [("stage_items_in", labels, st.items_in), ("stage_items_out", labels, st.items_out),
+                    ("stage_errors", labels, st.errors), ("stage_busy_seconds", labels, round(st.busy, 3)),
+                    ("stage_waiting_seconds", labels, round(st.waiting, 3)),
+                    ("stage_queue_depth", labels, s.inbox.qsize()), ("stage_queue_capacity", labels, s.inbox.maxsize)]
+        return out
+
+    def report(self):
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        lines = [f"📈 Pipeline after {elapsed:.0f}s:"]
+        for s in self.stages:
+            st = s.stats
+            util = st.busy / (elapsed * s.workers) * 100
+            lines.append(f"   {s.name:<10} in={st.items_in:<6} out={st.items_out:<6} err={st.errors:<4} "
+                         f"{st.items_in / elapsed:6.2f}/s  busy={util:5.1f}%  queue={s.inbox.qsize()}/{s.inbox.maxsize}")
+        return "\n".join(lines)
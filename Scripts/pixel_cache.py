@@ -0,0 +1,206 @@
+import os
+import re
+import sys
+import json
+import math
+import time
+import hashlib
+import tempfile
+import threading
+import numpy as np
+from PIL import Image
+
+# --- CONFIGURATION ---
+PIXEL_CACHE_DIR = "pixel_cache"
+PIXEL_CACHE_BYTES = 8 * 1024 ** 3   # evict least recently used entries above this size
+EVICT_TO = 0.9                      # ... down to this fraction of the limit
+
+STORE_NAME = re.compile(r"^img_([0-9a-f]{16})\.jpg$")  # content-addressed names from image_store
+
+def content_key(path):
+    """Content hash of an image file; store names already are one, anything else is hashed."""
+    m = STORE_NAME.match(os.path.basename(path))
+    if m:
+        return m.group(1)
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+# -----------------------------
+# 1. Resize specs (what gets cached for a given processor)
+# -----------------------------
+# A spec is (key, make): key identifies the processor config, make(PIL RGB image) returns the
+# resized uint8 HWC array. Only decode + resize is cached; rescale/normalize is cheap and done on read.
+
+def _resample(cfg):
+    r = cfg.get("resample", Image.BICUBIC)
+    return Image.Resampling(int(r))
+
+def _spec_key(name, cfg, fields):
+    picked = {k: cfg.get(k) for k in fields}
+    return name + "-" + hashlib.sha1(json.dumps(picked, sort_keys=True, default=str).encode()).hexdigest()[:12]
+
+def fixed_size_spec(image_processor):
+    """BLIP-style processors: every image resized to size['height'] x size['width']."""
+    cfg = image_processor.to_dict()
+    h, w = cfg["size"]["height"], cfg["size"]["width"]
+    resample = _resample(cfg)
+
+    def make(img):
+        return np.asarray(img.resize((w, h), resample=resample), dtype=np.uint8)
+    return _spec_key("fixed", cfg, ["size", "resample"]), make
+
+def smart_resize(height, width, factor, min_pixels, max_pixels):
+    """Qwen2-VL dynamic resolution: sides rounded to multiples of factor, pixel count within bounds."""
+    h_bar = max(factor, round(height / factor) * factor)
+    w_bar = max(factor, round(width / factor) * factor)
+    if h_bar * w_bar > max_pixels:
+        beta = math.sqrt((height * width) / max_pixels)
+        h_bar = math.floor(height / beta / factor) * factor
+        w_bar = math.floor(width / beta / factor) * factor
+    elif h_bar * w_bar < min_pixels:
+        beta = math.sqrt(min_pixels / (height * width))
+        h_bar = math.ceil(height * beta / factor) * factor
+        w_bar = math.ceil(width * beta / factor) * factor
+    return h_bar, w_bar
+
+def dynamic_size_spec(image_processor):
+    """Qwen2.5-VL processors: images are pre-resized to the size the processor would pick, so its own resize is a no-op."""
+    cfg = image_processor.to_dict()
+    size = cfg.get("size") or {}
+    min_pixels = cfg.get("min_pixels") or size.get("shortest_edge")
+    max_pixels = cfg.get("max_pixels") or size.get("longest_edge")
+    factor = cfg.get("patch_size", 14) * cfg.get("merge_size", 2)
+    resample = _resample(cfg)
+
+    def make(img):
+        h, w = smart_resize(img.height, img.width, factor, min_pixels, max_pixels)
+        return np.asarray(img.resize((w, h), resample=resample), dtype=np.uint8)
+    return _spec_key("dynamic", cfg, ["size", "min_pixels", "max_pixels", "patch_size", "merge_size", "resample"]), make
+
+def normalize(image_processor, arr):
+    """uint8 HWC -> float32 CHW with the processor's rescale and normalization (BLIP pixel_values)."""
+    cfg = image_processor.to_dict()
+    x = arr.astype(np.float32) * np.float32(cfg.get("rescale_factor", 1 / 255))
+    x = (x - np.asarray(cfg["image_mean"], np.float32)) / np.asarray(cfg["image_std"], np.float32)
+    return np.ascontiguousarray(x.transpose(2, 0, 1))
+
+# -----------------------------
+# 2. The cache
+# -----------------------------
+class PixelCache:
+    """
+    pixel_cache/<spec key>/<ab>/<content hash>.npy holding the decoded, resized uint8 image.
+    Entries are written atomically and read back memory-mapped; a hit bumps the file's mtime,
+    and once the directory grows past max_bytes the least recently used files are removed.
+    """
+    def __init__(self, root=PIXEL_CACHE_DIR, max_bytes=PIXEL_CACHE_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+        self.lock = threading.Lock()
+        self.bytes = sum(os.path.getsize(p) for p in self._files())
+        self.hits = 0
+        self.misses = 0
+
+    def _files(self):
+        for dirpath, _, files in os.walk(self.root):
+            for name in files:
+                if name.endswith(".npy"):
+                    yield os.path.join(dirpath, name)
+
+    def _path(self, spec_key, ckey):
+        return os.path.join(self.root, spec_key, ckey[:2], ckey + ".npy")
+
+    def get(self, path, spec):
+        """Resized uint8 image for the file at path under spec; decodes and stores it on a miss."""
+        spec_key, make = spec
+        dest = self._path(spec_key, content_key(path))
+        try:
+            arr = np.load(dest, mmap_mode='r')
+            os.utime(dest)
+            with self.lock:
+                self.hits += 1
+            return arr
+        except (FileNotFoundError, ValueError, OSError):
+            pass  # missing or torn entry: rebuild it
+
+        with Image.open(path) as img:
+            arr = make(img.convert('RGB'))
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(dest), suffix=".part")
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, arr)
+        os.replace(tmp, dest)
+        with self.lock:
+            self.misses += 1
+            self.bytes += os.path.getsize(dest)
+            over = self.bytes > self.max_bytes
+        if over:
+            self.evict()
+        return arr
+
+    def evict(self):
+        with self.lock:
+            entries = []
+            for p in self._files():
+                try:
+                    st = os.stat(p)
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, p))
+            total = sum(e[1] for e in entries)
+            target = self.max_bytes * EVICT_TO
+            removed = 0
+            for _, size, p in sorted(entries):
+                if total <= target:
+                    break
+                try:
+                    os.remove(p)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                removed += 1
+            self.bytes = total
+        return removed
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "mb": round(self.bytes / 1024 ** 2, 1)}
+
+# -----------------------------
+# 3. Benchmark: cold decode + resize vs cached read
+# -----------------------------
+def main():
+    """python pixel_cache.py [image_dir] [n]: BLIP preprocessing time per image, without and with the cache."""
+    from transformers import BlipImageProcessor
+    from image_store import ImageStore, IMAGE_DIR
+    image_dir = sys.argv[1] if len(sys.argv) > 1 else IMAGE_DIR
+    n = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    store = ImageStore(image_dir)
+    paths = [store.path(name) for name in sorted(store.names())[:n]]
+    if not paths:
+        print(f"❌ No images in {image_dir}")
+        return
+    processor = BlipImageProcessor()
+    spec = fixed_size_spec(processor)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = PixelCache(tmp)
+        t0 = time.perf_counter()
+        for p in paths:
+            with Image.open(p) as img:
+                processor(images=img.convert('RGB'), return_tensors="np")
+        t1 = time.perf_counter()
+        for p in paths:
+            normalize(processor, cache.get(p, spec))  # first run: fills the cache
+        t2 = time.perf_counter()
+        for p in paths:
+            normalize(processor, cache.get(p, spec))
+        t3 = time.perf_counter()
+        print(f"🖼️ {len(paths)} images, BLIP {processor.size['height']}px")
+        print(f"   processor only   {(t1 - t0) / len(paths) * 1000:.2f} ms/image")
+        print(f"   cache cold       {(t2 - t1) / len(paths) * 1000:.2f} ms/image")
+        print(f"   cache warm       {(t3 - t2) / len(paths) * 1000:.2f} ms/image  ({cache.stats()})")
+
+if __name__ == "__main__":
+
+    main()
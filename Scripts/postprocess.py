@@ -0,0 +1,91 @@
+import os
+import time
+import unicodedata
+import numpy as np
+import pandas as pd
+
+# --- CONFIGURATION ---
+INPUT_CSV = "gmgbd.csv"
+OUTPUT_CSV = "gmgbd_processed.csv"  # kept separate: gmgbd.csv stays the append-only collection output
+
+# NDVI category = number of thresholds strictly below the value (so 0.6 is still "Moderate")
+NDVI_BINS = [0.1, 0.3, 0.6]
+NDVI_LABELS = ["Non-Veg", "Sparse/Bare Soil", "Moderate Vegetation", "Dense Canopy"]
+NO_DATA = "No Data"
+
+RURAL = "Rural"
+UNKNOWN = "Unknown"
+
+ROUNDING = {"NDVI_value": 4, "avg_temp_C": 1, "elevation_m": 1, "dist_to_water_m": 2}
+NORMALIZE = {"avg_temp_C": "avg_temp_norm", "elevation_m": "elevation_norm", "dist_to_water_m": "dist_to_water_norm"}
+
+# -----------------------------
+# 1. NDVI
+# -----------------------------
+def ndvi_categories(values):
+    """Vectorized NDVI category for an array/Series of NDVI values (NaN -> NO_DATA)."""
+    values = np.asarray(values, dtype=float)
+    labels = np.array(NDVI_LABELS + [NO_DATA], dtype=object)
+    idx = np.searchsorted(NDVI_BINS, values, side='left')
+    idx[np.isnan(values)] = len(NDVI_LABELS)
+    return labels[idx]
+
+def ndvi_category(value):
+    """Scalar version, used while collecting."""
+    if value is None or value != value:
+        return NO_DATA
+    return NDVI_LABELS[int(np.searchsorted(NDVI_BINS, value, side='left'))]
+
+# -----------------------------
+# 2. Locations
+# -----------------------------
+def _clean_name(name):
+    name = unicodedata.normalize("NFC", str(name))
+    return " ".join(name.split())
+
+def normalize_names(series, missing):
+    """Canonical spelling for a text column; the work is done once per distinct value."""
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    cleaned = np.array([_clean_name(u) or missing for u in uniques] + [missing], dtype=object)
+    cleaned[np.char.lower(cleaned.astype(str)) == RURAL.lower()] = RURAL
+    return pd.Series(cleaned[codes], index=series.index)
+
+# -----------------------------
+# 3. Whole-table pass
+# -----------------------------
+def postprocess(df):
+    out = df.copy()
+    for col, digits in ROUNDING.items():
+        out[col] = pd.to_numeric(out[col], errors='coerce').round(digits)
+
+    out["NDVI_Category"] = ndvi_categories(out["NDVI_value"].to_numpy())
+
+    out["country"] = normalize_names(out["country"], UNKNOWN)
+    out["city"] = normalize_names(out["city"], RURAL)
+    # Like get_location_pro: no state -> fall back to the city
+    out["state"] = normalize_names(out["state"].where(out["state"].notna(), out["city"]), RURAL)
+
+    for col, norm_col in NORMALIZE.items():
+        v = out[col].to_numpy(dtype=float)
+        lo, hi = np.nanmin(v), np.nanmax(v)
+        out[norm_col] = np.round((v - lo) / (hi - lo), 6) if hi > lo else 0.0
+    return out
+
+def main():
+    t0 = time.perf_counter()
+    df = pd.read_csv(INPUT_CSV)
+    t1 = time.perf_counter()
+    out = postprocess(df)
+    t2 = time.perf_counter()
+
+    tmp = OUTPUT_CSV + ".tmp"
+    out.to_csv(tmp, index=False)
+    os.replace(tmp, OUTPUT_CSV)
+    t3 = time.perf_counter()
+
+    print(f"✅ {len(out)} rows -> {OUTPUT_CSV}  (read {t1 - t0:.2f}s | compute {t2 - t1:.2f}s | write {t3 - t2:.2f}s)")
+    print(out["NDVI_Category"].value_counts().to_string())
+
+if __name__ == "__main__":
+
+    main()
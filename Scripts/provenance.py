@@ -0,0 +1,118 @@
+import os
+import sys
+import inspect
+import hashlib
+import pandas as pd
+from writer import RowWriter, rewrite_csv
+
+# --- CONFIGURATION ---
+SIDECAR_SUFFIX = ".provenance.csv"   # gmgbd.csv -> gmgbd.provenance.csv
+VERSION_CHARS = 10
+
+def fingerprint(*parts, **params):
+    """
+    Version of an enrichment: hash of the source of the functions/classes in parts (comments and
+    line endings included, so any edit counts) plus the repr of the parameters that shape the value.
+    """
+    h = hashlib.sha1()
+    for p in parts:
+        try:
+            src = inspect.getsource(p)
+        except (TypeError, OSError):
+            src = repr(p)
+        h.update(src.replace("\r\n", "\n").encode())
+    h.update(repr(sorted(params.items())).encode())
+    return h.hexdigest()[:VERSION_CHARS]
+
+def sidecar_path(csv_path):
+    return os.path.splitext(csv_path)[0] + SIDECAR_SUFFIX
+
+def is_sidecar(path):
+    return path.endswith(SIDECAR_SUFFIX)
+
+def read_sidecar(path, kinds=None):
+    """filename -> versions (last line per filename wins), as a DataFrame indexed by filename."""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return pd.DataFrame(columns=["filename"] + list(kinds or [])).set_index("filename")
+    df = pd.read_csv(path, dtype=str, keep_default_na=False)
+    if kinds is None:
+        kinds = [c for c in df.columns if c != "filename"]
+    cols = ["filename"] + list(kinds)
+    for k in kinds:
+        if k not in df.columns:
+            df[k] = ""  # kind added after this sidecar was written
+    return df[cols].drop_duplicates(subset=["filename"], keep="last").set_index("filename")
+
+class Provenance:
+    """
+    Per-row, per-column-group versions of an output CSV, kept in a sidecar CSV next to it:
+    filename plus one column per enrichment kind holding the fingerprint of the code and
+    parameters that produced that kind's columns. Appended through a RowWriter right after
+    each block of the output is flushed; a later line for the same filename supersedes earlier ones.
+    """
+    def __init__(self, csv_path, versions):
+        self.path = sidecar_path(csv_path)
+        self.versions = dict(versions)
+        self.kinds = list(versions)
+        self.writer = RowWriter(self.path, ["filename"] + self.kinds, flush_rows=10 ** 9, flush_secs=10 ** 9)
+        self.table = read_sidecar(self.path, self.kinds)  # after the writer dropped any torn tail
+
+    def record(self, filenames):
+        """The given rows now hold values computed by the current versions of every kind."""
+        rows = [{"filename": str(f), **self.versions} for f in filenames]
+        self.writer.write_many(rows)
+        self.writer.flush()
+        new = pd.DataFrame(rows, columns=["filename"] + self.kinds).set_index("filename")
+        self.table = pd.concat([self.table[~self.table.index.isin(new.index)], new])
+
+    def on_flush(self, rows):
+        """RowWriter on_flush hook for the output CSV."""
+        self.record([r["filename"] for r in rows])
+
+    def adopt(self, filenames):
+        """First run with provenance: rows written before it existed are taken as current."""
+        missing = [f for f in filenames if f not in self.table.index]
+        if missing:
+            self.record(missing)
+        return len(missing)
+
+    def stale(self, filenames):
+        """{kind: [filenames whose version differs from the current one]} (unknown rows count as stale)."""
+        known = self.table.reindex([str(f) for f in filenames]).fillna("")
+        return {k: known.index[known[k] != v].tolist() for k, v in self.versions.items()}
+
+    def compact(self):
+        """Rewrites the sidecar with one line per filename."""
+        self.writer.close()
+        rewrite_csv(self.table.reset_index(), self.path)
+        self.writer = RowWriter(self.path, ["filename"] + self.kinds, flush_rows=10 ** 9, flush_secs=10 ** 9)
+
+    def close(self):
+        self.writer.close()
+
+def merge_sidecars(csv_paths, output_csv):
+    """Sidecars of several output CSVs (e.g. ledger shards) -> the sidecar of output_csv; earlier sources win."""
+    parts = [read_sidecar(sidecar_path(p)) for p in csv_paths]
+    parts = [p for p in parts if len(p)]
+    if not parts:
+        return 0
+    df = pd.concat(parts)
+    df = df.fillna("")
+    df = df[~df.index.duplicated(keep="first")]
+    out = sidecar_path(output_csv)
+    rewrite_csv(df.reset_index(), out)
+    return len(df)
+
+def main():
+    """python provenance.py [output_csv]: rows per kind whose stored version is not the current one."""
+    import environment  # the current versions live next to the enrichment code
+    output_csv = sys.argv[1] if len(sys.argv) > 1 else environment.OUTPUT_CSV
+    keys = pd.read_csv(output_csv, usecols=["filename"], dtype=str)["filename"].tolist()
+    prov = Provenance(output_csv, environment.VERSIONS)
+    for kind, rows in prov.stale(keys).items():
+        print(f"   {kind:<12} version {environment.VERSIONS[kind]}  stale rows: {len(rows)}/{len(keys)}")
+    prov.close()
+
+if __name__ == "__main__":
+
+    main()
@@ -0,0 +1,153 @@
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+from gee_batch import composite_window, target_date, FALLBACK_YEARS
+from postprocess import ndvi_category
+
+try:
+    import rasterio
+    from rasterio.windows import Window
+except ImportError:
+    rasterio = Window = None
+
+# --- CONFIGURATION ---
+# All rasters are single-band, EPSG:4326, ideally tiled GeoTIFF/COG so a block = one tile
+DEM_RASTER = "rasters/dem.tif"                    # elevation in metres (e.g. SRTM/Copernicus GLO-90 mosaic)
+WATER_DIST_RASTER = "rasters/dist_to_stream.tif"  # metres to nearest HydroSHEDS stream (ACC > 100), precomputed
+NDVI_DIR = "rasters/ndvi"                         # MOD13A1 NDVI composites named <YYYY-MM-DD>.tif (composite start)
+NDVI_SCALE_FACTOR = 10000.0
+TILE_CACHE_BLOCKS = 256                           # decoded blocks kept in memory per raster (LRU)
+
+# -----------------------------
+# 1. Windowed, block-cached sampling
+# -----------------------------
+class RasterSampler:
+    """
+    Samples one raster at many points. Points are bucketed by internal block, each block is
+    read once with a windowed read and kept in an LRU cache, and values are picked out with
+    vectorized indexing. Off-raster and nodata points come back as NaN.
+    """
+    def __init__(self, path, cache_blocks=TILE_CACHE_BLOCKS):
+        if rasterio is None:
+            raise ImportError("rasterio is required for local rasters (pip install rasterio)")
+        self.path = path
+        self.ds = rasterio.open(path)
+        self.block_h, self.block_w = self.ds.block_shapes[0]
+        self.inverse = ~self.ds.transform
+        self.nodata = self.ds.nodata
+        self.cache_blocks = cache_blocks
+        self.blocks = OrderedDict()
+        self.reads = 0
+        self.lock = threading.Lock()  # GDAL datasets are not thread-safe
+
+    def _block(self, bi, bj):
+        key = (bi, bj)
+        if key in self.blocks:
+            self.blocks.move_to_end(key)
+            return self.blocks[key]
+        col0, row0 = bj * self.block_w, bi * self.block_h
+        window = Window(col0, row0, min(self.block_w, self.ds.width - col0), min(self.block_h, self.ds.height - row0))
+        data = self.ds.read(1, window=window).astype(np.float64)
+        if self.nodata is not None:
+            data[data == self.nodata] = np.nan
+        self.reads += 1
+        self.blocks[key] = data
+        if len(self.blocks) > self.cache_blocks:
+            self.blocks.popitem(last=False)
+        return data
+
+    def sample(self, lats, lons):
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        cols, rows = self.inverse * (lons, lats)
+        cols, rows = np.floor(cols).astype(np.int64), np.floor(rows).astype(np.int64)
+        out = np.full(len(lats), np.nan)
+        inside = (rows >= 0) & (rows < self.ds.height) & (cols >= 0) & (cols < self.ds.width)
+        idx = np.nonzero(inside)[0]
+        if not len(idx):
+            return out
+        bi, bj = rows[idx] // self.block_h, cols[idx] // self.block_w
+        blocks, inverse = np.unique(np.column_stack([bi, bj]), axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        with self.lock:
+            for k, (b_i, b_j) in enumerate(blocks):
+                sel = idx[inverse == k]
+                data = self._block(int(b_i), int(b_j))
+                out[sel] = data[rows[sel] - b_i * self.block_h, cols[sel] - b_j * self.block_w]
+        return out
+
+    def close(self):
+        self.ds.close()
+
+# -----------------------------
+# 2. Local backend (same interface as GeeBatch)
+# -----------------------------
+def _round_or_none(v, digits):
+    return None if np.isnan(v) else round(float(v), digits)
+
+class LocalRasterBackend:
+    """Elevation, water distance and NDVI from local rasters; results keyed by filename."""
+    def __init__(self, dem=DEM_RASTER, water=WATER_DIST_RASTER, ndvi_dir=NDVI_DIR):
+        if rasterio is None:
+            raise ImportError("rasterio is required for RASTER_BACKEND = 'local' (pip install rasterio)")
+        self.dem = RasterSampler(dem) if dem and os.path.exists(dem) else None
+        self.water = RasterSampler(water) if water and os.path.exists(water) else None
+        self.ndvi_dir = ndvi_dir
+        self.ndvi_files = {}
+        if ndvi_dir and os.path.isdir(ndvi_dir):
+            for name in os.listdir(ndvi_dir):
+                if name.endswith(".tif"):
+                    self.ndvi_files[name[:-4]] = os.path.join(ndvi_dir, name)
+        self.ndvi_samplers = {}
+
+    @staticmethod
+    def _coords(rows):
+        return [r['latitude'] for r in rows], [r['longitude'] for r in rows]
+
+    def _require(self, sampler, what):
+        if sampler is None:
+            raise FileNotFoundError(f"no local raster for {what}")
+        return sampler
+
+    def elevation(self, rows):
+        vals = self._require(self.dem, "elevation").sample(*self._coords(rows))
+        return {str(r['filename']): _round_or_none(v, 1) for r, v in zip(rows, vals)}
+
+    def water_dist(self, rows):
+        vals = self._require(self.water, "water distance").sample(*self._coords(rows))
+        return {str(r['filename']): _round_or_none(v, 2) for r, v in zip(rows, vals)}
+
+    def _composite(self, start):
+        if start not in self.ndvi_samplers:
+            self.ndvi_samplers[start] = RasterSampler(self.ndvi_files[start])
+        return self.ndvi_samplers[start]
+
+    def ndvi(self, rows):
+        """Median of the composites in the +/- 16 day window, with the same 5-year fallback as GEE."""
+        if not self.ndvi_files:
+            raise FileNotFoundError(f"no NDVI composites in {self.ndvi_dir}")
+        results, pending = {}, list(rows)
+        for years_back in range(FALLBACK_YEARS):
+            groups = {}
+            for r in pending:
+                day = target_date(r['sighting_date'], years_back)
+                if day is not None:
+                    groups.setdefault(composite_window(day), []).append(r)
+            for (start, end), group in groups.items():
+                starts = [s for s in self.ndvi_files if start <= s < end]
+                if not starts:
+                    continue
+                lats, lons = self._coords(group)
+                stack = np.vstack([self._composite(s).sample(lats, lons) for s in starts])
+                valid = ~np.all(np.isnan(stack), axis=0)
+                med = np.full(len(group), np.nan)
+                med[valid] = np.nanmedian(stack[:, valid], axis=0)
+                for r, v in zip(group, med):
+                    if not np.isnan(v):
+                        ndvi = round(float(v) / NDVI_SCALE_FACTOR, 4)
+                        results[str(r['filename'])] = (ndvi, ndvi_category(ndvi))
+            pending = [r for r in pending if str(r['filename']) not in results]
+        for r in pending:
+            results[str(r['filename'])] = (None, "No Data")
+        return results
@@ -0,0 +1,333 @@
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import numpy as np
+import pandas as pd
+from postprocess import NDVI_LABELS, NO_DATA, ndvi_categories
+
+# --- CONFIGURATION ---
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCE_CSV = os.path.join(ROOT, "gmgbd.csv")
+OUT_DIR = os.path.join(ROOT, "Website", "public", "data")
+FORMAT_VERSION = 2           # 2: open-ended first/last histogram bins
+
+HEX_ZOOMS = range(0, 7)      # zoom z: hexagons of HEX_SIZE_Z0 / 2**z degrees (center to corner)
+HEX_SIZE_Z0 = 16.0
+TILE_ZOOM_OFFSET = 2         # hex zoom z is split into 2**(z - offset) x 2**(z - offset) lon/lat tiles
+
+HIST_BINS = {                # fixed bins, so histograms of two builds can be compared
+    "avg_temp_C": np.arange(-30, 46, 2.5),
+    "elevation_m": np.arange(-500, 6001, 250),
+    "NDVI_value": np.linspace(-1, 1, 41),
+    "dist_to_water_m": np.array([0, 100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000, np.inf]),
+}
+TOP_SPECIES = 10
+SPECIES_CHUNK = 500          # species per species/<n>.json detail file (monthly and NDVI class counts)
+
+COLUMNS = ["filename", "scientific_name", "common_name", "latitude", "longitude", "sighting_date",
+           "country", "avg_temp_C", "elevation_m", "NDVI_value", "dist_to_water_m"]
+
+# -----------------------------
+# 1. Load
+# -----------------------------
+def source_signature(path):
+    """Size + mtime + hash of the head and tail: cheap, and changes with any append or rewrite."""
+    st = os.stat(path)
+    h = hashlib.sha1(f"{st.st_size}:{st.st_mtime_ns}:{FORMAT_VERSION}".encode())
+    with open(path, 'rb') as f:
+        h.update(f.read(1 << 16))
+        f.seek(max(0, st.st_size - (1 << 16)))
+        h.update(f.read())
+    return h.hexdigest()[:16]
+
+def load(path):
+    """Only the columns the site needs, with compact dtypes (1M rows load in a few seconds)."""
+    header = pd.read_csv(path, nrows=0).columns
+    df = pd.read_csv(path, usecols=[c for c in COLUMNS if c in header],
+                     dtype={"scientific_name": "category", "common_name": "category", "country": "category"})
+    df = df.dropna(subset=["latitude", "longitude"])
+    for col in ["avg_temp_C", "elevation_m", "NDVI_value", "dist_to_water_m"]:
+        df[col] = pd.to_numeric(df.get(col), errors="coerce").astype("float32")
+    df["month"] = pd.to_datetime(df["sighting_date"], errors="coerce").dt.month.fillna(0).astype("uint8")
+    df["country"] = df["country"].cat.add_categories([NO_DATA]).fillna(NO_DATA)
+    return df.reset_index(drop=True)
+
+# -----------------------------
+# 2. Quantized points
+# -----------------------------
+def quantize(values, lo, hi, dtype):
+    """Linear map of [lo, hi] onto the integer range of dtype; NaN -> the dtype's max (no data)."""
+    top = np.iinfo(dtype).max - 1
+    v = np.asarray(values, dtype="float64")
+    q = np.rint((np.clip(v, lo, hi) - lo) / (hi - lo) * top)
+    q[np.isnan(v)] = top + 1
+    return q.astype(dtype)
+
+def point_columns(df, species_codes):
+    """name -> (array, decode info). Decode: value = lo + q / (2**bits - 2) * (hi - lo); max = no data."""
+    cols = {
+        "lon": (quantize(df["longitude"], -180, 180, np.uint16), {"lo": -180, "hi": 180}),
+        "lat": (quantize(df["latitude"], -90, 90, np.uint16), {"lo": -90, "hi": 90}),
+        "temp": (quantize(df["avg_temp_C"], -60, 60, np.uint16), {"lo": -60, "hi": 60}),
+        "elevation": (quantize(df["elevation_m"], -500, 9000, np.uint16), {"lo": -500, "hi": 9000}),
+        "water": (quantize(np.log1p(df["dist_to_water_m"].clip(lower=0)), 0, np.log1p(1e6), np.uint8),
+                  {"lo": 0, "hi": float(np.log1p(1e6)), "transform": "expm1"}),
+        "ndvi": (quantize(df["NDVI_value"], -1, 1, np.uint8), {"lo": -1, "hi": 1}),
+        "month": (df["month"].to_numpy(np.uint8), {}),
+    }
+    sp_dtype = np.uint16 if species_codes.max(initial=0) < np.iinfo(np.uint16).max else np.uint32
+    cols["species"] = (species_codes.astype(sp_dtype), {"lookup": "species.json"})
+    return cols
+
+def write_points(df, species_codes, out_dir):
+    """
+    points.bin: one little-endian column after another, each 4-byte aligned so the browser can
+    wrap it in a typed array without copying. The manifest describes the columns.
+    """
+    cols = point_columns(df, species_codes)
+    spec, offset = [], 0
+    with open(os.path.join(out_dir, "points.bin"), 'wb') as f:
+        for name, (arr, decode) in cols.items():
+            arr = np.ascontiguousarray(arr, dtype=arr.dtype.newbyteorder("<"))
+            spec.append({"name": name, "type": arr.dtype.name, "offset": offset, **decode})
+            f.write(arr.tobytes())
+            offset += arr.nbytes
+            pad = -offset % 4
+            f.write(b"\0" * pad)
+            offset += pad
+    return {"count": len(df), "bytes": offset, "columns": spec}
+
+# -----------------------------
+# 3. Hexbin aggregates
+# -----------------------------
+def hex_cells(lon, lat, size):
+    """Pointy-top axial (q, r) of the hexagon containing each point, on a plain lon/lat plane."""
+    x, y = lon / size, lat / size
+    q = np.sqrt(3) / 3 * x - y / 3
+    r = 2 / 3 * y
+    s = -q - r
+    rq, rr, rs = np.rint(q), np.rint(r), np.rint(s)
+    dq, dr, ds = np.abs(rq - q), np.abs(rr - r), np.abs(rs - s)
+    fix_q = (dq > dr) & (dq > ds)
+    fix_r = ~fix_q & (dr > ds)
+    rq = np.where(fix_q, -rr - rs, rq)
+    rr = np.where(fix_r, -rq - rs, rr)
+    return rq.astype(np.int64), rr.astype(np.int64)
+
+def hex_centers(q, r, size):
+    return size * np.sqrt(3) * (q + r / 2), size * 1.5 * r
+
+def group_mean(inverse, n, values):
+    """Per-group mean of values, ignoring NaN (NaN for groups without any value)."""
+    v = np.asarray(values, dtype="float64")
+    ok = ~np.isnan(v)
+    total = np.bincount(inverse[ok], weights=v[ok], minlength=n)
+    count = np.bincount(inverse[ok], minlength=n)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(count > 0, total / np.maximum(count, 1), np.nan)
+
+def dominant(inverse, n, codes, n_codes):
+    """Per group: number of distinct codes and the most frequent one."""
+    pairs, counts = np.unique(inverse * n_codes + codes, return_counts=True)
+    group, code = pairs // n_codes, pairs % n_codes
+    distinct = np.bincount(group, minlength=n)
+    order = np.lexsort((-counts, group))
+    _, first = np.unique(group[order], return_index=True)
+    top = np.zeros(n, np.int64)
+    top[group[order][first]] = code[order][first]
+    return distinct, top
+
+def _rounded(values, digits):
+    return [None if v != v else round(float(v), digits) for v in values]
+
+def hex_level(df, species_codes, n_species, z):
+    """All non-empty hexagons of zoom z, column-wise, with the lon/lat tile each belongs to."""
+    size = HEX_SIZE_Z0 / 2 ** z
+    lon, lat = df["longitude"].to_numpy("float64"), df["latitude"].to_numpy("float64")
+    q, r = hex_cells(lon, lat, size)
+    keys, inverse, count = np.unique((q << 32) + (r + (1 << 31)), return_inverse=True, return_counts=True)
+    n = len(keys)
+    cq, cr = keys >> 32, (keys & 0xFFFFFFFF) - (1 << 31)
+    clon, clat = hex_centers(cq, cr, size)
+    n_tiles = 2 ** max(0, z - TILE_ZOOM_OFFSET)
+    tx = np.clip(((clon + 180) / 360 * n_tiles).astype(np.int64), 0, n_tiles - 1)
+    ty = np.clip(((90 - clat) / 180 * n_tiles).astype(np.int64), 0, n_tiles - 1)
+    n_sp, top = dominant(inverse, n, species_codes, n_species)
+    cells = {
+        "q": cq, "r": cr, "count": count, "species": n_sp, "top_species": top,
+        "temp": group_mean(inverse, n, df["avg_temp_C"]),
+        "elevation": group_mean(inverse, n, df["elevation_m"]),
+        "ndvi": group_mean(inverse, n, df["NDVI_value"]),
+        "water": group_mean(inverse, n, df["dist_to_water_m"]),
+    }
+    return size, n_tiles, tx * n_tiles + ty, cells
+
+def write_hexbins(df, species_codes, n_species, out_dir):
+    """hex/<z>/<x>_<y>.json per non-empty tile; returns the index (tiles and cell counts per zoom)."""
+    digits = {"temp": 1, "elevation": 0, "ndvi": 3, "water": 0}
+    index = []
+    for z in HEX_ZOOMS:
+        size, n_tiles, tile, cells = hex_level(df, species_codes, n_species, z)
+        os.makedirs(os.path.join(out_dir, "hex", str(z)), exist_ok=True)
+        order = np.argsort(tile, kind="stable")
+        tiles, starts = np.unique(tile[order], return_index=True)
+        bounds = list(starts[1:]) + [len(order)]
+        written = []
+        for t, a, b in zip(tiles, starts, bounds):
+            sel = order[a:b]
+            body = {k: (_rounded(v[sel], digits[k]) if k in digits else v[sel].tolist()) for k, v in cells.items()}
+            x, y = int(t // n_tiles), int(t % n_tiles)
+            write_json(os.path.join(out_dir, "hex", str(z), f"{x}_{y}.json"), body)
+            written.append([x, y, int(b - a)])
+        index.append({"z": z, "size": size, "tiles_per_axis": n_tiles, "cells": len(order), "tiles": written})
+    return index
+
+# -----------------------------
+# 4. Summaries
+# -----------------------------
+def histograms(df):
+    """Counts per HIST_BINS bin, plus open-ended first/last bins (edge None) so no value is dropped."""
+    out = {}
+    for col, edges in HIST_BINS.items():
+        edges = np.concatenate([[-np.inf] if np.isfinite(edges[0]) else [], edges, [np.inf] if np.isfinite(edges[-1]) else []])
+        v = df[col].to_numpy("float64")
+        counts, _ = np.histogram(v[~np.isnan(v)], bins=edges)
+        out[col] = {"edges": [e if np.isfinite(e) else None for e in edges.tolist()],
+                    "counts": counts.tolist(), "missing": int(np.isnan(v).sum())}
+    return out
+
+def monthly(df, key):
+    """group -> 12 monthly counts (rows without a date are left out)."""
+    m = df[df["month"] > 0]
+    table = m.groupby([key, "month"], observed=True).size().unstack(fill_value=0)
+    return table.reindex(columns=range(1, 13), fill_value=0)
+
+def summarize(df, key, extra):
+    """Column-wise summary per value of `key`, sorted by count (descending)."""
+    g = df.groupby(key, observed=True)
+    table = g.agg(count=("latitude", "size"), temp=("avg_temp_C", "mean"), elevation=("elevation_m", "mean"),
+                  ndvi=("NDVI_value", "mean"), water=("dist_to_water_m", "median"), **extra)
+    table = table.sort_values("count", ascending=False, kind="stable")
+    months = monthly(df, key).reindex(table.index, fill_value=0)
+    ndvi = df.groupby([key, "ndvi_category"], observed=True).size().unstack(fill_value=0)
+    ndvi = ndvi.reindex(index=table.index, columns=NDVI_LABELS + [NO_DATA], fill_value=0)
+    body = {key: table.index.astype(str).tolist(), "count": table["count"].tolist(),
+            "temp": _rounded(table["temp"], 1), "elevation": _rounded(table["elevation"], 0),
+            "ndvi": _rounded(table["ndvi"], 3), "water_median": _rounded(table["water"], 0),
+            "months": months.to_numpy().tolist(), "ndvi_categories": ndvi.to_numpy().tolist()}
+    for name in extra:
+        if name not in body:
+            body[name] = table[name].tolist()
+    return body
+
+def species_table(df):
+    """Species in code order (the order points.bin refers to), plus their summaries."""
+    body = summarize(df, "scientific_name", {"countries": ("country", "nunique"),
+                                              "common_name": ("common_name", "first")})
+    body["common_name"] = [None if c != c else str(c) for c in body["common_name"]]
+    return body
+
+def write_species(species, out_dir):
+    """
+    species.json keeps one light line per species (names, counts, means); the per-species
+    monthly and NDVI class counts go to species/<code // SPECIES_CHUNK>.json.
+    """
+    detail = {k: species.pop(k) for k in ["months", "ndvi_categories"]}
+    os.makedirs(os.path.join(out_dir, "species"), exist_ok=True)
+    for n, start in enumerate(range(0, len(species["scientific_name"]), SPECIES_CHUNK)):
+        write_json(os.path.join(out_dir, "species", f"{n}.json"),
+                   {"first": start, **{k: v[start:start + SPECIES_CHUNK] for k, v in detail.items()}})
+    species["chunk"] = SPECIES_CHUNK
+    write_json(os.path.join(out_dir, "species.json"), species)
+
+def country_table(df, species):
+    body = summarize(df, "country", {"species": ("scientific_name", "nunique")})
+    top = (df.groupby(["country", "scientific_name"], observed=True).size()
+             .sort_values(ascending=False, kind="stable").groupby(level=0, observed=True).head(5))
+    index = {name: i for i, name in enumerate(species["scientific_name"])}
+    by_country = {}
+    for (country, name), n in top.items():
+        by_country.setdefault(country, []).append([index[str(name)], int(n)])
+    body["top_species"] = [by_country.get(c, []) for c in body["country"]]
+    return body
+
+def overview(df, species):
+    lon, lat = df["longitude"], df["latitude"]
+    return {
+        "rows": len(df), "species": len(species["scientific_name"]), "countries": int(df["country"].nunique()),
+        "bbox": [round(float(lon.min()), 4), round(float(lat.min()), 4), round(float(lon.max()), 4), round(float(lat.max()), 4)],
+        "dates": [str(pd.to_datetime(df["sighting_date"], errors="coerce").min().date()),
+                  str(pd.to_datetime(df["sighting_date"], errors="coerce").max().date())],
+        "months": np.bincount(df["month"], minlength=13)[1:].tolist(),
+        "ndvi_categories": dict(zip(NDVI_LABELS + [NO_DATA],
+                                    df["ndvi_category"].value_counts().reindex(NDVI_LABELS + [NO_DATA], fill_value=0).tolist())),
+        "histograms": histograms(df),
+        "top_species": [[i, species["count"][i]] for i in range(min(TOP_SPECIES, len(species["count"])))],
+    }
+
+# -----------------------------
+# 5. Build
+# -----------------------------
+def write_json(path, body):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(body, f, separators=(",", ":"), ensure_ascii=False, allow_nan=False)
+
+def build(source=SOURCE_CSV, out_dir=OUT_DIR, force=False):
+    """
+    gmgbd.csv -> out_dir (manifest.json, overview/species/countries JSON, points.bin, hex tiles).
+    Skipped when the manifest already matches the source. Built in a sibling temp directory and
+    swapped in at the end, so the site never sees half a build.
+    """
+    signature = source_signature(source)
+    manifest_path = os.path.join(out_dir, "manifest.json")
+    if not force and os.path.exists(manifest_path):
+        with open(manifest_path, encoding='utf-8') as f:
+            if json.load(f).get("source") == signature:
+                print(f"✅ {out_dir} is up to date with {os.path.basename(source)}")
+                return None
+
+    t0 = time.perf_counter()
+    df = load(source)
+    df["ndvi_category"] = pd.Categorical(ndvi_categories(df["NDVI_value"]), categories=NDVI_LABELS + [NO_DATA])
+    t_load = time.perf_counter() - t0
+
+    tmp = out_dir.rstrip("/\\") + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    # Species codes follow the species table (most observed first), so small codes are common ones
+    species = species_table(df)
+    rank = {name: i for i, name in enumerate(species["scientific_name"])}
+    species_codes = df["scientific_name"].astype(str).map(rank).fillna(0).to_numpy(np.int64)
+
+    points = write_points(df, species_codes, tmp)
+    hexbins = write_hexbins(df, species_codes, max(len(rank), 1), tmp)
+    write_json(os.path.join(tmp, "countries.json"), country_table(df, species))
+    write_json(os.path.join(tmp, "overview.json"), overview(df, species))
+    write_species(species, tmp)
+    manifest = {"version": FORMAT_VERSION, "source": signature, "built": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "points": points, "hex": {"size_z0": HEX_SIZE_Z0, "levels": hexbins}}
+    write_json(os.path.join(tmp, "manifest.json"), manifest)  # last: its presence marks a complete build
+
+    if os.path.exists(out_dir):
+        shutil.rmtree(out_dir)
+    os.replace(tmp, out_dir)
+
+    total = sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(out_dir) for f in files)
+    print(f"🗺️ Site data: {len(df)} rows -> {out_dir} ({total / 1024:.0f} KB) "
+          f"in {time.perf_counter() - t0:.1f}s (load {t_load:.1f}s)")
+    return manifest
+
+def main():
+    """python site_data.py [source_csv] [out_dir] [--force]"""
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    source = args[0] if len(args) > 0 else SOURCE_CSV
+    out_dir = args[1] if len(args) > 1 else OUT_DIR
+    build(source, out_dir, force="--force" in sys.argv)
+
+if __name__ == "__main__":
+
+    main()
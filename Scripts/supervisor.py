@@ -1,29 +1,54 @@
 import subprocess
 import time
 import sys
+import os
 
 SCRIPT_NAME = "environment.py"
-RESTART_INTERVAL = 300  # 5 minutes in seconds
+HEARTBEAT_FILE = "environment.heartbeat"  # touched by the worker after every finished row
+STALL_TIMEOUT = 900   # seconds without a finished row before the worker counts as hung
+CHECK_INTERVAL = 30   # seconds between liveness checks
+MAX_BACKOFF = 300     # cap for the restart delay after repeated crashes
+
+def heartbeat_age():
+    if not os.path.exists(HEARTBEAT_FILE):
+        return 0
+    return time.time() - os.path.getmtime(HEARTBEAT_FILE)
 
 def run_script():
+    backoff = 5
     while True:
-        print(f"\n🚀 [SUPERVISOR] Starting {SCRIPT_NAME} for a 5-minute session...")
-        
-        # Start the actual environment script
+        print(f"\n🚀 [SUPERVISOR] Starting {SCRIPT_NAME}...")
+        started = time.time()
+
+        # Start the long-lived worker; it resumes from its journal
         process = subprocess.Popen([sys.executable, SCRIPT_NAME])
 
-        try:
-            # Let it run for 5 minutes
-            process.wait(timeout=RESTART_INTERVAL)
-            # If it finishes naturally before 5 mins (e.g., all rows done)
+        code = None
+        while code is None:
+            try:
+                code = process.wait(timeout=CHECK_INTERVAL)
+            except subprocess.TimeoutExpired:
+                # Per-call deadlines live in the worker; this only catches a truly wedged process
+                if time.time() - started > STALL_TIMEOUT and heartbeat_age() > STALL_TIMEOUT:
+                    print(f"\n⏰ [SUPERVISOR] No progress for {STALL_TIMEOUT}s. Stopping hung worker...")
+                    process.terminate()
+                    try:
+                        process.wait(timeout=30)
+                    except subprocess.TimeoutExpired:
+                        process.kill()
+                        process.wait()
+                    code = -1
+
+        if code == 0:
             print("✅ [SUPERVISOR] Script finished naturally.")
             break
-        except subprocess.TimeoutExpired:
-            print(f"\n⏰ [SUPERVISOR] 5 minutes reached. Killing process to clear hangs...")
-            process.terminate()  # Kill the script
-            process.wait()       # Wait for it to fully close
-            print("🧼 [SUPERVISOR] Cleaned up. Restarting in 5 seconds...")
-            time.sleep(5)
+
+        # A long healthy run resets the crash backoff
+        if time.time() - started > STALL_TIMEOUT:
+            backoff = 5
+        print(f"💥 [SUPERVISOR] Worker exited with code {code}. Restarting in {backoff} seconds...")
+        time.sleep(backoff)
+        backoff = min(backoff * 2, MAX_BACKOFF)
 
 if __name__ == "__main__":
 
@@ -0,0 +1,192 @@
+import sys
+import json
+import calendar
+import threading
+from datetime import date, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+import pandas as pd
+from http_client import client
+
+# --- CONFIGURATION ---
+ARCHIVE_URL = "https://archive-api.open-meteo.com/v1/archive"
+ELEVATION_URL = "https://api.open-meteo.com/v1/elevation"
+CELL_DEG = 0.1          # rows in the same cell share one daily series (ERA5 itself is ~0.25 deg)
+MAX_GAP_DAYS = 31       # dates of a cell closer than this are fetched as one range
+MAX_RANGE_DAYS = 366    # never ask for more than a year in one range
+ALIGN_TO_MONTHS = True  # widen ranges to whole months so more cells share the exact same range
+MAX_LOCATIONS = 50      # coordinates per archive request (comma-separated latitude/longitude lists)
+ELEVATION_BATCH = 100   # coordinates per elevation request (API maximum)
+COORD_DIGITS = 4        # elevation is per point; points equal at this precision share a lookup
+INPUT_CSV = "final.csv"  # rows planned by the stub-server dry run (python weather_planner.py [csv])
+
+def _day(value):
+    return date.fromisoformat(str(value)[:10])
+
+def _month_start(d):
+    return d.replace(day=1)
+
+def _month_end(d):
+    return d.replace(day=calendar.monthrange(d.year, d.month)[1])
+
+def collapse_dates(days):
+    """Sorted dates -> minimal list of (start, end) ranges under MAX_GAP_DAYS / MAX_RANGE_DAYS."""
+    ranges = []
+    for d in sorted(set(days)):
+        if ranges and (d - ranges[-1][1]).days <= MAX_GAP_DAYS and (d - ranges[-1][0]).days < MAX_RANGE_DAYS:
+            ranges[-1][1] = d
+        else:
+            ranges.append([d, d])
+    if ALIGN_TO_MONTHS:
+        ranges = [[_month_start(a), _month_end(b)] for a, b in ranges]
+    return [tuple(r) for r in ranges]
+
+class WeatherPlanner:
+    """
+    Groups rows by grid cell, turns each cell's sighting dates into a few date ranges, and
+    fetches every (range, up to MAX_LOCATIONS cells) group with a single archive request.
+    Daily values are then fanned back out to the rows. Elevation is fetched for up to
+    ELEVATION_BATCH points per request.
+    """
+    def __init__(self, archive_url=ARCHIVE_URL, elevation_url=ELEVATION_URL, http=client):
+        self.archive_url = archive_url
+        self.elevation_url = elevation_url
+        self.http = http
+        self.requests = 0
+        self.naive = 0
+
+    @staticmethod
+    def cell(lat, lon):
+        return round(float(lat) / CELL_DEG), round(float(lon) / CELL_DEG)
+
+    def plan(self, rows):
+        """Returns [(start, end, [cells...]), ...]: one entry per archive request."""
+        dates_by_cell = {}
+        for r in rows:
+            dates_by_cell.setdefault(self.cell(r['latitude'], r['longitude']), []).append(_day(r['sighting_date']))
+        cells_by_range = {}
+        for cell, days in dates_by_cell.items():
+            for rng in collapse_dates(days):
+                cells_by_range.setdefault(rng, []).append(cell)
+        plan = []
+        for (start, end), cells in sorted(cells_by_range.items()):
+            for i in range(0, len(cells), MAX_LOCATIONS):
+                plan.append((start, end, cells[i:i + MAX_LOCATIONS]))
+        return plan
+
+    def _fetch_range(self, start, end, cells):
+        params = {
+            "latitude": ",".join(f"{c[0] * CELL_DEG:.4f}" for c in cells),
+            "longitude": ",".join(f"{c[1] * CELL_DEG:.4f}" for c in cells),
+            "start_date": start.isoformat(), "end_date": end.isoformat(),
+            "daily": "temperature_2m_mean", "timezone": "auto",
+        }
+        self.requests += 1
+        data = self.http.get_json(self.archive_url, params=params)
+        # One location -> a single object, several -> a list in request order
+        series = data if isinstance(data, list) else [data]
+        out = {}
+        for cell, s in zip(cells, series):
+            daily = s.get('daily', {})
+            for day, temp in zip(daily.get('time', []), daily.get('temperature_2m_mean', [])):
+                if temp is not None:
+                    out[(cell, day)] = float(temp)
+        return out
+
+    def temperatures(self, rows):
+        """{filename: temp} for every row the archive answered (failed groups are left out)."""
+        values = {}
+        for start, end, cells in self.plan(rows):
+            try:
+                values.update(self._fetch_range(start, end, cells))
+            except Exception as e:
+                print(f"⚠️ Archive request {start}..{end} x{len(cells)} failed: {e}")
+        self.naive += len(rows)
+        out = {}
+        for r in rows:
+            key = (self.cell(r['latitude'], r['longitude']), str(r['sighting_date'])[:10])
+            if key in values:
+                out[str(r['filename'])] = values[key]
+        return out
+
+    def elevations(self, rows):
+        """{filename: elevation} with up to ELEVATION_BATCH distinct points per request."""
+        points = {}
+        for r in rows:
+            points.setdefault((round(float(r['latitude']), COORD_DIGITS), round(float(r['longitude']), COORD_DIGITS)), []).append(r)
+        keys = list(points)
+        found = {}
+        for i in range(0, len(keys), ELEVATION_BATCH):
+            chunk = keys[i:i + ELEVATION_BATCH]
+            params = {"latitude": ",".join(str(k[0]) for k in chunk), "longitude": ",".join(str(k[1]) for k in chunk)}
+            self.requests += 1
+            try:
+                elev = self.http.get_json(self.elevation_url, params=params).get('elevation', [])
+            except Exception as e:
+                print(f"⚠️ Elevation request for {len(chunk)} points failed: {e}")
+                continue
+            found.update({k: float(v) for k, v in zip(chunk, elev) if v is not None})
+        self.naive += len(rows)
+        return {str(r['filename']): found[k] for k, rs in points.items() if k in found for r in rs}
+
+    def report(self):
+        saved = self.naive - self.requests
+        pct = saved / self.naive * 100 if self.naive else 0.0
+        return f"🌡️ Weather planner: {self.requests} requests instead of {self.naive} ({saved} saved, {pct:.1f}%)"
+
+# -----------------------------
+# Local stub server (dry runs without touching Open-Meteo)
+# -----------------------------
+def stub_body(path, q):
+    """Synthetic Open-Meteo answer for /v1/archive or /v1/elevation with query dict q."""
+    lats = [float(x) for x in q.get("latitude", "").split(",") if x]
+    lons = [float(x) for x in q.get("longitude", "").split(",") if x]
+    if path.endswith("/elevation"):
+        return {"elevation": [round(abs(lat) * 10 + abs(lon), 1) for lat, lon in zip(lats, lons)]}
+    start, end = _day(q["start_date"]), _day(q["end_date"])
+    days = [(start + timedelta(days=i)).isoformat() for i in range((end - start).days + 1)]
+    series = [{"latitude": lat, "longitude": lon,
+               "daily": {"time": days, "temperature_2m_mean": [round(30 - abs(lat) / 3 + i % 7 * 0.1, 1) for i in range(len(days))]}}
+              for lat, lon in zip(lats, lons)]
+    return series[0] if len(series) == 1 else series
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """Answers /v1/archive and /v1/elevation in the Open-Meteo response shapes with synthetic values."""
+    def do_GET(self):
+        url = urlparse(self.path)
+        q = {k: v[0] for k, v in parse_qs(url.query).items()}
+        self.server.hits += 1
+        data = json.dumps(stub_body(url.path, q)).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+def stub_server():
+    """Starts the stub on a free local port; returns (server, base_url). Call server.shutdown() when done."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    server.hits = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def main():
+    """python weather_planner.py [csv]: plans the rows of the CSV against the stub server and reports the savings."""
+    path = sys.argv[1] if len(sys.argv) > 1 else INPUT_CSV
+    rows = pd.read_csv(path, usecols=["filename", "latitude", "longitude", "sighting_date"]).to_dict("records")
+    server, base = stub_server()
+    try:
+        planner = WeatherPlanner(base + "/v1/archive", base + "/v1/elevation")
+        temps = planner.temperatures(rows)
+        elevs = planner.elevations(rows)
+    finally:
+        server.shutdown()
+    print(f"✅ {len(temps)}/{len(rows)} temperatures, {len(elevs)}/{len(rows)} elevations ({server.hits} stub hits)")
+    print(planner.report())
+
+if __name__ == "__main__":
+
+    main()
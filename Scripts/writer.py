@@ -0,0 +1,125 @@
+import os
+import time
+import concurrent.futures
+import pandas as pd
+from journal import Journal
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+class RowWriter:
+    """
+    Buffered, crash-safe appender for a CSV, with an optional partitioned Parquet copy.
+
+    Each flush appends one block to the CSV and fsyncs it, then records the block's keys
+    plus the new CSV size in a sidecar journal. On open, CSV bytes past the last recorded
+    size (a flush cut short by a crash) are truncated, so the CSV and the journal agree.
+    Resume only needs `writer.done`, read from the journal.
+    """
+    def __init__(self, csv_path, columns, key='filename', index_path=None,
+                 flush_rows=100, flush_secs=10, parquet_dir=None, partition_cols=None, on_flush=None):
+        if parquet_dir and pa is None:
+            raise ImportError("pyarrow is required for Parquet output (pip install pyarrow)")
+        self.csv_path = csv_path
+        self.columns = list(columns)
+        self.key = key
+        self.flush_rows = flush_rows
+        self.flush_secs = flush_secs
+        self.parquet_dir = parquet_dir
+        self.partition_cols = partition_cols or []
+        self.on_flush = on_flush  # called with the rows of each block once it is durable
+        self.buffer = []
+        self.last_flush = time.monotonic()
+        self.parts = 0
+        self.parquet_pool = concurrent.futures.ThreadPoolExecutor(max_workers=1) if parquet_dir else None
+        self.parquet_jobs = []
+
+        self.journal = Journal(index_path or csv_path + ".journal")
+        self.journal.bootstrap(csv_path, key=key)
+        self.done, committed = self.journal.read()
+        if committed is not None and os.path.exists(csv_path) and os.path.getsize(csv_path) > committed:
+            print(f"🩹 Dropping {os.path.getsize(csv_path) - committed} bytes of an interrupted write in {csv_path}")
+            with open(csv_path, 'r+b') as f:
+                f.truncate(committed)
+
+    def write(self, row):
+        self.buffer.append(row)
+        self.done.add(str(row[self.key]))
+        if len(self.buffer) >= self.flush_rows or time.monotonic() - self.last_flush >= self.flush_secs:
+            self.flush()
+
+    def write_many(self, rows):
+        for row in rows:
+            self.write(row)
+
+    def flush(self):
+        self.last_flush = time.monotonic()
+        if not self.buffer:
+            return
+        rows, self.buffer = self.buffer, []
+        df = pd.DataFrame(rows, columns=self.columns)
+
+        header = not os.path.exists(self.csv_path) or os.path.getsize(self.csv_path) == 0
+        data = df.to_csv(index=False, header=header).encode('utf-8')
+        with open(self.csv_path, 'ab') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+            size = f.tell()
+        self.journal.append(df[self.key].astype(str).tolist(), commit=size)
+        if self.on_flush is not None:
+            self.on_flush(rows)
+
+        if self.parquet_pool is not None:
+            self.parts += 1
+            self.parquet_jobs = [j for j in self.parquet_jobs if not j.done()]
+            self.parquet_jobs.append(self.parquet_pool.submit(self._write_parquet, df, self.parts))
+
+    def _write_parquet(self, df, part):
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        pq.write_to_dataset(table, root_path=self.parquet_dir, partition_cols=self.partition_cols,
+                            basename_template=f"part-{int(time.time())}-{part}-{{i}}.parquet")
+
+    def close(self):
+        self.flush()
+        if self.parquet_pool is not None:
+            for job in self.parquet_jobs:
+                job.result()
+            self.parquet_pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def fsync_dir(path):
+    """fsyncs the directory holding `path`, so a file created or renamed in it survives a crash."""
+    if os.name == "nt":
+        return  # directories cannot be opened on Windows; NTFS journals the rename itself
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def rewrite_csv(df, csv_path, key='filename', index_path=None):
+    """
+    Replaces a RowWriter CSV wholesale (merges, in-place updates): the new file is swapped in
+    atomically and its journal rebuilt from it, so the next RowWriter resumes from the new content.
+    """
+    tmp = csv_path + ".tmp"
+    with open(tmp, 'w', newline='', encoding='utf-8') as f:
+        df.to_csv(f, index=False)
+        f.flush()
+        os.fsync(f.fileno())
+    fsync_dir(tmp)       # the temp file's data and entry are on disk before it replaces the old CSV
+    os.replace(tmp, csv_path)
+    fsync_dir(csv_path)  # and the rename itself
+    journal = index_path or csv_path + ".journal"
+    if os.path.exists(journal):
+        os.remove(journal)
+    Journal(journal).bootstrap(csv_path, key=key)
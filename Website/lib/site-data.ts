@@ -0,0 +1,125 @@
+// Loaders for the artifacts Scripts/site_data.py writes to public/data.
+
+const DATA_URL = '/Global-Multimodal-Geo-Biotic-Dataset-GMGBD/data'
+
+export type PointColumn = {
+  name: string
+  type: 'uint8' | 'uint16' | 'uint32'
+  offset: number
+  lo?: number
+  hi?: number
+  transform?: 'expm1'
+  lookup?: string
+}
+
+export type HexLevel = {
+  z: number
+  size: number
+  tiles_per_axis: number
+  cells: number
+  tiles: [number, number, number][]
+}
+
+export type Manifest = {
+  version: number
+  source: string
+  built: string
+  points: { count: number; bytes: number; columns: PointColumn[] }
+  hex: { size_z0: number; levels: HexLevel[] }
+}
+
+export type HexCells = {
+  q: number[]
+  r: number[]
+  count: number[]
+  species: number[]
+  top_species: number[]
+  temp: (number | null)[]
+  elevation: (number | null)[]
+  ndvi: (number | null)[]
+  water: (number | null)[]
+}
+
+export type Points = {
+  count: number
+  columns: Record<string, Uint8Array | Uint16Array | Uint32Array>
+  value: (column: string, i: number) => number | null
+}
+
+const BITS = { uint8: 8, uint16: 16, uint32: 32 }
+const cache = new Map<string, Promise<unknown>>()
+
+function fetchCached<T>(path: string, parse: (res: Response) => Promise<T>): Promise<T> {
+  if (!cache.has(path)) {
+    cache.set(
+      path,
+      fetch(`${DATA_URL}/${path}`).then((res) => {
+        if (!res.ok) throw new Error(`${path}: HTTP ${res.status}`)
+        return parse(res)
+      }),
+    )
+  }
+  return cache.get(path) as Promise<T>
+}
+
+export function loadJson<T>(path: string): Promise<T> {
+  return fetchCached(path, (res) => res.json() as Promise<T>)
+}
+
+export function loadManifest() {
+  return loadJson<Manifest>('manifest.json')
+}
+
+function typedColumn(type: PointColumn['type'], buffer: ArrayBuffer, offset: number, count: number) {
+  if (type === 'uint8') return new Uint8Array(buffer, offset, count)
+  if (type === 'uint16') return new Uint16Array(buffer, offset, count)
+  return new Uint32Array(buffer, offset, count)
+}
+
+// Every observation as typed-array columns (a few bytes per point, no copies)
+export async function loadPoints(): Promise<Points> {
+  const manifest = await loadManifest()
+  const buffer = await fetchCached(`points.bin?v=${manifest.source}`, (res) => res.arrayBuffer())
+  const { count, columns: spec } = manifest.points
+  const columns: Points['columns'] = {}
+  for (const col of spec) {
+    columns[col.name] = typedColumn(col.type, buffer, col.offset, count)
+  }
+  const byName = Object.fromEntries(spec.map((col) => [col.name, col]))
+
+  const value = (column: string, i: number) => {
+    const col = byName[column]
+    const q = columns[column][i]
+    if (col.lo === undefined || col.hi === undefined) return q
+    const top = 2 ** BITS[col.type] - 2
+    if (q > top) return null
+    const v = col.lo + (q / top) * (col.hi - col.lo)
+    return col.transform === 'expm1' ? Math.expm1(v) : v
+  }
+  return { count, columns, value }
+}
+
+// Zoom level whose hexagons are about `degrees` wide (clamped to the levels that were built)
+export function hexLevelFor(manifest: Manifest, degrees: number) {
+  const levels = manifest.hex.levels
+  return levels.find((level) => level.size * Math.sqrt(3) <= degrees) ?? levels[levels.length - 1]
+}
+
+// Hexagons of one zoom level inside a lon/lat box; only the tiles that overlap it are fetched
+export async function loadHexCells(
+  level: HexLevel,
+  [west, south, east, north]: [number, number, number, number],
+): Promise<HexCells[]> {
+  const n = level.tiles_per_axis
+  const x0 = Math.floor(((west + 180) / 360) * n)
+  const x1 = Math.floor(((east + 180) / 360) * n)
+  const y0 = Math.floor(((90 - north) / 180) * n)
+  const y1 = Math.floor(((90 - south) / 180) * n)
+  const tiles = level.tiles.filter(([x, y]) => x >= x0 && x <= x1 && y >= y0 && y <= y1)
+  return Promise.all(tiles.map(([x, y]) => loadJson<HexCells>(`hex/${level.z}/${x}_${y}.json`)))
+}
+
+// Center of hexagon (q, r) of a level, as [lon, lat]
+export function hexCenter(level: HexLevel, q: number, r: number): [number, number] {
+  return [level.size * Math.sqrt(3) * (q + r / 2), level.size * 1.5 * r]
+}
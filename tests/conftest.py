@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The scripts import each other by plain module name, as when run from their own folder
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for folder in ("Scripts", "Evaluations"):
+    sys.path.insert(0, os.path.join(ROOT, folder))
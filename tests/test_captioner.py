@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("transformers")
+from PIL import Image
+from captioner import Captioner
+
+@pytest.fixture
+def images(tmp_path):
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(5):
+        path = tmp_path / f"img_{i}.jpg"
+        Image.fromarray(rng.integers(0, 255, (40, 48, 3), dtype=np.uint8)).save(path)
+        paths.append(str(path))
+    broken = tmp_path / "broken.jpg"
+    broken.write_bytes(b"not a jpeg")
+    return paths[:2] + [str(broken), str(tmp_path / "missing.jpg")] + paths[2:]
+
+def test_tiny_captions_in_order(images):
+    cap = Captioner.tiny(batch_size=2, max_length=8)
+    results = cap.caption(images)
+    assert len(results) == len(images)
+    for i, (caption, err) in enumerate(results):
+        if i in (2, 3):  # unreadable and missing: an error, never a caption
+            assert caption is None and err
+        else:
+            assert isinstance(caption, str) and err is None
+    assert cap.images == 5 and cap.images_per_sec() > 0
+    # The same images in another batching give the same captions
+    assert Captioner.tiny(batch_size=8, max_length=8).caption(images) == results
+
+@pytest.mark.parametrize("precision, dtype", [("fp32", torch.float32), ("bf16", torch.bfloat16), ("int8", torch.float32)])
+def test_cpu_precision(images, tmp_path, precision, dtype):
+    tiny = Captioner.tiny()
+    saved = str(tmp_path / "tiny-blip")
+    tiny.model.save_pretrained(saved)
+    tiny.processor.save_pretrained(saved)
+    cap = Captioner.from_pretrained(saved, "cpu", cpu_precision=precision, max_length=8)
+    assert cap.dtype == dtype
+    quantized = any(isinstance(m, torch.ao.nn.quantized.dynamic.Linear) for m in cap.model.modules())
+    assert quantized == (precision == "int8")
+    results = cap.caption([images[0], images[4]])
+    assert all(isinstance(c, str) and err is None for c, err in results)
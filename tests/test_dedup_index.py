@@ -0,0 +1,61 @@
+import os
+import numpy as np
+import dedup_index
+from dedup_index import DedupIndex, key64
+
+def test_add_and_contains(tmp_path):
+    seen = DedupIndex(str(tmp_path / "seen"), capacity=1000)
+    assert seen.count() == 0
+    seen.add([("obs", 1), ("photo", 10), ("url", None)])
+    assert seen.contains("obs", 1) and seen.contains("photo", 10)
+    assert not seen.contains("obs", 10)  # kinds do not collide
+    assert seen.seen_any([("obs", 2), ("photo", 10)])
+    assert not seen.seen_any([("obs", 2), ("photo", None)])
+    seen.add([("obs", 1)])  # already known: nothing appended
+    assert seen.count() == 2
+    assert os.path.getsize(str(tmp_path / "seen.log")) == 2 * 8
+    seen.close()
+
+def test_log_is_replayed_after_a_crash(tmp_path):
+    path = str(tmp_path / "seen")
+    seen = DedupIndex(path, capacity=1000)
+    seen.add([("obs", i) for i in range(50)])
+    seen.log.close()  # killed before close(): no compaction, only the log on disk
+    reopened = DedupIndex(path)
+    assert reopened.count() == 50
+    assert all(reopened.contains("obs", i) for i in range(50))
+    assert not reopened.contains("obs", 50)
+    reopened.close()
+
+def test_compaction_merges_the_log_into_sorted_keys(tmp_path, monkeypatch):
+    monkeypatch.setattr(dedup_index, "COMPACT_LOG_KEYS", 100)
+    path = str(tmp_path / "seen")
+    seen = DedupIndex(path, capacity=10_000)
+    seen.add([("obs", i) for i in range(60)])
+    assert len(seen.keys) == 0 and len(seen.recent) == 60
+    seen.add([("obs", i) for i in range(40, 120)])  # past COMPACT_LOG_KEYS
+    assert len(seen.keys) == 120 and not seen.recent
+    assert os.path.getsize(path + ".log") == 0
+    keys = np.fromfile(path + ".keys", dtype=np.uint64)
+    assert np.all(keys[1:] > keys[:-1])
+    assert set(keys.tolist()) == {key64("obs", i) for i in range(120)}
+    seen.add([("obs", 500)])
+    seen.close()
+
+    reopened = DedupIndex(path)
+    assert reopened.count() == 121
+    assert all(reopened.contains("obs", i) for i in list(range(120)) + [500])
+    assert sum(reopened.contains("obs", i) for i in range(1000, 3000)) == 0
+    reopened.close()
+
+def test_bloom_filter_grows_past_its_capacity(tmp_path):
+    path = str(tmp_path / "seen")
+    seen = DedupIndex(path, capacity=100)
+    seen.add([("url", f"u{i}") for i in range(300)])
+    assert seen.capacity >= 600
+    assert all(seen.contains("url", f"u{i}") for i in range(300))
+    seen.close()
+    reopened = DedupIndex(path)
+    assert reopened.capacity == seen.capacity  # sized from the saved filter
+    assert reopened.contains("url", "u299") and not reopened.contains("url", "u300")
+    reopened.close()
@@ -0,0 +1,164 @@
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import pytest
+import requests
+import engine
+import http_client
+from engine import Engine, StalledCall, with_deadline, transient
+from http_client import HttpClient
+from fakes import Faults, fake_ee
+
+class Handler(BaseHTTPRequestHandler):
+    """Answers with the next status of server.script, then 200."""
+    def do_GET(self):
+        with self.server.lock:
+            self.server.hits += 1
+            status = self.server.script.pop(0) if self.server.script else 200
+        body = b'{"ok": true}'
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server():
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    srv.daemon_threads = True
+    srv.script, srv.hits, srv.lock = [], 0, threading.Lock()
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    srv.url = f"http://127.0.0.1:{srv.server_address[1]}/x"
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(engine.metrics, "sleep", lambda seconds, reason: None)
+    monkeypatch.setattr(http_client, "BACKOFF_BASE", 0.01)
+
+class Concurrency:
+    """A lookup that sleeps a little and records how many copies of itself ran at once."""
+    def __init__(self, column, seconds=0.02):
+        self.column, self.seconds = column, seconds
+        self.lock = threading.Lock()
+        self.running = self.peak = 0
+
+    def __call__(self, row):
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        time.sleep(self.seconds)
+        with self.lock:
+            self.running -= 1
+        return {self.column: row * 2}
+
+def test_each_provider_keeps_its_concurrency_cap():
+    eng = Engine({"geo": (1, None), "weather": (3, None)}, rows_in_flight=8)
+    geo, weather = Concurrency("geo"), Concurrency("weather")
+    out = {row: fields for row, fields, err in eng.run(range(12), [("geo", geo), ("weather", weather)])}
+    eng.shutdown()
+    assert out == {row: {"geo": row * 2, "weather": row * 2} for row in range(12)}
+    assert geo.peak == 1 and weather.peak == 3
+
+def test_throttle_rate_limits_network_calls_only():
+    eng = Engine({"gee": (4, 20.0)}, rows_in_flight=4)
+
+    def lookup(row):
+        if row % 2:  # odd rows: answered from a cache, no network call
+            return {"v": row}
+        eng.throttle("gee")
+        return {"v": row}
+
+    t0 = time.monotonic()
+    assert sorted(fields["v"] for _, fields, _ in eng.run(range(12), [("gee", lookup)])) == list(range(12))
+    assert time.monotonic() - t0 >= 5 / 20 * 0.9  # 6 calls through a 20/s bucket with burst 1
+    assert eng.providers["gee"].calls.value == 6
+    eng.shutdown()
+
+def test_failed_lookup_fails_only_its_row():
+    eng = Engine({"a": (2, None)})
+
+    def lookup(row):
+        if row == 3:
+            raise ValueError("bad row")
+        return {"v": row}
+
+    out = {row: (fields, err) for row, fields, err in eng.run(range(5), [("a", lookup)])}
+    eng.shutdown()
+    assert isinstance(out[3][1], ValueError) and out[3][0] is None
+    assert all(out[r] == ({"v": r}, None) for r in (0, 1, 2, 4))
+
+def flaky(errors):
+    """Raises the given errors in turn, then returns "ok"; counts its calls."""
+    errors = list(errors)
+
+    def call():
+        call.n += 1
+        if errors:
+            raise errors.pop(0)
+        return "ok"
+    call.n = 0
+    return call
+
+def test_transient_errors_are_retried():
+    call = flaky([requests.ConnectionError(), requests.Timeout(), StalledCall()])
+    assert with_deadline(5, retries=3)(call)() == "ok"
+    assert call.n == 4
+
+def test_deterministic_errors_fail_at_once():
+    for err in (KeyError("daily"), TypeError("bad"), ValueError("nope")):
+        call = flaky([err])
+        with pytest.raises(type(err)):
+            with_deadline(5, retries=3)(call)()
+        assert call.n == 1
+
+def test_retries_run_out():
+    call = flaky([requests.ConnectionError()] * 3)
+    with pytest.raises(requests.ConnectionError):
+        with_deadline(5, retries=2)(call)()
+    assert call.n == 3
+
+def test_stalled_call_is_given_up_and_retried():
+    calls = []
+
+    def slow():
+        calls.append(1)
+        if len(calls) == 1:
+            time.sleep(1)
+        return "ok"
+
+    t0 = time.monotonic()
+    assert with_deadline(0.2, retries=1)(slow)() == "ok"
+    assert len(calls) == 2 and time.monotonic() - t0 < 0.9
+
+def test_http_status_decides_the_retry(server):
+    http = HttpClient(retries=0)
+    fetch = with_deadline(5, retries=2)(lambda: http.get_json(server.url))
+    server.script = [503, 429]
+    assert fetch() == {"ok": True}
+    assert server.hits == 3
+    server.script, server.hits = [404], 0
+    with pytest.raises(requests.HTTPError):
+        fetch()
+    assert server.hits == 1
+
+class FailFirst(Faults):
+    """No latency; the first getInfo raises."""
+    def __init__(self):
+        super().__init__()
+        self.n = 0
+
+    def inject(self, route):
+        self.n += 1
+        return "error" if self.n == 1 else None
+
+def test_ee_errors_by_message():
+    ee = fake_ee(FailFirst())
+    info = with_deadline(5, retries=2)(lambda: ee.Image("x").reduceRegion().getInfo())
+    assert info()["NDVI"] == 5000  # the injected "Too many concurrent aggregations" is retried
+    assert transient(ee.EEException("Computation timed out."))
+    assert not transient(ee.EEException("Image.load: Image asset 'x' not found."))
@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta
+import gee_batch
+from gee_batch import GeeBatch, target_date, composite_window, WINDOW_DAYS
+from fakes import Faults, fake_ee
+from postprocess import ndvi_category
+
+def rows(n, date="2024-06-15"):
+    return [{"filename": f"img_{i}.jpg", "latitude": i % 80, "longitude": i % 170, "sighting_date": date}
+            for i in range(n)]
+
+class FailOn(Faults):
+    """No latency; the getInfo calls numbered in `calls` (1-based) raise."""
+    def __init__(self, calls):
+        super().__init__(latency=0, error_rate=0)
+        self.calls = set(calls)
+        self.n = 0
+
+    def inject(self, route):
+        self.n += 1
+        return "error" if self.n in self.calls else None
+
+def test_target_date():
+    assert target_date("2024-06-15", 0) == datetime(2024, 6, 15)
+    assert target_date("2024-02-29 10:00", 1) == datetime(2023, 2, 28)
+    assert target_date("1995-05-01", 0) == datetime(2000, 5, 1)  # before MODIS: its first year
+    assert target_date("2001-05-01", 2) is None
+
+def test_composite_window_covers_the_per_row_window():
+    for day in [datetime(2024, 1, 3), datetime(2024, 6, 15), datetime(2023, 12, 30)]:
+        start, end = (datetime.strptime(d, '%Y-%m-%d') for d in composite_window(day))
+        assert start.timetuple().tm_yday % 16 == 1  # composites start on day 1, 17, 33, ...
+        assert day - timedelta(days=WINDOW_DAYS) <= start < day + timedelta(days=WINDOW_DAYS)
+        assert end <= day + timedelta(days=WINDOW_DAYS) + timedelta(days=1)
+    # Rows a few days apart share a window, so they are reduced together
+    assert composite_window(datetime(2024, 6, 14)) == composite_window(datetime(2024, 6, 15))
+
+def test_ndvi_in_two_round_trips_per_batch():
+    batch = GeeBatch(fake_ee())
+    got = batch.ndvi(rows(20))
+    assert batch.round_trips == 2  # sizes + one flattened reduceRegions
+    assert len(got) == 20
+    assert all(cat == ndvi_category(v) and -0.1 <= v <= 0.9 for v, cat in got.values())
+
+def test_failed_flatten_is_redone_window_by_window():
+    batch = GeeBatch(fake_ee(FailOn([2])))
+    got = batch.ndvi(rows(5))
+    assert batch.round_trips == 3  # sizes, the failed flatten, then the one window on its own
+    assert all(v is not None for v, _ in got.values())
+
+def test_ndvi_falls_back_to_earlier_years(monkeypatch):
+    monkeypatch.setattr(gee_batch, "FALLBACK_YEARS", 2)
+    batch = GeeBatch(fake_ee(FailOn([1])))  # the first year's pass fails
+    got = batch.ndvi(rows(5))
+    assert batch.round_trips == 3
+    assert all(v is not None for v, _ in got.values())
+    batch = GeeBatch(fake_ee(FailOn(range(1, 100))))
+    assert set(batch.ndvi(rows(2)).values()) == {(None, "No Data")}
+
+def test_water_distance_per_batch(monkeypatch):
+    monkeypatch.setattr(gee_batch, "BATCH_SIZE", 8)
+    batch = GeeBatch(fake_ee())
+    got = batch.water_dist(rows(20))
+    assert batch.round_trips == 3
+    assert len(got) == 20 and all(0 <= v <= 2000 and round(v, 2) == v for v in got.values())
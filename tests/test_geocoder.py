@@ -0,0 +1,54 @@
+import json
+import pandas as pd
+import pytest
+
+pytest.importorskip("shapely")
+pytest.importorskip("scipy")
+from geocoder import OfflineGeocoder
+
+def square(x0, y0, x1, y1):
+    return {"type": "Polygon", "coordinates": [[[x0, y0], [x1, y0], [x1, y1], [x0, y1], [x0, y0]]]}
+
+def write_geojson(path, features):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({"type": "FeatureCollection", "features": [
+            {"type": "Feature", "properties": props, "geometry": geom} for props, geom in features]}, f)
+
+@pytest.fixture
+def geo(tmp_path):
+    countries, admin1, cities = (str(tmp_path / n) for n in ("countries.geojson", "admin1.geojson", "cities.csv"))
+    write_geojson(countries, [({"NAME_EN": "Westland", "NAME": "W"}, square(0, 0, 10, 10)),
+                              ({"ADMIN": "Eastland"}, square(10, 0, 20, 10)),
+                              ({"NAME": "Nowhere"}, None)])
+    write_geojson(admin1, [({"name_en": "North Province"}, square(0, 5, 10, 10))])
+    pd.DataFrame({"name": ["Alpha", "Beta"], "latitude": [7.0, 2.0], "longitude": [3.0, 15.0]}).to_csv(cities, index=False)
+    return countries, admin1, cities
+
+def test_country_state_and_city(geo):
+    countries, admin1, cities = geo
+    g = OfflineGeocoder(countries, admin1, cities, city_radius_km=10)
+    assert g.reverse(7.01, 3.01) == ("Westland", "North Province", "Alpha")
+    assert g.reverse(7.0, 5.0) == ("Westland", "North Province", "Rural")  # ~220 km from Alpha
+    # No admin-1 polygon: the state falls back to the city, as in get_location_pro
+    assert g.reverse(2.0, 15.0) == ("Eastland", "Beta", "Beta")
+    assert g.reverse(2.0, 12.0) == ("Eastland", "Rural", "Rural")
+    assert g.reverse(-5.0, 5.0) is None  # sea: left to Nominatim
+
+def test_batch_matches_single_lookups_and_borders(geo):
+    countries, admin1, cities = geo
+    g = OfflineGeocoder(countries, admin1, cities)
+    lats, lons = [7.01, 2.0, -5.0, 5.0], [3.01, 15.0, 5.0, 10.0]
+    batch = g.reverse_many(lats, lons)
+    assert batch == [g.reverse(lat, lon) for lat, lon in zip(lats, lons)]
+    assert batch[3][0] == "Westland"  # on the shared border: the first polygon wins
+
+def test_optional_files_may_be_missing(geo, tmp_path):
+    countries, _, _ = geo
+    g = OfflineGeocoder(countries, str(tmp_path / "none.geojson"), str(tmp_path / "none.csv"))
+    assert g.reverse(7.0, 3.0) == ("Westland", "Rural", "Rural")
+
+def test_missing_shapely_is_reported_on_use(geo, monkeypatch):
+    import geocoder
+    monkeypatch.setattr(geocoder, "shapely", None)
+    with pytest.raises(ImportError):
+        OfflineGeocoder(geo[0])
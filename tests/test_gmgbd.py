@@ -0,0 +1,51 @@
+import os
+import pandas as pd
+import pytest
+
+pytest.importorskip("pyarrow")
+from gmgbd import to_parquet, open_dataset, SCHEMA
+
+SHIPPED = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "gmgbd.csv")
+
+@pytest.fixture(scope="module")
+def dataset(tmp_path_factory):
+    if not os.path.exists(SHIPPED):
+        pytest.skip("gmgbd.csv not in this checkout")
+    tmp = tmp_path_factory.mktemp("gmgbd")
+    csv = str(tmp / "gmgbd.csv")
+    pd.read_csv(SHIPPED, nrows=3000).to_csv(csv, index=False)
+    out = str(tmp / "parquet")
+    assert to_parquet(csv, out, chunk_rows=1000) == 3000
+    df = pd.read_csv(csv)
+    df["sighting_date"] = pd.to_datetime(df["sighting_date"])
+    return open_dataset(out), df
+
+def test_round_trip_keeps_every_row(dataset):
+    ds, df = dataset
+    assert ds.count() == len(df)
+    assert set(SCHEMA.names) <= set(ds.schema.names)
+    got = ds.select("filename", "NDVI_value").to_pandas().set_index("filename")["NDVI_value"].astype(float)
+    # float32 in the schema: equal to the 4 digits the CSV holds
+    assert got.reindex(df["filename"]).fillna(-1).round(4).tolist() == df["NDVI_value"].fillna(-1).round(4).tolist()
+
+def test_filters_match_pandas(dataset):
+    ds, df = dataset
+    country = df["country"].mode()[0]
+    genus = df["scientific_name"].str.split().str[0].mode()[0]
+    q = ds.where(country=country, dates=("2025-01-01", "2025-12-31"), ndvi=["Dense Canopy", "Moderate Vegetation"])
+    expected = df[(df["country"] == country) & (df["sighting_date"].dt.year == 2025) &
+                  df["NDVI_Category"].isin(["Dense Canopy", "Moderate Vegetation"])]
+    assert q.count() == len(expected)
+    assert sorted(q.select("filename").to_pandas()["filename"]) == sorted(expected["filename"])
+
+    in_box = df["latitude"].between(-10, 40) & df["longitude"].between(-20, 50)
+    assert ds.where(bbox=(-20, -10, 50, 40)).count() == in_box.sum()
+    assert ds.where(genus=genus).count() == (df["scientific_name"].str.split().str[0] == genus).sum()
+
+def test_queries_are_lazy_and_immutable(dataset):
+    ds, _ = dataset
+    base = ds.select("filename")
+    narrowed = base.where(country="Nowhere")
+    assert base.expr is None and narrowed.expr is not None
+    assert narrowed.count() == 0
+    assert list(narrowed.to_pandas().columns) == ["filename"]
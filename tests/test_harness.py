@@ -0,0 +1,144 @@
+import json
+import numpy as np
+import pandas as pd
+import pytest
+from PIL import Image
+import harness
+from harness import QwenBackend, OllamaBackend, FakeBackend, Sample, run, fake_ollama_server
+
+SPECIAL = ["<|endoftext|>", "<|im_start|>", "<|im_end|>", "<|vision_start|>", "<|vision_end|>",
+           "<|image_pad|>", "<|video_pad|>"]
+# Same layout as Qwen2.5-VL's own template (no default system turn)
+TEMPLATE = ("{% for m in messages %}<|im_start|>{{ m['role'] }}\n"
+            "{% if m['content'] is string %}{{ m['content'] }}{% else %}{% for c in m['content'] %}"
+            "{% if c['type'] == 'image' %}<|vision_start|><|image_pad|><|vision_end|>{% else %}{{ c['text'] }}{% endif %}"
+            "{% endfor %}{% endif %}<|im_end|>\n{% endfor %}{% if add_generation_prompt %}<|im_start|>assistant\n{% endif %}")
+
+def tiny_qwen():
+    """Randomly initialized two-layer Qwen2.5-VL with a character-level tokenizer: no download."""
+    import torch
+    from tokenizers import Tokenizer, models, pre_tokenizers, decoders
+    from transformers import (PreTrainedTokenizerFast, Qwen2VLImageProcessor, Qwen2_5_VLProcessor,
+                              Qwen2_5_VLConfig, Qwen2_5_VLForConditionalGeneration)
+    vocab = {t: i for i, t in enumerate(SPECIAL + [chr(c) for c in range(32, 127)] + ["\n"])}
+    ids = {t: vocab[t] for t in SPECIAL}
+    backend = Tokenizer(models.WordLevel(vocab, unk_token="<|endoftext|>"))
+    backend.pre_tokenizer = pre_tokenizers.Split("", "isolated")
+    backend.decoder = decoders.Fuse()
+    tokenizer = PreTrainedTokenizerFast(tokenizer_object=backend, eos_token="<|im_end|>", pad_token="<|endoftext|>",
+                                        additional_special_tokens=SPECIAL[1:])
+
+    class ImageOnlyProcessor(Qwen2_5_VLProcessor):
+        def check_argument_for_proper_class(self, name, arg):
+            if arg is not None:  # no video processor: it needs torchvision
+                return super().check_argument_for_proper_class(name, arg)
+
+    processor = ImageOnlyProcessor(image_processor=Qwen2VLImageProcessor(min_pixels=56 * 56, max_pixels=56 * 56),
+                                   tokenizer=tokenizer, chat_template=TEMPLATE)
+    config = Qwen2_5_VLConfig(
+        text_config=dict(vocab_size=len(vocab), hidden_size=64, intermediate_size=128, num_hidden_layers=2,
+                         num_attention_heads=4, num_key_value_heads=2, max_position_embeddings=4096, initializer_range=0.5,
+                         rope_scaling={"type": "mrope", "mrope_section": [2, 3, 3]},
+                         bos_token_id=ids["<|endoftext|>"], eos_token_id=ids["<|im_end|>"], pad_token_id=0),
+        vision_config=dict(depth=1, hidden_size=32, intermediate_size=64, num_heads=2, out_hidden_size=64,
+                           patch_size=14, spatial_merge_size=2, temporal_patch_size=2, fullatt_block_indexes=[0],
+                           window_size=56),
+        image_token_id=ids["<|image_pad|>"], video_token_id=ids["<|video_pad|>"],
+        vision_start_token_id=ids["<|vision_start|>"], vision_end_token_id=ids["<|vision_end|>"],
+        bos_token_id=ids["<|endoftext|>"], eos_token_id=ids["<|im_end|>"], pad_token_id=0)
+    torch.manual_seed(0)
+    model = Qwen2_5_VLForConditionalGeneration(config).eval()
+    model.generation_config.eos_token_id = ids["<|im_end|>"]
+    model.generation_config.pad_token_id = 0
+    return model, processor
+
+@pytest.fixture(scope="module")
+def qwen():
+    pytest.importorskip("torch")
+    pytest.importorskip("transformers")
+    try:
+        return tiny_qwen()
+    except ImportError as e:
+        pytest.skip(f"transformers without Qwen2.5-VL: {e}")
+
+@pytest.fixture
+def images(tmp_path):
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(4):
+        path = tmp_path / f"img_{i}.jpg"
+        Image.fromarray(rng.integers(0, 255, (56, 56, 3), dtype=np.uint8)).save(path)
+        paths.append(str(path))
+    return paths
+
+def backend(qwen, **kwargs):
+    model, processor = qwen
+    return QwenBackend("tiny", device="cpu", batch_size=2, max_new_tokens=8, pixel_cache="",
+                       model=model, processor=processor, **kwargs)
+
+def test_prefix_cache_defaults_to_few_shot_only(qwen, images):
+    assert harness.PREFIX_CACHE is None
+    assert backend(qwen).prefix_cache is False
+    assert backend(qwen, examples=[(images[0], "What is it?", "Parus major")]).prefix_cache is True
+
+def test_cached_decode_matches_generate(qwen, images):
+    """The hand-written decode over the prefix KV cache must give what model.generate gives."""
+    examples = [(images[0], "What is it?", "Parus major")]
+    samples = [Sample(f"k{i}", path, "x", "Species?") for i, path in enumerate(images[1:])]
+    plain = backend(qwen, examples=examples, prefix_cache=False)
+    cached = backend(qwen, examples=examples, prefix_cache=True)
+    expected = [p for s in samples for p, _ in plain.predict([s])]
+    got = [p for p, _ in cached.predict(samples)]
+    assert cached.prefix is not None
+    assert got == expected
+    # Only the rows' own tokens were fed once the prefix was cached
+    assert all(cached.usage[s.key]["prompt_tokens"] < plain.usage[s.key]["prompt_tokens"] for s in samples)
+
+def samples_for(paths):
+    truths = ["Parus major", "Falco tinnunculus", "Falco peregrinus", "Turdus merula"]
+    return [Sample(f"img_{i}.jpg", path, truths[i % 4], "Species?") for i, path in enumerate(paths)]
+
+class Flaky(FakeBackend):
+    """FakeBackend that errors on the keys in `fail` and records which keys it was asked for."""
+    def __init__(self, fail=(), **kwargs):
+        super().__init__(answer=lambda s: "**Falco** tinnunculus\nconfident", **kwargs)
+        self.fail, self.asked = set(fail), []
+
+    def predict(self, samples):
+        self.asked += [s.key for s in samples]
+        return [(None, "boom") if s.key in self.fail else out for s, out in zip(samples, super().predict(samples))]
+
+def test_run_scores_and_resumes(images, tmp_path):
+    samples = samples_for(images)
+    out = str(tmp_path / "res.csv")
+    first = run(Flaky(fail={"img_2.jpg"}, batch_size=3), samples, out)
+    assert first["score"].fillna(-1).tolist() == [0, 2, -1, 0]
+    assert first["error"].tolist()[2] == "boom"
+    assert first["prediction"].tolist()[:2] == ["Falco tinnunculus"] * 2  # cleaned
+    with open(out + ".jsonl", 'a', encoding='utf-8') as f:
+        f.write('{"filename": "img_0.jp')  # torn line from a crash
+    # Only the row that errored runs again; the rest comes from the jsonl cache
+    again = Flaky()
+    second = run(again, samples, out)
+    assert again.asked == ["img_2.jpg"]
+    assert second["error"].isna().all() and second["score"].tolist() == [0, 2, 1, 0]
+    assert pd.read_csv(out)["filename"].tolist() == [s.key for s in samples]
+
+def test_run_against_the_fake_ollama_server(images, tmp_path):
+    server, host = fake_ollama_server(answer=lambda messages: "Scientific name: Falco tinnunculus")
+    try:
+        backend = OllamaBackend("fake", host=host, concurrency=2, examples=[(images[0], "What is it?", "Parus major")])
+        samples = samples_for(images[1:])
+        out = str(tmp_path / "res.csv")
+        res = run(backend, samples, out)
+        assert server.requests == 3
+        assert res["prediction"].tolist() == ["Falco tinnunculus"] * 3 and res["score"].tolist() == [0, 2, 1]
+        assert res["latency"].notna().all() and (res["prompt_tokens"] > 0).all()
+        with open(out + ".jsonl", encoding='utf-8') as f:
+            assert len([json.loads(line) for line in f]) == 3
+        run(backend, samples, out)  # resumed: nothing left to ask
+        assert server.requests == 3
+    finally:
+        server.shutdown()
+        server.server_close()
+
@@ -0,0 +1,104 @@
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import pytest
+import requests
+import http_client
+from http_client import HttpClient, TokenBucket, CallCancelled, call_deadline, retry_after
+
+class Handler(BaseHTTPRequestHandler):
+    """Answers each request with the next (status, headers, delay) of server.script, then 200."""
+    def do_GET(self):
+        with self.server.lock:
+            self.server.hits += 1
+            status, headers, delay = self.server.script.pop(0) if self.server.script else (200, {}, 0)
+        time.sleep(delay)
+        body = b'{"ok": true}'
+        try:
+            self.send_response(status)
+            for k, v in headers.items():
+                self.send_header(k, v)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client timed out first
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server():
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    srv.daemon_threads = True
+    srv.script, srv.hits, srv.lock = [], 0, threading.Lock()
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    srv.url = f"http://127.0.0.1:{srv.server_address[1]}/x"
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(http_client, "BACKOFF_BASE", 0.01)
+
+def test_retries_retryable_statuses(server):
+    server.script = [(503, {}, 0), (429, {"Retry-After": "0"}, 0)]
+    http = HttpClient(retries=2)
+    assert http.get_json(server.url) == {"ok": True}
+    assert server.hits == 3
+    assert http.retried["127.0.0.1"].value == 2
+
+def test_gives_up_after_the_last_retry(server):
+    server.script = [(503, {}, 0)] * 3
+    resp = HttpClient(retries=1).get(server.url)
+    assert resp.status_code == 503 and server.hits == 2
+
+def test_client_errors_are_not_retried(server):
+    server.script = [(404, {}, 0)]
+    with pytest.raises(requests.HTTPError):
+        HttpClient(retries=3).get_json(server.url)
+    assert server.hits == 1
+
+def test_timeouts_are_retried_then_raised(server):
+    server.script = [(200, {}, 0.5)] * 2
+    with pytest.raises(requests.Timeout):
+        HttpClient(retries=1, timeout=0.1).get(server.url)
+    assert server.hits == 2
+
+def test_retry_after_header():
+    resp = requests.Response()
+    resp.headers["Retry-After"] = "7"
+    assert retry_after(resp) == 7.0
+    resp.headers["Retry-After"] = "Wed, 21 Oct 2015 07:28:00 GMT"  # in the past
+    assert retry_after(resp) == 0.0
+    resp.headers["Retry-After"] = "soon"
+    assert retry_after(resp) is None
+
+def test_token_bucket_limits_the_rate():
+    bucket = TokenBucket(rate=20, burst=1, name="test")
+    t0 = time.monotonic()
+    for _ in range(5):
+        bucket.acquire()
+    assert time.monotonic() - t0 >= 4 / 20 * 0.9
+
+def test_call_deadline_caps_timeout_and_backoff(server):
+    server.script = [(200, {}, 2)]
+    http = HttpClient(retries=3, timeout=30)
+    t0 = time.monotonic()
+    with pytest.raises((requests.Timeout, CallCancelled)):
+        with call_deadline(0.3):
+            http.get(server.url)
+    assert time.monotonic() - t0 < 1.5
+    # Outside the block the client's own timeout applies again
+    server.script = []
+    assert http.get(server.url).status_code == 200
+
+def test_cancelled_call_stops_before_its_next_attempt(server):
+    server.script = [(503, {}, 0)] * 5
+    cancelled = threading.Event()
+    cancelled.set()
+    with pytest.raises(CallCancelled):
+        with call_deadline(10, cancelled):
+            HttpClient(retries=4).get(server.url)
+    assert server.hits == 0
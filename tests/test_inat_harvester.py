@@ -0,0 +1,122 @@
+import itertools
+import threading
+import pytest
+import requests
+import inat_harvester
+from inat_harvester import Harvester, fake_inat_server, split_ranges
+from http_client import HttpClient
+
+@pytest.fixture
+def inat():
+    server, url = fake_inat_server(n=500)
+    yield server, url
+    server.shutdown()
+    server.server_close()
+
+def harvester(url, tmp_path, http=None, **kwargs):
+    return Harvester(url, {"has[]": "photos"}, ranges=4, per_page=50, checkpoint=str(tmp_path / "cursors.json"),
+                     http=http or HttpClient(retries=0), **kwargs)
+
+def test_split_ranges_cover_the_id_space():
+    ranges = split_ranges(0, 1001, 4)
+    assert ranges[0][0] == 0 and ranges[-1][1] == 1001
+    assert all(a[1] == b[0] for a, b in zip(ranges, ranges[1:]))
+
+def test_full_harvest_then_nothing_left(inat, tmp_path):
+    server, url = inat
+    h = harvester(url, tmp_path)
+    ids = [item["id"] for item in h]
+    h.flush()
+    assert sorted(ids) == server.ids  # every observation exactly once
+    again = harvester(url, tmp_path)
+    assert list(again) == []
+
+def test_resume_refetches_only_the_unflushed_pages(inat, tmp_path):
+    server, url = inat
+    h = harvester(url, tmp_path, workers=1)
+    first = [item["id"] for item in itertools.islice(h, 240)]
+    h.close()  # killed mid-run: the last CHECKPOINT_LAG pages were never checkpointed
+    rest = [item["id"] for item in harvester(url, tmp_path)]
+    assert set(first) | set(rest) == set(server.ids)
+    assert len(set(first) & set(rest)) <= (inat_harvester.CHECKPOINT_LAG + 1) * 50
+
+def walkers():
+    return [t for t in threading.enumerate() if t.name.startswith("inat")]
+
+def test_stopping_early_ends_the_walkers(tmp_path):
+    server, url = fake_inat_server(n=5000)
+    try:
+        h = harvester(url, tmp_path)
+        items = iter(h)
+        first = list(itertools.islice(items, 40))  # the consumer reached its target
+        assert len(first) == 40 and walkers()
+        h.close()  # the generator is still suspended: its finally has not run
+        assert walkers() == []
+        items.close()
+        h.flush()
+        assert len(list(harvester(url, tmp_path))) <= 5000 - 40 + (inat_harvester.CHECKPOINT_LAG + 1) * 50
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def test_new_observations_become_new_ranges(inat, tmp_path):
+    server, url = inat
+    h = harvester(url, tmp_path)
+    list(h)
+    h.flush()
+    newer = [server.ids[-1] + 7, server.ids[-1] + 9]
+    server.ids = server.ids + newer
+    assert sorted(item["id"] for item in harvester(url, tmp_path)) == newer
+
+class Flaky:
+    """get_json that fails `failures` times with the given status, then answers like the real client."""
+    def __init__(self, status, failures):
+        self.http = HttpClient(retries=0)
+        self.status = status
+        self.failures = failures
+        self.calls = 0
+
+    def get_json(self, url, params=None):
+        if "id_above" in (params or {}):
+            self.calls += 1
+            if self.calls <= self.failures:
+                resp = requests.Response()
+                resp.status_code = self.status
+                raise requests.HTTPError(f"{self.status}", response=resp)
+        return self.http.get_json(url, params=params)
+
+def test_transient_errors_are_retried(inat, tmp_path, monkeypatch):
+    monkeypatch.setattr(inat_harvester, "RETRY_WAIT", 0)
+    server, url = inat
+    flaky = Flaky(503, inat_harvester.PAGE_RETRIES)
+    assert sorted(item["id"] for item in harvester(url, tmp_path, http=flaky)) == server.ids
+
+def test_permanent_errors_stop_the_harvest(inat, tmp_path, monkeypatch):
+    monkeypatch.setattr(inat_harvester, "RETRY_WAIT", 0)
+    server, url = inat
+    flaky = Flaky(400, 1)
+    with pytest.raises(requests.HTTPError):
+        list(harvester(url, tmp_path, http=flaky, workers=1))
+    assert flaky.calls == 1
+
+def test_failed_observations_are_fetched_again(inat, tmp_path, monkeypatch):
+    monkeypatch.setattr(inat_harvester, "ITEM_RETRIES", 2)
+    server, url = inat
+    h = harvester(url, tmp_path)
+    list(h)
+    lost = server.ids[10:13]
+    for obs_id in lost:
+        h.retry_later(obs_id)
+    h.flush()
+
+    h = harvester(url, tmp_path)
+    assert sorted(item["id"] for item in h) == lost
+    h.retry_later(lost[0])  # failed again; the other two went through
+    h.flush()
+    assert h.state["retry"] == {str(lost[0]): 2}
+
+    h = harvester(url, tmp_path)
+    assert [item["id"] for item in h] == [lost[0]]
+    h.retry_later(lost[0])  # past ITEM_RETRIES: given up
+    h.flush()
+    assert list(harvester(url, tmp_path)) == []
@@ -0,0 +1,90 @@
+import os
+import pandas as pd
+from journal import Journal, beat
+from writer import RowWriter, rewrite_csv
+
+COLUMNS = ["filename", "value"]
+
+def rows(start, stop):
+    return [{"filename": f"img_{i}", "value": i} for i in range(start, stop)]
+
+def test_journal_keeps_only_committed_keys(tmp_path):
+    journal = Journal(str(tmp_path / "out.journal"))
+    assert journal.read() == (set(), None)
+    journal.append(["a", "b"], commit=100)
+    journal.append(["c"], commit=150)
+    assert journal.read() == ({"a", "b", "c"}, 150)
+    # Keys appended without their commit marker belong to a block that never finished
+    journal.append(["d"])
+    with open(journal.path, 'a', encoding='utf-8') as f:
+        f.write("e\n@20")  # crash in the middle of the marker line
+    assert journal.read() == ({"a", "b", "c"}, 150)
+
+def test_writer_truncates_a_block_cut_short_by_a_crash(tmp_path):
+    path = str(tmp_path / "out.csv")
+    with RowWriter(path, COLUMNS, flush_rows=5) as w:
+        w.write_many(rows(0, 10))
+    size = os.path.getsize(path)
+    # Crash after the CSV append but before the journal recorded it: the bytes are not vouched for
+    with open(path, 'ab') as f:
+        f.write(b"img_10,10\nimg_11,1")
+    w = RowWriter(path, COLUMNS, flush_rows=5)
+    assert os.path.getsize(path) == size
+    assert w.done == {f"img_{i}" for i in range(10)}
+    w.write_many(rows(10, 12))
+    w.close()
+    df = pd.read_csv(path)
+    assert df["filename"].tolist() == [f"img_{i}" for i in range(12)]
+    assert df["value"].tolist() == list(range(12))
+
+def test_writer_resumes_from_a_torn_journal(tmp_path):
+    path = str(tmp_path / "out.csv")
+    with RowWriter(path, COLUMNS, flush_rows=5) as w:
+        w.write_many(rows(0, 5))
+    size = os.path.getsize(path)
+    with open(path, 'ab') as f:
+        f.write(b"img_5,5\n")
+    with open(path + ".journal", 'a', encoding='utf-8') as f:
+        f.write("img_5\n@")  # crash while writing the commit marker
+    w = RowWriter(path, COLUMNS)
+    assert w.done == {f"img_{i}" for i in range(5)}
+    assert os.path.getsize(path) == size
+    w.close()
+
+def test_on_flush_sees_only_durable_blocks(tmp_path):
+    path = str(tmp_path / "out.csv")
+    flushed = []
+    w = RowWriter(path, COLUMNS, flush_rows=3, on_flush=lambda block: flushed.append([r["filename"] for r in block]))
+    w.write_many(rows(0, 4))
+    assert flushed == [["img_0", "img_1", "img_2"]]
+    assert Journal(path + ".journal").load() == {"img_0", "img_1", "img_2"}
+    w.close()
+    assert flushed[-1] == ["img_3"]
+
+def test_bootstrap_from_an_existing_csv(tmp_path):
+    path = str(tmp_path / "out.csv")
+    pd.DataFrame(rows(0, 3)).to_csv(path, index=False)
+    w = RowWriter(path, COLUMNS)
+    assert w.done == {"img_0", "img_1", "img_2"}
+    assert Journal(path + ".journal").read()[1] == os.path.getsize(path)
+    w.close()
+
+def test_beat_touches_the_heartbeat(tmp_path):
+    path = str(tmp_path / "beat")
+    beat(path)
+    assert float(open(path).read()) > 0
+
+def test_rewrite_csv_is_fsynced_around_the_swap(tmp_path, monkeypatch):
+    path = str(tmp_path / "out.csv")
+    with RowWriter(path, COLUMNS) as w:
+        w.write_many(rows(0, 3))
+    calls = []
+    real_fsync, real_replace = os.fsync, os.replace
+    monkeypatch.setattr(os, "fsync", lambda fd: calls.append("fsync") or real_fsync(fd))
+    monkeypatch.setattr(os, "replace", lambda a, b: calls.append("replace") or real_replace(a, b))
+    rewrite_csv(pd.DataFrame(rows(5, 7)), path)
+    # file, directory, swap, directory (then the rebuilt journal)
+    assert calls[:4] == ["fsync", "fsync", "replace", "fsync"]
+    assert not os.path.exists(path + ".tmp")
+    assert pd.read_csv(path)["filename"].tolist() == ["img_5", "img_6"]
+    assert RowWriter(path, COLUMNS).done == {"img_5", "img_6"}
@@ -0,0 +1,104 @@
+import threading
+import time
+import pandas as pd
+import pytest
+import ledger
+from ledger import WorkLedger, RemoteLedger, LeaseKeeper, merge, serve, shard_path
+from writer import RowWriter
+
+@pytest.fixture
+def book(tmp_path):
+    led = WorkLedger(str(tmp_path / "ledger.sqlite"))
+    led.load([f"img_{i}" for i in range(10)])
+    yield led
+    led.close()
+
+def test_leases_are_disjoint_and_in_input_order(book):
+    assert book.lease("a", 4) == ["img_0", "img_1", "img_2", "img_3"]
+    assert book.lease("b", 4) == ["img_4", "img_5", "img_6", "img_7"]
+    assert book.load(["img_0", "img_10"]) == 1  # idempotent
+    assert book.lease("a", 10) == ["img_8", "img_9", "img_10"]
+    assert book.lease("b", 10) == []
+    assert book.stats() == {"leased": 11, "active_workers": 2}
+
+def test_expired_lease_goes_to_another_worker(book):
+    assert book.lease("a", 2, ttl=-1) == ["img_0", "img_1"]  # already expired
+    assert book.lease("b", 2) == ["img_0", "img_1"]
+    # The first worker lost the lease: it can no longer renew or release those rows
+    assert book.renew("a", ["img_0", "img_1"]) == 0
+    assert book.release("a", ["img_0"]) == 0
+    # but rows it still wrote count as done
+    assert book.complete("a", ["img_0"]) == 1
+    assert book.lease("c", 1) == ["img_2"]
+
+def test_renew_keeps_the_lease(book):
+    book.lease("a", 2, ttl=-1)
+    assert book.renew("a", ["img_0", "img_1"]) == 2
+    assert book.lease("b", 2) == ["img_2", "img_3"]
+
+def test_release_parks_rows_after_max_attempts(book, monkeypatch):
+    monkeypatch.setattr(ledger, "MAX_ATTEMPTS", 2)
+    for _ in range(2):
+        assert book.lease("a", 1) == ["img_0"]
+        book.release("a", ["img_0"])
+    assert book.lease("a", 1) == ["img_1"]
+    assert book.stats()["failed"] == 1
+
+def test_lease_keeper_renews_the_held_batch(book):
+    book.lease("a", 2, ttl=0.5)
+    keeper = LeaseKeeper(book, "a", every=0.1, ttl=0.5)
+    keeper.hold(["img_0", "img_1"])
+    time.sleep(0.8)
+    assert book.lease("b", 2) == ["img_2", "img_3"]
+    keeper.close()
+    time.sleep(0.6)
+    assert book.lease("b", 2) == ["img_0", "img_1"]
+
+def test_remote_ledger_does_not_retry(tmp_path):
+    server = serve(str(tmp_path / "ledger.sqlite"), port=0, host="127.0.0.1")
+    calls = []
+    handle = server.RequestHandlerClass.do_POST
+
+    def flaky(handler):
+        calls.append(handler.path)
+        if len(calls) == 1:
+            handler.send_response(503)  # the lease may have been applied before the answer was lost
+            handler.send_header("Content-Length", "2")
+            handler.end_headers()
+            handler.wfile.write(b"{}")
+            return
+        handle(handler)
+
+    server.RequestHandlerClass = type("Flaky", (server.RequestHandlerClass,), {"do_POST": flaky})
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        remote = RemoteLedger(f"http://127.0.0.1:{server.server_address[1]}")
+        with pytest.raises(RuntimeError):
+            remote.load(["img_0"])
+        assert calls == ["/load"]
+        assert remote.load(["img_0", "img_1"]) == 2
+        assert remote.lease("a", 5) == ["img_0", "img_1"]
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def write_shard(output, worker, rows):
+    with RowWriter(shard_path(output, worker), ["filename", "value"]) as w:
+        w.write_many(rows)
+
+def test_merge_is_deterministic_and_in_input_order(tmp_path):
+    inp, out = tmp_path / "final.csv", str(tmp_path / "gmgbd.csv")
+    pd.DataFrame({"filename": [f"img_{i}" for i in range(6)]}).to_csv(inp, index=False)
+    write_shard(out, "w2", [{"filename": "img_4", "value": 2}, {"filename": "img_1", "value": 2}])
+    write_shard(out, "w1", [{"filename": "img_3", "value": 1}, {"filename": "img_1", "value": 1},
+                            {"filename": "img_0", "value": 1}])
+    assert merge(str(inp), out) == 4
+    df = pd.read_csv(out, dtype={"filename": str})
+    assert df["filename"].tolist() == ["img_0", "img_1", "img_3", "img_4"]
+    assert df.set_index("filename")["value"]["img_1"] == 1  # first shard by name wins
+    # Idempotent, and rows already in the output win over the shards
+    write_shard(out, "w0", [{"filename": "img_1", "value": 0}, {"filename": "img_5", "value": 0}])
+    assert merge(str(inp), out) == 5
+    df = pd.read_csv(out, dtype={"filename": str})
+    assert df["filename"].tolist() == ["img_0", "img_1", "img_3", "img_4", "img_5"]
+    assert df.set_index("filename")["value"]["img_1"] == 1
@@ -0,0 +1,45 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from postprocess import ndvi_categories, ndvi_category, normalize_names, postprocess, NDVI_BINS, NDVI_LABELS, NO_DATA
+
+SHIPPED = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "gmgbd.csv")
+
+def test_bins_match_the_shipped_labels():
+    """Re-binning the released NDVI values gives back the released categories, row for row."""
+    if not os.path.exists(SHIPPED):
+        pytest.skip("gmgbd.csv not in this checkout")
+    df = pd.read_csv(SHIPPED, usecols=["NDVI_value", "NDVI_Category"])
+    expected = df["NDVI_Category"].fillna(NO_DATA).to_numpy()
+    assert (ndvi_categories(df["NDVI_value"].to_numpy()) == expected).all()
+    assert set(expected) <= set(NDVI_LABELS + [NO_DATA])
+
+def test_thresholds_belong_to_the_lower_bin():
+    values = [-0.2, 0.1, 0.1001, 0.3, 0.45, 0.6, 0.6001, 0.95, np.nan]
+    expected = ["Non-Veg", "Non-Veg", "Sparse/Bare Soil", "Sparse/Bare Soil", "Moderate Vegetation",
+                "Moderate Vegetation", "Dense Canopy", "Dense Canopy", NO_DATA]
+    assert ndvi_categories(values).tolist() == expected
+    assert [ndvi_category(v) for v in values] == expected
+    assert ndvi_category(None) == NO_DATA
+    assert len(NDVI_LABELS) == len(NDVI_BINS) + 1
+
+def test_names_and_normalized_columns():
+    df = pd.DataFrame({
+        "country": [" Tanzania", "Tanzania ", None],
+        "state": [None, "Pwani  Region", "x"],
+        "city": ["rural", "Dar es Salaam", None],
+        "NDVI_value": [0.59834, np.nan, 0.7],
+        "avg_temp_C": [27.84, 10.0, 20.0],
+        "elevation_m": [5.0, 5.0, 5.0],
+        "dist_to_water_m": [0.0, 100.0, 50.0],
+    })
+    out = postprocess(df)
+    assert out["country"].tolist() == ["Tanzania", "Tanzania", "Unknown"]
+    assert out["city"].tolist() == ["Rural", "Dar es Salaam", "Rural"]
+    assert out["state"].tolist() == ["Rural", "Pwani Region", "x"]  # no state -> the city
+    assert out["NDVI_value"].tolist()[0] == 0.5983
+    assert out["NDVI_Category"].tolist() == ["Moderate Vegetation", NO_DATA, "Dense Canopy"]
+    assert out["dist_to_water_norm"].tolist() == [0.0, 1.0, 0.5]
+    assert (out["elevation_norm"] == 0.0).all()  # constant column
+    assert normalize_names(pd.Series(["RURAL", None]), "Unknown").tolist() == ["Rural", "Unknown"]
@@ -0,0 +1,65 @@
+import pandas as pd
+from provenance import Provenance, fingerprint, merge_sidecars, sidecar_path
+
+def lookup(x):
+    return x * 2
+
+def other(x):
+    return x * 3
+
+class Backend:
+    def value(self, x):
+        return x
+
+    def unrelated(self):
+        return None
+
+VERSIONS = {"geocode": fingerprint(lookup, grid=0.01), "ndvi": fingerprint(other, Backend.value, bins=(0.2, 0.5))}
+
+def test_fingerprint_follows_code_and_parameters():
+    assert fingerprint(lookup, grid=0.01) == VERSIONS["geocode"]
+    assert fingerprint(other, grid=0.01) != VERSIONS["geocode"]
+    assert fingerprint(lookup, grid=0.02) != VERSIONS["geocode"]
+    assert fingerprint(lookup, grid=0.01, scale=30) != VERSIONS["geocode"]
+    # A method's version does not depend on the rest of its class
+    assert fingerprint(Backend.value) != fingerprint(Backend)
+    assert fingerprint(Backend.value) == fingerprint(Backend().value)
+
+def test_stale_rows_per_kind(tmp_path):
+    out = str(tmp_path / "gmgbd.csv")
+    prov = Provenance(out, VERSIONS)
+    prov.record(["a", "b"])
+    assert prov.stale(["a", "b", "c"]) == {"geocode": ["c"], "ndvi": ["c"]}  # unknown rows are stale
+    prov.close()
+
+    # The NDVI code changed: only that kind is stale, and reopening reads the sidecar back
+    changed = {**VERSIONS, "ndvi": fingerprint(other, Backend.value, bins=(0.3, 0.5))}
+    prov = Provenance(out, changed)
+    assert prov.stale(["a", "b"]) == {"geocode": [], "ndvi": ["a", "b"]}
+    prov.record(["b"])  # b was recomputed: its later line supersedes the old one
+    assert prov.stale(["a", "b"]) == {"geocode": [], "ndvi": ["a"]}
+    prov.compact()
+    prov.close()
+    assert len(pd.read_csv(sidecar_path(out))) == 2
+    assert Provenance(out, changed).stale(["a", "b"]) == {"geocode": [], "ndvi": ["a"]}
+
+def test_new_kind_and_adopted_rows(tmp_path):
+    out = str(tmp_path / "gmgbd.csv")
+    prov = Provenance(out, {"geocode": VERSIONS["geocode"]})
+    prov.record(["a"])
+    prov.close()
+    prov = Provenance(out, VERSIONS)
+    assert prov.stale(["a"]) == {"geocode": [], "ndvi": ["a"]}  # kind added after the row was written
+    assert prov.adopt(["a", "b"]) == 1
+    assert prov.stale(["a", "b"]) == {"geocode": [], "ndvi": ["a"]}
+    prov.close()
+
+def test_merged_sidecars_keep_the_first_source(tmp_path):
+    out, s1, s2 = (str(tmp_path / n) for n in ("gmgbd.csv", "gmgbd.shard-1.csv", "gmgbd.shard-2.csv"))
+    old = {**VERSIONS, "ndvi": "old"}
+    for path, versions, rows in [(s1, VERSIONS, ["a", "b"]), (s2, old, ["b", "c"])]:
+        prov = Provenance(path, versions)
+        prov.record(rows)
+        prov.close()
+    assert merge_sidecars([s1, s2], out) == 3
+    assert Provenance(out, VERSIONS).stale(["a", "b", "c"]) == {"geocode": [], "ndvi": ["c"]}
@@ -0,0 +1,93 @@
+import os
+import sys
+import subprocess
+import numpy as np
+import pytest
+
+rasterio = pytest.importorskip("rasterio")
+from rasterio.transform import from_origin
+import raster
+from raster import RasterSampler, LocalRasterBackend
+
+NODATA = -9999
+
+def write_tif(path, data, west=0.0, north=10.0, res=0.1):
+    """Single-band EPSG:4326 GeoTIFF in 16x16 tiles; pixel (i, j) covers north - i*res, west + j*res."""
+    with rasterio.open(path, 'w', driver="GTiff", height=data.shape[0], width=data.shape[1], count=1,
+                       dtype=data.dtype, crs="EPSG:4326", transform=from_origin(west, north, res, res),
+                       nodata=NODATA, tiled=True, blockxsize=16, blockysize=16) as dst:
+        dst.write(data, 1)
+    return str(path)
+
+def grid(value=lambda i, j: i * 1000 + j, dtype=np.int32):
+    return np.fromfunction(value, (100, 100)).astype(dtype)
+
+def centre(i, j, res=0.1):
+    """(lat, lon) of the middle of pixel (i, j)."""
+    return 10.0 - (i + 0.5) * res, (j + 0.5) * res
+
+def test_sampler_reads_each_block_once(tmp_path):
+    data = grid()
+    data[3, 4] = NODATA
+    sampler = RasterSampler(write_tif(tmp_path / "dem.tif", data))
+    pixels = [(0, 0), (5, 7), (15, 15), (16, 16), (99, 99), (50, 20)]
+    lats, lons = zip(*[centre(i, j) for i, j in pixels])
+    assert sampler.sample(lats, lons).tolist() == [data[i, j] for i, j in pixels]
+    assert sampler.reads == 4  # blocks (0,0), (1,1), (6,6), (3,1)
+    sampler.sample(lats, lons)
+    assert sampler.reads == 4  # served from the block cache
+    lat, lon = centre(3, 4)
+    out = sampler.sample([lat, 10.5, -0.05], [lon, 5.0, 5.0])  # nodata, north of and south of the raster
+    assert np.isnan(out).all()
+    sampler.close()
+
+def test_block_cache_is_bounded(tmp_path):
+    sampler = RasterSampler(write_tif(tmp_path / "dem.tif", grid()), cache_blocks=2)
+    for i in (0, 20, 40, 0):
+        sampler.sample(*zip(centre(i, i)))
+    assert sampler.reads == 4 and len(sampler.blocks) == 2
+    sampler.close()
+
+def test_elevation_and_water_keyed_by_filename(tmp_path):
+    dem = write_tif(tmp_path / "dem.tif", grid(lambda i, j: i + j * 0.25, np.float32))
+    water = write_tif(tmp_path / "water.tif", grid(lambda i, j: j * 1.234567, np.float32))
+    backend = LocalRasterBackend(dem, water, str(tmp_path / "ndvi"))
+    lat, lon = centre(2, 3)
+    rows = [{"filename": "a", "latitude": lat, "longitude": lon}, {"filename": "b", "latitude": -50, "longitude": 5}]
+    assert backend.elevation(rows) == {"a": 2.8, "b": None}  # 2.75, rounded to 0.1 m
+    assert backend.water_dist(rows) == {"a": 3.7, "b": None}
+    with pytest.raises(FileNotFoundError):
+        backend.ndvi(rows)
+    with pytest.raises(FileNotFoundError):
+        LocalRasterBackend(None, None, None).elevation(rows)
+
+def test_ndvi_median_of_the_window_with_year_fallback(tmp_path):
+    ndvi_dir = tmp_path / "ndvi"
+    ndvi_dir.mkdir()
+    # 2024-06-15 +/- 16 days: the composites starting 2024-06-09 and 2024-06-25 (day 161, 177)
+    write_tif(ndvi_dir / "2024-06-09.tif", np.full((100, 100), 5000, np.int16))
+    write_tif(ndvi_dir / "2024-06-25.tif", np.full((100, 100), 7000, np.int16))
+    write_tif(ndvi_dir / "2024-07-11.tif", np.full((100, 100), 100, np.int16))  # outside the window
+    # Only the previous year has data for 2025-03-10
+    write_tif(ndvi_dir / "2024-03-05.tif", np.full((100, 100), 2000, np.int16))
+    backend = LocalRasterBackend(None, None, str(ndvi_dir))
+    lat, lon = centre(10, 10)
+    rows = [{"filename": "a", "latitude": lat, "longitude": lon, "sighting_date": "2024-06-15"},
+            {"filename": "b", "latitude": lat, "longitude": lon, "sighting_date": "2025-03-10"},
+            {"filename": "c", "latitude": lat, "longitude": lon, "sighting_date": "2019-01-01"},
+            {"filename": "d", "latitude": -50, "longitude": lon, "sighting_date": "2024-06-15"}]
+    assert backend.ndvi(rows) == {"a": (0.6, "Moderate Vegetation"), "b": (0.2, "Sparse/Bare Soil"),
+                                  "c": (None, "No Data"), "d": (None, "No Data")}
+
+def test_missing_rasterio_is_reported_on_use(monkeypatch, tmp_path):
+    monkeypatch.setattr(raster, "rasterio", None)
+    with pytest.raises(ImportError):
+        LocalRasterBackend(str(tmp_path / "dem.tif"))
+
+def test_environment_imports_rasterio_only_for_local_rasters():
+    """environment.py with the default "gee" backend must run where rasterio/GDAL is not installed."""
+    scripts = os.path.dirname(raster.__file__)
+    code = ("import sys, fakes; sys.modules['ee'] = fakes.fake_ee(); import environment; "
+            "print('rasterio' in sys.modules, environment.RASTER_BACKEND)")
+    out = subprocess.run([sys.executable, "-c", code], cwd=scripts, capture_output=True, text=True, check=True)
+    assert out.stdout.split() == ["False", "gee"]
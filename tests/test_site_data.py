@@ -0,0 +1,111 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+import pytest
+import site_data
+from site_data import build, HEX_ZOOMS
+
+SPECIES = ["Parus major", "Falco tinnunculus", "Turdus merula", "Ardea cinerea", "Bufo bufo"]
+
+@pytest.fixture
+def source(tmp_path):
+    """300 synthetic rows: skewed species counts, a few NaNs and values outside the histogram bins."""
+    rng = np.random.default_rng(0)
+    n = 300
+    species = rng.choice(SPECIES, n, p=[0.4, 0.3, 0.15, 0.1, 0.05])
+    df = pd.DataFrame({
+        "filename": [f"img_{i}.jpg" for i in range(n)],
+        "scientific_name": species,
+        "common_name": [s.split()[0] for s in species],
+        "latitude": rng.uniform(-60, 70, n).round(5),
+        "longitude": rng.uniform(-179, 179, n).round(5),
+        "sighting_date": pd.to_datetime("2024-01-01") + pd.to_timedelta(rng.integers(0, 365, n), unit="D"),
+        "country": rng.choice(["Westland", "Eastland", "Southland"], n),
+        "avg_temp_C": rng.uniform(-40, 50, n).round(1),   # beyond -30..45 on both ends
+        "elevation_m": rng.uniform(-600, 7000, n).round(0),
+        "NDVI_value": rng.uniform(-1, 1, n).round(4),
+        "dist_to_water_m": rng.uniform(0, 200000, n).round(2),
+    })
+    df.loc[::17, "avg_temp_C"] = np.nan
+    df.loc[::23, "NDVI_value"] = np.nan
+    path = str(tmp_path / "gmgbd.csv")
+    df.to_csv(path, index=False)
+    return path, df
+
+@pytest.fixture
+def built(source, tmp_path):
+    path, df = source
+    out = str(tmp_path / "data")
+    manifest = build(path, out)
+    return out, manifest, df
+
+def read_json(*parts):
+    with open(os.path.join(*parts), encoding='utf-8') as f:
+        return json.load(f)
+
+def test_points_are_aligned_columns(built):
+    out, manifest, df = built
+    points = manifest["points"]
+    assert points["count"] == len(df)
+    with open(os.path.join(out, "points.bin"), 'rb') as f:
+        raw = f.read()
+    assert len(raw) == points["bytes"]
+    cols = {}
+    for c in points["columns"]:
+        assert c["offset"] % 4 == 0
+        cols[c["name"]] = (np.frombuffer(raw, dtype=np.dtype(c["type"]).newbyteorder("<"), count=len(df), offset=c["offset"]), c)
+
+    def decode(name):
+        q, c = cols[name]
+        top = np.iinfo(q.dtype).max
+        v = c["lo"] + q / (top - 1) * (c["hi"] - c["lo"])
+        return np.where(q == top, np.nan, v)
+
+    assert np.allclose(decode("lon"), df["longitude"], atol=0.01)
+    assert np.allclose(decode("lat"), df["latitude"], atol=0.01)
+    temp = decode("temp")
+    assert (np.isnan(temp) == df["avg_temp_C"].isna()).all()
+    assert np.allclose(temp[~np.isnan(temp)], df["avg_temp_C"].dropna(), atol=0.01)
+    assert (cols["month"][0] == pd.to_datetime(df["sighting_date"]).dt.month).all()
+    # Species codes index species.json, most observed first
+    names = read_json(out, "species.json")["scientific_name"]
+    assert [names[i] for i in cols["species"][0]] == df["scientific_name"].tolist()
+    assert names[0] == df["scientific_name"].mode()[0]
+
+def test_hex_tiles_cover_every_row(built):
+    out, manifest, df = built
+    levels = manifest["hex"]["levels"]
+    assert [lvl["z"] for lvl in levels] == list(HEX_ZOOMS)
+    for lvl in levels:
+        cells = rows = 0
+        for x, y, n in lvl["tiles"]:
+            tile = read_json(out, "hex", str(lvl["z"]), f"{x}_{y}.json")
+            assert len(tile["q"]) == len(tile["count"]) == n
+            assert all(c > 0 for c in tile["count"]) and all(0 < s <= len(SPECIES) for s in tile["species"])
+            cells += n
+            rows += sum(tile["count"])
+        assert cells == lvl["cells"] and rows == len(df)
+        assert len(os.listdir(os.path.join(out, "hex", str(lvl["z"])))) == len(lvl["tiles"])
+
+def test_manifest_overview_and_histograms(built, source):
+    out, manifest, df = built
+    assert read_json(out, "manifest.json") == manifest
+    overview = read_json(out, "overview.json")
+    assert overview["rows"] == len(df) and overview["species"] == len(SPECIES) and overview["countries"] == 3
+    for col, h in overview["histograms"].items():
+        assert sum(h["counts"]) + h["missing"] == len(df), col  # nothing falls outside the bins
+        assert len(h["edges"]) == len(h["counts"]) + 1
+        assert h["edges"][0] is None and h["edges"][-1] is None
+    temp = overview["histograms"]["avg_temp_C"]
+    assert temp["counts"][0] == (df["avg_temp_C"] < -30).sum() and temp["missing"] == df["avg_temp_C"].isna().sum()
+    # An unchanged source is not rebuilt; --force rebuilds it
+    path, _ = source
+    assert build(path, out) is None
+    assert build(path, out, force=True)["points"] == manifest["points"]
+    assert not os.path.exists(out + ".tmp")
+
+def test_histogram_bins_are_left_open(monkeypatch):
+    monkeypatch.setattr(site_data, "HIST_BINS", {"avg_temp_C": np.array([0.0, 10.0, np.inf])})
+    df = pd.DataFrame({"avg_temp_C": [-5.0, 0.0, 5.0, 1e6, np.nan]})
+    assert site_data.histograms(df)["avg_temp_C"] == {"edges": [None, 0.0, 10.0, None], "counts": [1, 2, 1], "missing": 1}
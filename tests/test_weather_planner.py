@@ -0,0 +1,65 @@
+from datetime import date
+import pytest
+import weather_planner
+from weather_planner import WeatherPlanner, collapse_dates, stub_server, CELL_DEG
+from http_client import HttpClient
+
+@pytest.fixture
+def stub():
+    server, base = stub_server()
+    yield server, WeatherPlanner(base + "/v1/archive", base + "/v1/elevation", http=HttpClient(retries=0))
+    server.shutdown()
+    server.server_close()
+
+def row(name, lat, lon, day):
+    return {"filename": name, "latitude": lat, "longitude": lon, "sighting_date": day}
+
+def stub_temp(r):
+    """What the stub answers for row r: its cell centre's latitude, its day within the month-aligned range."""
+    lat = WeatherPlanner.cell(r["latitude"], r["longitude"])[0] * CELL_DEG
+    day = date.fromisoformat(r["sighting_date"])
+    return round(30 - abs(lat) / 3 + (day.day - 1) % 7 * 0.1, 1)
+
+def test_collapse_dates(monkeypatch):
+    monkeypatch.setattr(weather_planner, "ALIGN_TO_MONTHS", False)
+    d = date.fromisoformat
+    days = [d("2024-01-05"), d("2024-01-20"), d("2024-01-05"), d("2024-02-25"), d("2024-03-10")]
+    # 01-20 -> 02-25 is 36 days: a new range
+    assert collapse_dates(days) == [(d("2024-01-05"), d("2024-01-20")), (d("2024-02-25"), d("2024-03-10"))]
+    # Monthly dates over two years: one range may span at most MAX_RANGE_DAYS (366)
+    monthly = [d(f"{y}-{m:02d}-01") for y in (2023, 2024) for m in range(1, 13)]
+    assert collapse_dates(monthly) == [(d("2023-01-01"), d("2024-01-01")), (d("2024-02-01"), d("2024-12-01"))]
+    monkeypatch.setattr(weather_planner, "ALIGN_TO_MONTHS", True)
+    assert collapse_dates(days) == [(d("2024-01-01"), d("2024-01-31")), (d("2024-02-01"), d("2024-03-31"))]
+
+def test_plan_groups_cells_by_range(monkeypatch):
+    rows = [row("a1", 10.01, 20.02, "2024-01-05"), row("a2", 10.02, 20.01, "2024-01-20"),
+            row("a3", 10.0, 20.0, "2024-06-01"), row("b1", -5.0, 3.0, "2024-01-10")]
+    a, b = WeatherPlanner.cell(10.0, 20.0), WeatherPlanner.cell(-5.0, 3.0)
+    jan, jun = (date(2024, 1, 1), date(2024, 1, 31)), (date(2024, 6, 1), date(2024, 6, 30))
+    assert WeatherPlanner().plan(rows) == [(*jan, [a, b]), (*jun, [a])]
+    monkeypatch.setattr(weather_planner, "MAX_LOCATIONS", 1)
+    assert WeatherPlanner().plan(rows) == [(*jan, [a]), (*jan, [b]), (*jun, [a])]
+
+def test_temperatures_fan_out_to_rows(stub):
+    server, planner = stub
+    rows = [row(f"r{i}", 45.0 + i % 3 * 0.001, 7.0, f"2024-03-{1 + i:02d}") for i in range(20)]
+    rows += [row("far", -33.9, 151.2, "2024-03-15"), row("late", 45.0, 7.0, "2024-09-02")]
+    temps = planner.temperatures(rows)
+    # March: both cells in one request, September: the first cell alone
+    assert server.hits == planner.requests == 2 and planner.naive == len(rows)
+    assert temps == {r["filename"]: stub_temp(r) for r in rows}
+
+def test_failed_group_is_left_out(stub):
+    server, planner = stub
+    planner.archive_url = "http://127.0.0.1:1/v1/archive"  # nothing listens there
+    assert planner.temperatures([row("a", 1.0, 1.0, "2024-01-01")]) == {}
+    assert planner.requests == 1 and server.hits == 0
+
+def test_elevations_share_points_and_batch(stub, monkeypatch):
+    monkeypatch.setattr(weather_planner, "ELEVATION_BATCH", 2)
+    server, planner = stub
+    rows = [row("a", 1.00001, 2.0, "2024-01-01"), row("b", 1.0, 2.0, "2024-05-01"),
+            row("c", 3.0, 4.0, "2024-01-01"), row("d", -5.0, 6.0, "2024-01-01")]
+    assert planner.elevations(rows) == {"a": 12.0, "b": 12.0, "c": 34.0, "d": 56.0}
+    assert server.hits == planner.requests == 2  # 3 distinct points, 2 per request